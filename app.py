@@ -1,91 +1,177 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, Response, stream_with_context
+import json
 from flask_cors import CORS
 import mysql.connector
 import pandas as pd
 import re
 import os
+import shutil
+import tempfile
 import random
-from sql_func import create_sample_query, input_to_sql
+import time
+import logging
+import threading
+from sql_func import create_sample_query, input_to_sql, translation_stats
+from sql_pool import get_mysql_pool, PoolTimeoutError
+from sql_ingest import build_create_table_query, dataframe_rows, stream_csv_to_mysql, merge_csv_into_mysql, DEFAULT_BATCH_SIZE
+from incremental import WRITE_MODES
+from jobs import JobManager, NULL_PROGRESS
+from profiling import ingest_stats
+from profile_engine import ProfilingEngine, read_csv_frame, CSV_ENGINE
+from upload_sources import upload_format, upload_name, COLUMNAR_AVAILABLE
+from catalog import MetadataCatalog
+from sql_results import stream_rows, fetch_page, run_query, InvalidPageToken, DEFAULT_PAGE_SIZE
+from caches import TranslationCache, ResultCache, schema_version, catalog_version, carry_schema_version
+from telemetry import RequestTimer, configure_logging, log_sampled, render_metrics, gauge_lines
+from sql_index_advisor import IndexAdvisor, existing_indexes, execute_ddl
+from cost_guard import CostGuard, QueryRejected, estimate_sql, estimate_pipeline, estimate_find, limit_sql
+from query_control import QueryManager, QueryControlError, TableBusy, new_request_id
 
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
 
-# Global metadata store
-metadata_store = {}
+# Level from CHATDB_LOG_LEVEL; payload dumps are sampled (CHATDB_LOG_SAMPLE_RATE)
+configure_logging()
+logger = logging.getLogger("chatdb")
 
-# Function to connect to MySQL Database
-def connect_to_mysql(host, user, password, database):
-    try:
-        connection = mysql.connector.connect(
-            host=host,  
-            user=user,
-            password=password,
-            database=database
-        )
-        if connection.is_connected():
-            print("Connected to MySQL database successfully!")
-            return connection
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
-        return None
+# Global metadata store (persisted, shared by all worker processes)
+metadata_store = MetadataCatalog("sql")
+
+# Full type-inference and sketch state per table, resumed by append/upsert uploads
+sql_ingest_state = MetadataCatalog("sql_ingest_state")
+
+# Metadata the SQL translator depends on; translations survive appends that leave it unchanged
+SQL_SCHEMA_FIELDS = ("column_names", "attributes", "measures", "dates")
+
+# Shared cache of natural-language translations (SQL and NoSQL)
+translation_cache = TranslationCache()
+
+# Results of executed queries, valid until the table's next upload
+result_cache = ResultCache()
+
+# Uploads larger than this are always loaded with the streaming ingest
+STREAMING_THRESHOLD_BYTES = int(os.environ.get("CHATDB_STREAMING_THRESHOLD_MB", "100")) * 1024 * 1024
+
+# Uploads run as background jobs; each file is saved in its own directory under this one
+UPLOAD_DIR = os.environ.get("CHATDB_UPLOAD_DIR", ".")
+# Job status and the one-upload-per-table lock are shared by all worker processes through the catalog
+upload_jobs = JobManager()
+
+# Columns used by executed queries, turned into index recommendations
+index_advisor = IndexAdvisor()
+
+# Result-size policy applied to estimated queries before they run (CHATDB_COST_POLICY)
+cost_guard = CostGuard()
+
+# Per-table admission control, execution time limits and cancellation of running queries
+query_manager = QueryManager()
+
+def record_sql_workload(table_name, query, metadata):
+    """Feed the index advisor; with auto-indexing on, build due indexes in the background."""
+    if index_advisor.record(table_name, query, metadata.get("column_names", [])) is None:
+        return
+    due = index_advisor.due(table_name, metadata)
+    if due:
+        threading.Thread(target=index_advisor.apply_many, args=(get_mysql_pool(), table_name, due), daemon=True).start()
+
+def save_upload(file):
+    """Save an uploaded file under a fresh directory (keeps its name, which names the table)."""
+    upload_dir = tempfile.mkdtemp(prefix="chatdb-upload-", dir=UPLOAD_DIR)
+    file_path = os.path.join(upload_dir, os.path.basename(file.filename))
+    file.save(file_path)
+    return file_path
+
+def submit_upload(kind, name, file_path, load):
+    """Queue load(job) and answer 202 with the job status, or 409 while `name` is still loading."""
+    def run(job):
+        try:
+            return load(job)
+        finally:
+            shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+    job = upload_jobs.submit(kind, name, run)
+    if job is None:
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+        running = upload_jobs.active(kind, name)
+        return jsonify({"error": f"An upload of '{name}' is already in progress.",
+                        "job_id": running.id if running else None}), 409
+    return jsonify({**job.to_dict(), "status_url": f"/upload-jobs/{job.id}"}), 202
+
+def timed_response(timer, payload, outcome="ok"):
+    """jsonify() inside the serialize span, record the request and attach its Server-Timing header."""
+    with timer.span("serialize"):
+        response = jsonify(payload)
+    timer.finish(outcome)
+    response.headers["Server-Timing"] = timer.server_timing()
+    log_sampled(logger, logging.DEBUG, "%s request spans: %s", timer.backend, timer.spans)
+    return response
+
+def query_control_response(timer, error, request_id):
+    """Error response for a query that was shed, timed out or cancelled."""
+    timer.finish(error.outcome)
+    response = jsonify({"error": str(error), "request_id": request_id})
+    response.status_code = error.status_code
+    if isinstance(error, TableBusy):
+        response.headers["Retry-After"] = "1"
+    return response
 
 # Function to process CSV and load it into SQL
-def process_and_load_csv(csv_path, host, user, password, database):
+def process_and_load_csv(csv_path, pool, progress=NULL_PROGRESS):
     try:
         # Extract table name
-        table_name = os.path.basename(csv_path).replace('.csv', '').lower()
+        table_name = upload_name(csv_path)
 
         # Read CSV into DataFrame
-        df = pd.read_csv(csv_path)
-        df.columns = df.columns.str.replace(' ', '_').str.lower()
-
-        # Extract metadata
+        started = time.perf_counter()
+        progress.phase("reading")
+        df = read_csv_frame(csv_path)
+        read_done = time.perf_counter()
+
+        # Extract metadata: narrowest exact column types (which also detect date columns)
+        # and bounded column statistics, profiled column by column in parallel
+        progress.check()
+        progress.phase("profiling")
         column_names = df.columns
-        attributes = []  # Categorical variables
-        measures = []    # Continuous variables
-        dates = []       # Date variables
-        unique_elements = {}
-
-        for col in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[col]):
-                dates.append(col)
-            elif pd.api.types.is_numeric_dtype(df[col]) and '_id' not in col.lower():
-                measures.append(col)
-            else:
-                attributes.append(col)
-                unique_elements[col] = df[col].unique().tolist()
-
-        # Connect to MySQL
-        connection = connect_to_mysql(host, user, password, database)
-        if connection is None:
-            return None, "Failed to connect to the database."
-
-        cursor = connection.cursor()
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-        create_table_query = f"CREATE TABLE {table_name} ("
-        for col in df.columns:
-            if col in dates:
-                create_table_query += f"{col} DATETIME, "
-            elif col in measures:
-                create_table_query += f"{col} FLOAT, "
-            else:
-                create_table_query += f"{col} VARCHAR(255), "
-        create_table_query = create_table_query.rstrip(', ') + ")"
-        cursor.execute(create_table_query)
-
-        # Insert data into table
-        insert_query = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({', '.join(['%s'] * len(df.columns))})"
-        cursor.executemany(insert_query, df.values.tolist())
-        connection.commit()
+        engine = ProfilingEngine(column_names)
+        df, _ = engine.update(df)
+        engine.types.freeze()
+        column_types = engine.types.sql_types()
+        attributes, measures, dates = engine.classify()
+        metadata_done = time.perf_counter()
+
+        # Borrow a pooled MySQL connection
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            cursor.execute(build_create_table_query(table_name, df.columns, measures, dates, column_types))
+
+            # Insert data into table (NaN/NaT as NULL), one transaction in batches so progress shows
+            progress.phase("inserting")
+            insert_query = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({', '.join(['%s'] * len(df.columns))})"
+            rows = list(dataframe_rows(df))
+            for start in range(0, len(rows), DEFAULT_BATCH_SIZE):
+                progress.check()
+                batch = rows[start:start + DEFAULT_BATCH_SIZE]
+                cursor.executemany(insert_query, batch)
+                progress.advance(len(batch))
+            connection.commit()
+            cursor.close()
+        finished = time.perf_counter()
 
         return {
             "table_name": table_name,
             "column_names": list(column_names),
+            "column_types": column_types,
             "attributes": attributes,
             "measures": measures,
             "dates": dates,
-            "unique_elements": unique_elements
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                "full", len(df), finished - started, read_done - started, metadata_done - read_done,
+                csv_engine=CSV_ENGINE, **engine.stats(),
+            ),
+            "ingest_state": engine.to_state(),
         }, None
 
     except Exception as e:
@@ -102,6 +188,43 @@ def get_metadata():
 
     return jsonify(metadata_store[table_name])
 
+@app.route('/sql-pool-stats', methods=['GET'])
+def sql_pool_stats():
+    return jsonify(get_mysql_pool().stats())
+
+@app.route('/translation-stats', methods=['GET'])
+def sql_translation_stats():
+    return jsonify({"sql": translation_stats(), "cache": translation_cache.stats()})
+
+@app.route('/result-cache-stats', methods=['GET'])
+def result_cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/cost-guard-stats', methods=['GET'])
+def cost_guard_stats():
+    return jsonify(cost_guard.stats())
+
+@app.route('/queries', methods=['GET'])
+def list_queries():
+    """Running and queued queries of every worker process, with admission counters."""
+    return jsonify({"queries": query_manager.running(), "stats": query_manager.stats()})
+
+@app.route('/queries/<request_id>/cancel', methods=['POST'])
+def cancel_query(request_id):
+    """
+    Kill a running SQL or MongoDB query by the request id its response carries.
+    Any worker process can cancel it; a query of another process is killed by
+    that process within CHATDB_QUERY_POLL_INTERVAL seconds.
+    """
+    try:
+        running = query_manager.cancel(request_id)
+    except Exception as e:
+        logger.exception("Cancelling query %s failed", request_id)
+        return jsonify({"error": f"Failed to cancel query: {str(e)}"}), 500
+    if running is None:
+        return jsonify({"error": f"No running query with request id '{request_id}'."}), 404
+    return jsonify(running.to_dict())
+
 @app.route('/')
 def serve_index():
     return render_template('index.html')
@@ -112,30 +235,168 @@ def upload_csv():
     if not file:
         return jsonify({"error": "No file uploaded."}), 400
 
-    file_path = f"./{file.filename}"
-    file.save(file_path)
-
-    metadata, error = process_and_load_csv(
-        csv_path=file_path,
-        host="localhost",
-        user="root",
-        password="1234",
-        database="dsci551_ughh"
+    # replace (default) drops and reloads the table; append/upsert merge rows on a key column
+    write_mode = request.form.get('write_mode', 'replace')
+    key_column = request.form.get('key', '').replace(' ', '_').lower()
+    if write_mode not in WRITE_MODES:
+        return jsonify({"error": f"write_mode must be one of {', '.join(WRITE_MODES)}."}), 400
+    if write_mode != 'replace' and not key_column:
+        return jsonify({"error": "Append and upsert uploads need a key column."}), 400
+    # Parquet/Arrow files are always streamed row group by row group
+    file_format = upload_format(file.filename) or "csv"
+    if file_format == "json":
+        return jsonify({"error": "JSON files can only be uploaded to MongoDB."}), 400
+    if file_format != "csv" and not COLUMNAR_AVAILABLE:
+        return jsonify({"error": "Parquet and Arrow uploads need pyarrow installed."}), 400
+    table_name = upload_name(file.filename)
+    if write_mode != 'replace' and (table_name not in metadata_store or table_name not in sql_ingest_state):
+        return jsonify({"error": f"Table '{table_name}' has to be uploaded in replace mode before {write_mode}."}), 404
+
+    file_path = save_upload(file)
+
+    # Streaming mode reads the file in chunks and commits in batches
+    streaming = (request.form.get('mode') == 'stream' or file_format != "csv"
+                 or os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES)
+    ingest_options = {
+        key: int(request.form[key])
+        for key in ('chunk_size', 'batch_size', 'commit_every')
+        if request.form.get(key)
+    }
+    return submit_upload(
+        "sql", table_name, file_path,
+        lambda job: load_csv_upload(file_path, write_mode, key_column, streaming, ingest_options, job),
     )
 
+def forget_sql_table(table_name):
+    """Drop a table and everything known about it (a cancelled replace left it partly loaded)."""
+    execute_ddl(get_mysql_pool(), f"DROP TABLE IF EXISTS {table_name}")
+    metadata_store.pop(table_name, None)
+    sql_ingest_state.pop(table_name, None)
+    result_cache.invalidate("sql", table_name)
+    translation_cache.invalidate("sql", table_name)
+    index_advisor.reset(table_name, [])
+
+def load_csv_upload(file_path, write_mode, key_column, streaming, ingest_options, job):
+    """Upload job body: load the file into MySQL, then store its metadata and drop stale cache entries."""
+    table_name = upload_name(file_path)
+    if write_mode != 'replace':
+        previous = metadata_store.get(table_name)
+        state = sql_ingest_state.get(table_name)
+        if previous is None or state is None:
+            raise ValueError(f"Table '{table_name}' has to be uploaded in replace mode before {write_mode}.")
+        metadata, error = merge_csv_into_mysql(
+            file_path, get_mysql_pool(), previous, state, write_mode, key_column, progress=job, **ingest_options
+        )
+    elif streaming:
+        metadata, error = stream_csv_to_mysql(file_path, get_mysql_pool(), progress=job, **ingest_options)
+    else:
+        metadata, error = process_and_load_csv(csv_path=file_path, pool=get_mysql_pool(), progress=job)
+
     if error:
-        return jsonify({"error": error}), 500
+        # Appended batches stay (re-running a keyed append/upsert is safe); a half-replaced table does not
+        if job.cancel_requested and write_mode == 'replace' and job.reached("inserting"):
+            forget_sql_table(table_name)
+        raise RuntimeError(error)
 
     # Save metadata to metadata_store
-    metadata_store[metadata["table_name"]] = {
+    job.phase("finalizing")
+    sql_ingest_state[table_name] = metadata.pop("ingest_state")
+    stored = {
         "column_names": metadata["column_names"],
+        "column_types": metadata["column_types"],
         "attributes": metadata["attributes"],
         "measures": metadata["measures"],
         "dates": metadata["dates"],
-        "unique_elements": metadata["unique_elements"],
+        "column_profiles": metadata["column_profiles"],
     }
+    if metadata.get("key_column"):
+        stored["key_column"] = metadata["key_column"]
+    same_schema = write_mode != 'replace' and carry_schema_version(metadata_store, table_name, stored, SQL_SCHEMA_FIELDS)
+    metadata_store[table_name] = stored
+
+    # New rows only invalidate results; translations and index workload follow the schema
+    result_cache.invalidate("sql", table_name)
+    if not same_schema:
+        translation_cache.invalidate("sql", table_name)
+        index_advisor.reset(table_name, metadata["column_names"])
+
+    return {"message": f"Table '{table_name}' uploaded successfully.", "metadata": metadata}
+
+@app.route('/upload-jobs', methods=['GET'])
+def list_upload_jobs():
+    jobs = [dict(job.to_dict(), result=None) for job in upload_jobs.jobs()]
+    return jsonify({"workers": upload_jobs.workers, "counts": upload_jobs.counts(), "jobs": jobs})
+
+@app.route('/upload-jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    """Phase, rows processed and throughput of an upload job; the upload response once it succeeded."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Upload job '{job_id}' not found."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/upload-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_upload_job(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Upload job '{job_id}' not found."}), 404
+    if job.done:
+        return jsonify({"error": f"Upload job '{job_id}' already {job.status}."}), 409
+    job = upload_jobs.cancel(job_id)
+    return jsonify(job.to_dict()), 202
+
+@app.route('/index-advisor', methods=['GET'])
+def index_advisor_report():
+    """Workload summary and index candidates for a table; explain=1 adds each candidate's current plan."""
+    table_name = request.args.get('table')
+    if not table_name:
+        return jsonify({"error": "No table name provided."}), 400
+    metadata = metadata_store.get(table_name)
+    if not metadata:
+        return jsonify({"error": f"No metadata found for table '{table_name}'."}), 404
 
-    return jsonify({"message": f"Table '{metadata['table_name']}' uploaded successfully.", "metadata": metadata})
+    try:
+        existing = existing_indexes(get_mysql_pool(), table_name)
+        candidates = index_advisor.candidates(table_name, metadata, existing)
+        if request.args.get('explain') in ('1', 'true'):
+            for candidate in candidates:
+                candidate["explain"] = index_advisor.explain(get_mysql_pool(), candidate)
+    except PoolTimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    except mysql.connector.Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+
+    return jsonify({
+        "table": table_name,
+        "auto_index": index_advisor.auto_index,
+        "workload": index_advisor.workload(table_name),
+        "existing_indexes": [list(columns) for columns in existing],
+        "candidates": candidates,
+    })
+
+@app.route('/index-advisor/apply', methods=['POST'])
+def index_advisor_apply():
+    """Create recommended indexes (all, or those named in "names"); each is kept only if EXPLAIN can use it."""
+    data = request.json or {}
+    table_name = data.get('table')
+    metadata = metadata_store.get(table_name) if table_name else None
+    if not metadata:
+        return jsonify({"error": f"No metadata found for table '{table_name}'."}), 404
+
+    candidates = [candidate for candidate in index_advisor.candidates(table_name, metadata) if not candidate["exists"]]
+    names = data.get('names')
+    if names:
+        candidates = [candidate for candidate in candidates if candidate["name"] in names]
+    if not candidates:
+        return jsonify({"error": "No matching index candidates."}), 404
+
+    try:
+        results = index_advisor.apply_many(get_mysql_pool(), table_name, candidates)
+    except PoolTimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    except mysql.connector.Error as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    return jsonify({"table": table_name, "results": results})
 
 @app.route('/preview-table', methods=['GET'])
 def preview_table():
@@ -143,26 +404,28 @@ def preview_table():
     if not table_name:
         return jsonify({"error": "No table name provided."}), 400
 
-    connection = connect_to_mysql("localhost", "root", "1234", "dsci551_ughh")
-    if connection is None:
-        return jsonify({"error": "Failed to connect to the database."}), 500
-
     try:
-        query = f"SELECT * FROM {table_name} LIMIT 10"
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with get_mysql_pool().connection() as connection:
+            query = f"SELECT * FROM {table_name} LIMIT 10"
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            cursor.close()
         return jsonify(rows)
+    except PoolTimeoutError as e:
+        return jsonify({"error": str(e)}), 503
     except mysql.connector.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
-    finally:
-        connection.close()
 
 @app.route('/process_query', methods=['POST'])
 def process_query():
     data = request.json
     input_user_query = data.get('query')
     table_name = data.get('table_name')
+    # 'stream' returns NDJSON rows, 'page' returns one page plus a continuation token
+    result_mode = data.get('mode')
+    # Clients may choose the id they later cancel the query with
+    request_id = new_request_id(data.get('request_id') or request.headers.get('X-Request-Id'))
 
     if not table_name or not input_user_query:
         return jsonify({"error": "Missing table name or user input."}), 400
@@ -196,103 +459,211 @@ def process_query():
 
     else:
         # Translate to SQL query
+        timer = RequestTimer("sql")
         try:
-            translated_query = input_to_sql(input_user_query, table_name, metadata_store)
+            # Repeated questions against the same schema version skip translation
+            data_version = catalog_version(metadata_store, table_name)
+            with timer.span("translate"):
+                translated_query = translation_cache.get_or_translate(
+                    "sql", table_name, schema_version(metadata_store, table_name), input_user_query,
+                    lambda: input_to_sql(input_user_query, table_name, metadata_store),
+                )
 
             # Remove any outer quotes from the translated query
             if translated_query.startswith("'") and translated_query.endswith("'"):
                 translated_query = translated_query[1:-1]
 
-            connection = connect_to_mysql("localhost", "root", "1234", "dsci551_ughh")
-            if connection is None:
-                return jsonify({"error": "Failed to connect to the database."}), 500
-
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(translated_query)
-            results = cursor.fetchall()  # Fetch all rows of the query result
-
-            # Close the connection
-            connection.close()
-
-            return jsonify({
+            # Estimate the result from the upload statistics before anything runs; the indexes
+            # only matter to the examined-rows limit, so they are looked up only when it is set
+            indexes = existing_indexes(get_mysql_pool(), table_name) if cost_guard.max_examined else ()
+            estimate = estimate_sql(translated_query, metadata, indexes)
+            action = cost_guard.decide(estimate, buffered=result_mode not in ('stream', 'page'))
+            cost = {**(estimate.to_dict() if estimate else {}), "action": action}
+            if action == "stream":
+                result_mode = 'stream'
+
+            if result_mode in ('stream', 'page'):
+                record_sql_workload(table_name, translated_query, metadata)
+
+            if result_mode == 'stream':
+                running = query_manager.admit(request_id, "sql", table_name, translated_query)
+
+                # One JSON row per line from an unbuffered cursor; memory stays bounded
+                def generate_rows():
+                    outcome = "error"
+                    try:
+                        for row in stream_rows(get_mysql_pool(), translated_query, timer=timer, control=running):
+                            with timer.span("serialize"):
+                                line = json.dumps(row, default=str) + "\n"
+                            yield line
+                        outcome = "ok"
+                    except QueryControlError as e:
+                        # The status line is already sent; a last line says why the stream stopped
+                        outcome = e.outcome
+                        query_manager.record(e)
+                        yield json.dumps({"error": str(e), "request_id": request_id}) + "\n"
+                    finally:
+                        query_manager.done(running)
+                        timer.finish(outcome)
+
+                response = Response(
+                    stream_with_context(generate_rows()),
+                    mimetype="application/x-ndjson",
+                    headers={"X-Translated-Query": " ".join(translated_query.split()), "X-Query-Cost": json.dumps(cost),
+                             "X-Request-Id": request_id},
+                )
+                # Frees the table slot even when the client leaves before the first row
+                response.call_on_close(lambda: query_manager.done(running))
+                return response
+
+            if result_mode == 'page':
+                try:
+                    with query_manager.run(request_id, "sql", table_name, translated_query) as running:
+                        rows, next_token, resumable = fetch_page(
+                            get_mysql_pool(), translated_query, data_version,
+                            page_size=data.get('page_size', DEFAULT_PAGE_SIZE),
+                            token=data.get('page_token'), timer=timer, control=running,
+                        )
+                except InvalidPageToken as e:
+                    timer.finish("invalid_token")
+                    return jsonify({"error": str(e)}), 409
+                return timed_response(timer, {
+                    "translated_query": translated_query,
+                    "data": rows,
+                    "next_page_token": next_token,
+                    "resumable": resumable,
+                    "cost": cost,
+                    "request_id": request_id
+                })
+
+            # Data only changes on upload, so results are cached per data version
+            executed_query = translated_query
+            if action == "limit":
+                # One row past the limit tells whether the result was cut
+                executed_query = limit_sql(translated_query, cost_guard.max_rows + 1)
+            results = result_cache.get("sql", table_name, data_version, executed_query)
+            cached = results is not None
+            if not cached:
+                # The pooled connection is returned even if execute raises
+                with query_manager.run(request_id, "sql", table_name, executed_query) as running:
+                    results = run_query(get_mysql_pool(), executed_query, timer=timer, control=running)
+                record_sql_workload(table_name, translated_query, metadata)
+                result_cache.put("sql", table_name, data_version, executed_query, results)
+            if action == "limit":
+                cost["truncated"] = len(results) > cost_guard.max_rows
+                results = results[:cost_guard.max_rows]
+                translated_query = limit_sql(translated_query, cost_guard.max_rows)
+
+            return timed_response(timer, {
                 "translated_query": translated_query,
-                "data": results
-            })
+                "data": results,
+                "cached": cached,
+                "cost": cost,
+                "request_id": request_id
+            }, "cached" if cached else "ok")
+        except QueryRejected as e:
+            timer.finish("rejected")
+            return jsonify({"error": str(e), "cost": {**e.estimate.to_dict(), "action": "reject"}}), 422
+        except QueryControlError as e:
+            return query_control_response(timer, e, request_id)
+        except PoolTimeoutError as e:
+            timer.finish("pool_timeout")
+            return jsonify({"error": str(e)}), 503
         except Exception as e:
+            timer.finish("error")
+            logger.exception("SQL query failed for table '%s'", table_name)
             return jsonify({"error": f"Failed to execute query: {str(e)}"}), 500
 
 ########################################################################################################################################################################
 # NO SQL PART
 
 import nosql_func
-from nosql_func import generate_random_mongodb_query , parse_conditions, parse_sorting, parse_display_columns, parse_aggregation
+from nosql_func import generate_random_mongodb_query , parse_conditions, parse_sorting, parse_display_columns, parse_aggregation, parse_limit
+from nosql_pipeline import build_pipeline, optimize_pipeline
+
+# Global metadata store (persisted, shared by all worker processes)
+nosql_metadata_store = MetadataCatalog("nosql")
 
-# Global metadata store
-nosql_metadata_store = {}
+# Column sketch state per collection, resumed by append/upsert uploads
+nosql_ingest_state = MetadataCatalog("nosql_ingest_state")
 
-# MongoDB Connection
+# Metadata the NoSQL query parsers depend on
+NOSQL_SCHEMA_FIELDS = ("columns", "categorical_columns", "numeric_columns")
+
+# MongoDB Connection (shared, long-lived client)
 def connect_to_mongodb_localhost(database_name):
     try:
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client[database_name]
-        print(f"Connected to MongoDB database: {database_name}")
-        return db
+        return get_mongo_db(database_name)
     except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
+        logger.error("Error connecting to MongoDB: %s", e)
         return None
 
 import pandas as pd
-from pymongo import MongoClient
+from mongo_client import get_mongo_client, get_mongo_db, mongo_client_stats, kill_operations, MONGO_DB_NAME
+from nosql_ingest import stream_csv_to_mongo, merge_csv_into_mongo, stream_json_to_mongo
+from nosql_results import fetch_find_page, InvalidFindToken, DEFAULT_FIND_PAGE_SIZE
+from bson import json_util
+from nosql_index_advisor import MongoIndexAdvisor, existing_indexes as existing_mongo_indexes
+
+# Fields used by executed filters and sorts, turned into index recommendations
+mongo_index_advisor = MongoIndexAdvisor()
 
-def csv_to_mongo_loader(file_path, mongo_uri, db_name, collection_name):
+def csv_to_mongo_loader(file_path, db_name, collection_name, progress=NULL_PROGRESS):
     # Initialize result dictionary
     result = {}
 
     try:
         # Step 1: Read the CSV file into a DataFrame
-        data_frame = pd.read_csv(file_path)
-        data_frame.columns = data_frame.columns.str.replace(' ', '_').str.lower()
+        started = time.perf_counter()
+        progress.phase("reading")
+        # Documents keep values as the C parser reads them (pyarrow turns dates into date objects)
+        data_frame = read_csv_frame(file_path, engine="c")
         columns = data_frame.columns.tolist()
+        read_done = time.perf_counter()
 
-        # Initialize lists for attributes and measures
-        categorical_columns = []
-        numeric_columns = []
-        unique_values = {}
-
-        # Classify columns based on their data types
-        for column in data_frame.columns:
-            if pd.api.types.is_datetime64_any_dtype(data_frame[column]):
-                categorical_columns.append(column)
-                unique_values[column] = data_frame[column].dropna().unique().tolist()
-            elif pd.api.types.is_numeric_dtype(data_frame[column]) and not column.endswith("id"):
-                numeric_columns.append(column)
-            else:
-                categorical_columns.append(column)
-                unique_values[column] = data_frame[column].dropna().unique().tolist()
+        # Classify columns with the same type rules as MySQL uploads and keep bounded
+        # column statistics; documents are stored with the values as read
+        progress.check()
+        progress.phase("profiling")
+        engine = ProfilingEngine(columns)
+        engine.update(data_frame, convert=False)
+        categorical_columns, numeric_columns = engine.mongo_classify()
+        metadata_done = time.perf_counter()
 
-        print(f"Successfully loaded CSV with {len(data_frame)} rows and {len(data_frame.columns)} columns.")
+        logger.info("Loaded CSV with %d rows and %d columns.", len(data_frame), len(data_frame.columns))
 
         # Step 2: Connect to MongoDB and insert data
-        client = MongoClient(mongo_uri)
+        client = get_mongo_client()
         database = client[db_name]
         collection = database[collection_name]
 
         # Convert the DataFrame to a list of dictionaries
+        progress.phase("inserting")
         records = data_frame.to_dict(orient="records")
-        collection.insert_many(records)
+        for start in range(0, len(records), DEFAULT_BATCH_SIZE):
+            progress.check()
+            batch = records[start:start + DEFAULT_BATCH_SIZE]
+            collection.insert_many(batch)
+            progress.advance(len(batch))
+        finished = time.perf_counter()
 
-        print(f"Data inserted into MongoDB collection '{collection_name}' in database '{db_name}'.")
+        logger.info("Data inserted into MongoDB collection '%s' in database '%s'.", collection_name, db_name)
 
         # Save metadata to the result dictionary using the collection name as the key
         result[collection_name] = {
             "columns": columns,
             "categorical_columns": categorical_columns,
             "numeric_columns": numeric_columns,
-            "unique_values": unique_values,
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                "full", len(data_frame), finished - started, read_done - started, metadata_done - read_done,
+                csv_engine="c", **engine.stats(),
+            ),
+            "ingest_state": engine.to_state(),
         }
 
     except Exception as err:
-        print(f"Error during CSV to MongoDB loading: {err}")
+        logger.error("Error during CSV to MongoDB loading: %s", err)
         return None
 
     return result
@@ -304,36 +675,130 @@ def upload_nosql():
     if not file:
         return jsonify({"error": "No file uploaded."}), 400
 
-    # Save uploaded file
-    file_path = f"./{file.filename}"
-    file.save(file_path)
+    # replace (default) drops and reloads the collection; append/upsert merge documents on a key field
+    write_mode = request.form.get('write_mode', 'replace')
+    key_column = request.form.get('key', '').replace(' ', '_').lower()
+    if write_mode not in WRITE_MODES:
+        return jsonify({"error": f"write_mode must be one of {', '.join(WRITE_MODES)}."}), 400
+    if write_mode != 'replace' and not key_column:
+        return jsonify({"error": "Append and upsert uploads need a key column."}), 400
+
+    # Determine file type (CSV, Parquet/Arrow, or JSON array/NDJSON)
+    file_type = upload_format(file.filename)
+    collection_name = upload_name(file.filename)
+    if file_type is None:
+        return jsonify({"error": "Upload a CSV, JSON, NDJSON, Parquet or Arrow file."}), 400
+    if file_type == "json" and write_mode != 'replace':
+        return jsonify({"error": "JSON uploads replace the collection; append and upsert need CSV, Parquet or Arrow."}), 400
+    if file_type in ("parquet", "arrow") and not COLUMNAR_AVAILABLE:
+        return jsonify({"error": "Parquet and Arrow uploads need pyarrow installed."}), 400
+    if write_mode != 'replace' and (collection_name not in nosql_metadata_store or collection_name not in nosql_ingest_state):
+        return jsonify({"error": f"Collection '{collection_name}' has to be uploaded in replace mode before {write_mode}."}), 404
 
-    # Determine file type (CSV or JSON)
-    file_type = "csv" if file.filename.endswith(".csv") else "json"
-    collection_name = file.filename.replace(f".{file_type}", "").lower()
+    # Save uploaded file
+    file_path = save_upload(file)
+
+    streaming = (request.form.get('mode') == 'stream' or file_type != "csv"
+                 or os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES)
+    ingest_options = {
+        key: int(request.form[key])
+        for key in ('chunk_size', 'batch_size', 'workers')
+        if request.form.get(key)
+    }
+    return submit_upload(
+        "nosql", collection_name, file_path,
+        lambda job: load_nosql_upload(file_path, collection_name, write_mode, key_column, streaming, ingest_options, job,
+                                      file_type),
+    )
 
+def forget_collection(collection_name):
+    """Drop a collection and everything known about it (a cancelled replace left it partly loaded)."""
+    get_mongo_db(MONGO_DB_NAME).drop_collection(collection_name)
+    nosql_metadata_store.pop(collection_name, None)
+    nosql_ingest_state.pop(collection_name, None)
+    result_cache.invalidate("nosql", collection_name)
+    translation_cache.invalidate("nosql", collection_name)
+    mongo_index_advisor.reset(collection_name)
+
+def load_nosql_upload(file_path, collection_name, write_mode, key_column, streaming, ingest_options, job, file_type="csv"):
+    """Upload job body: load the file into MongoDB, then store its metadata and drop stale cache entries."""
     try:
-        # Load data into MongoDB
-        if file_type == "csv":
-            metadata = csv_to_mongo_loader(
+        if write_mode != 'replace':
+            previous = nosql_metadata_store.get(collection_name)
+            state = nosql_ingest_state.get(collection_name)
+            if previous is None or state is None:
+                raise ValueError(f"Collection '{collection_name}' has to be uploaded in replace mode before {write_mode}.")
+            metadata = merge_csv_into_mongo(
                 file_path=file_path,
-                mongo_uri="mongodb://localhost:27017/",
-                db_name="nosql_db",
+                db_name=MONGO_DB_NAME,
                 collection_name=collection_name,
+                metadata=previous,
+                state=state,
+                write_mode=write_mode,
+                key=key_column,
+                progress=job,
+                **ingest_options,
             )
         else:
-            # JSON handling can be implemented similarly
-            return jsonify({"error": "JSON upload not yet implemented."}), 400
+            # Re-uploading a file replaces its documents instead of adding a second copy
+            job.check()
+            get_mongo_db(MONGO_DB_NAME).drop_collection(collection_name)
+            if file_type == "json":
+                # Documents parsed one at a time, nesting kept, with a field-path profile
+                metadata = stream_json_to_mongo(
+                    file_path=file_path,
+                    db_name=MONGO_DB_NAME,
+                    collection_name=collection_name,
+                    progress=job,
+                    **{key: value for key, value in ingest_options.items() if key != 'chunk_size'},
+                )
+            elif streaming:
+                # Batched, unordered inserts of sparse documents across worker threads
+                metadata = stream_csv_to_mongo(
+                    file_path=file_path,
+                    db_name=MONGO_DB_NAME,
+                    collection_name=collection_name,
+                    progress=job,
+                    **ingest_options,
+                )
+            else:
+                metadata = csv_to_mongo_loader(
+                    file_path=file_path,
+                    db_name=MONGO_DB_NAME,
+                    collection_name=collection_name,
+                    progress=job,
+                )
+            if metadata is None:
+                raise RuntimeError("Loading the file into MongoDB failed.")
+    except Exception as e:
+        # Appended batches stay (re-running a keyed append/upsert is safe); a half-replaced collection does not
+        if job.cancel_requested and write_mode == 'replace' and job.reached("reading"):
+            forget_collection(collection_name)
+        raise RuntimeError(f"Failed to upload file: {str(e)}") from e
+
+    # Save metadata to global store
+    job.phase("finalizing")
+    nosql_ingest_state[collection_name] = metadata[collection_name].pop("ingest_state")
+    stored = dict(metadata[collection_name])
+    same_schema = write_mode != 'replace' and carry_schema_version(
+        nosql_metadata_store, collection_name, stored, NOSQL_SCHEMA_FIELDS
+    )
+    nosql_metadata_store[collection_name] = stored
 
-        # Save metadata to global store
-        nosql_metadata_store[collection_name] = metadata[collection_name]
+    # New documents only invalidate results; translations and index workload follow the schema
+    result_cache.invalidate("nosql", collection_name)
+    if not same_schema:
+        translation_cache.invalidate("nosql", collection_name)
+        mongo_index_advisor.reset(collection_name)
 
-        return jsonify({
-            "message": f"Collection '{collection_name}' uploaded successfully.",
-            "metadata": metadata
-        })
-    except Exception as e:
-        return jsonify({"error": f"Failed to upload file: {str(e)}"}), 500
+    return {
+        "message": f"Collection '{collection_name}' uploaded successfully.",
+        "metadata": metadata
+    }
+
+@app.route('/mongo-client-stats', methods=['GET'])
+def mongo_stats():
+    return jsonify(mongo_client_stats())
 
 @app.route('/preview-nosql', methods=['GET'])
 def preview_nosql():
@@ -342,7 +807,7 @@ def preview_nosql():
         return jsonify({"error": "No collection name provided."}), 400
 
     # Connect to MongoDB and fetch preview data
-    db = connect_to_mongodb_localhost("nosql_db")
+    db = connect_to_mongodb_localhost(MONGO_DB_NAME)
     if db is None:
         return jsonify({"error": "Failed to connect to MongoDB."}), 500
 
@@ -356,24 +821,91 @@ def preview_nosql():
         return jsonify({"error": f"Error fetching collection preview: {str(e)}"}), 500
 
 
+def parse_nosql_query(user_query, collection_name):
+    aggregation = parse_aggregation(user_query, collection_name, nosql_metadata_store)
+    display_columns = parse_display_columns(user_query, collection_name, nosql_metadata_store)
+    conditions = parse_conditions(user_query, collection_name, nosql_metadata_store)
+    sorting = parse_sorting(user_query, collection_name, nosql_metadata_store)
+    return aggregation, display_columns, conditions, sorting, parse_limit(user_query)
+
+def record_nosql_workload(collection_name, conditions, sorting, projection, metadata):
+    """Feed the index advisor; with auto-indexing on, build due indexes in the background."""
+    if mongo_index_advisor.record(collection_name, conditions, sorting, projection) is None:
+        return
+    due = mongo_index_advisor.due(collection_name, metadata)
+    if due:
+        collection = get_mongo_db(MONGO_DB_NAME)[collection_name]
+        threading.Thread(target=mongo_index_advisor.apply_many, args=(collection, due), daemon=True).start()
+
+@app.route('/nosql-index-advisor', methods=['GET'])
+def nosql_index_advisor_report():
+    """Field usage and ESR-ordered index candidates for a collection; explain=1 adds the current plans."""
+    collection_name = request.args.get("collection")
+    if not collection_name:
+        return jsonify({"error": "No collection name provided."}), 400
+    metadata = nosql_metadata_store.get(collection_name)
+    if not metadata:
+        return jsonify({"error": f"No metadata found for collection '{collection_name}'."}), 404
+
+    try:
+        collection = get_mongo_db(MONGO_DB_NAME)[collection_name]
+        existing = existing_mongo_indexes(collection)
+        candidates = mongo_index_advisor.candidates(collection_name, metadata, existing)
+        if request.args.get("explain") in ("1", "true"):
+            for candidate in candidates:
+                candidate["explain"] = mongo_index_advisor.explain(collection, candidate)
+    except Exception as e:
+        return jsonify({"error": f"Failed to inspect indexes: {str(e)}"}), 500
+
+    return app.response_class(
+        json_util.dumps({
+            "collection": collection_name,
+            "auto_index": mongo_index_advisor.auto_index,
+            "workload": mongo_index_advisor.workload(collection_name),
+            "existing_indexes": [[list(pair) for pair in keys] for keys in existing],
+            "candidates": candidates,
+        }),
+        mimetype="application/json",
+    )
+
+@app.route('/nosql-index-advisor/apply', methods=['POST'])
+def nosql_index_advisor_apply():
+    """Build recommended indexes (all, or those named in "names"); each is kept only if the planner uses it."""
+    data = request.json or {}
+    collection_name = data.get("collection")
+    metadata = nosql_metadata_store.get(collection_name) if collection_name else None
+    if not metadata:
+        return jsonify({"error": f"No metadata found for collection '{collection_name}'."}), 404
+
+    candidates = mongo_index_advisor.candidates(collection_name, metadata)
+    names = data.get("names")
+    if names:
+        candidates = [candidate for candidate in candidates if candidate["name"] in names]
+    if not candidates:
+        return jsonify({"error": "No matching index candidates."}), 404
+
+    try:
+        collection = get_mongo_db(MONGO_DB_NAME)[collection_name]
+        results = mongo_index_advisor.apply_many(collection, candidates)
+    except Exception as e:
+        return jsonify({"error": f"Failed to build indexes: {str(e)}"}), 500
+    return app.response_class(json_util.dumps({"collection": collection_name, "results": results}), mimetype="application/json")
+
 @app.route('/process-nosql-query', methods=['POST'])
 def process_nosql_query():
-    print("Received a request to /process-nosql-query")
     data = request.json
-    print(f"Request data: {data}")
+    log_sampled(logger, logging.DEBUG, "/process-nosql-query request: %s", data)
     
     user_query = data.get("query")
     collection_name = data.get("collection")
+    # Clients may choose the id they later cancel the query with
+    request_id = new_request_id(data.get("request_id") or request.headers.get("X-Request-Id"))
     
     if not user_query or not collection_name:
-        print("Error: Missing query or collection name.")
         return jsonify({"error": "Missing query or collection name."}), 400
     
-    # Log metadata
-    print(f"Selected collection: {collection_name}")
     metadata = nosql_metadata_store.get(collection_name)
     if not metadata:
-        print(f"Error: No metadata found for collection '{collection_name}'.")
         return jsonify({"error": f"No metadata found for collection '{collection_name}'."}), 404
 
     if "sample" in user_query.lower():
@@ -391,65 +923,186 @@ def process_nosql_query():
                 raise ValueError("No valid query type detected in the user query.")
             
             query = generate_random_mongodb_query(detected_nosql_query_type, collection_name, nosql_metadata_store)
-            print(f"Generated sample query: {query}")
+            logger.debug("Generated sample query: %s", query)
             return jsonify({"sample_query": query})
 
         except Exception as e:
-            print(f"Error generating sample query: {str(e)}")
+            logger.warning("Error generating sample query: %s", e)
             return jsonify({"error": f"Error generating sample query: {str(e)}"}), 500
     
+    timer = RequestTimer("nosql")
     try:
-        # Parse query components
-        aggregation = parse_aggregation(user_query, collection_name, nosql_metadata_store)
-        display_columns = parse_display_columns(user_query, collection_name, nosql_metadata_store)
-        conditions = parse_conditions(user_query, collection_name, nosql_metadata_store)
-        sorting = parse_sorting(user_query, collection_name, nosql_metadata_store)
+        # Parse query components (cached per collection schema version)
+        data_version = catalog_version(nosql_metadata_store, collection_name)
+        with timer.span("translate"):
+            aggregation, display_columns, conditions, sorting, limit = translation_cache.get_or_translate(
+                "nosql", collection_name, schema_version(nosql_metadata_store, collection_name), user_query,
+                lambda: parse_nosql_query(user_query, collection_name),
+            )
+
+        log_sampled(logger, logging.DEBUG, "Parsed aggregation=%s conditions=%s display=%s sorting=%s",
+                    aggregation, conditions, display_columns, sorting)
 
-        print(f"Aggregation: {aggregation}")
-        print(f"Conditions: {conditions}")
-        print(f"Display Columns: {display_columns}")
-        print(f"Sorting: {sorting}")
+        # Index fields let the examined-rows estimate follow index seeks; only that limit needs them
+        indexes = ()
+        if cost_guard.max_examined:
+            indexes = [tuple(field for field, _ in keys)
+                       for keys in existing_mongo_indexes(connect_to_mongodb_localhost(MONGO_DB_NAME)[collection_name])]
 
         if aggregation:
             # Aggregation query
-            pipeline = []
-            if conditions:
-                pipeline.append({"$match": conditions})
-            pipeline.append(aggregation)
-            if sorting:
-                pipeline.append({"$sort": sorting})
+            pipeline = build_pipeline(conditions, aggregation, sorting, limit)
+            # Aggregation results come back in one response
+            estimate = estimate_pipeline(pipeline, metadata, indexes)
+            action = cost_guard.decide(estimate)
+            if action == "limit":
+                # One document past the limit tells whether the result was cut
+                pipeline.append({"$limit": cost_guard.max_rows + 1})
+            # Early $project, merged $match stages, top-k $sort+$limit; allowDiskUse for large groups
+            plan = optimize_pipeline(pipeline, metadata, data.get("allow_disk_use"))
+            pipeline = plan.stages
             query_string = f"db.{collection_name}.aggregate({str(pipeline).replace('None', 'null')})"
-
-            # Execute aggregation query
-            db = connect_to_mongodb_localhost("nosql_db")
-            collection = db[collection_name]
-            results = list(collection.aggregate(pipeline))
         else:
+            # Find results are paged, so only the examined-rows limit applies
+            estimate = estimate_find(conditions, sorting, metadata, indexes)
+            action = cost_guard.decide(estimate, buffered=False)
             # Standard find query
             query_string = f"db.{collection_name}.find("
             query_string += f"{conditions}, {display_columns})" if display_columns else f"{conditions}, {{}})"
             if sorting:
                 query_string += f".sort({sorting})"
 
-            # Execute find query
-            db = connect_to_mongodb_localhost("nosql_db")
-            collection = db[collection_name]
-            cursor = collection.find(conditions, display_columns)
-            if sorting:
-                cursor = cursor.sort(list(sorting.items()))
-            results = list(cursor.limit(10))  # Limit results for safety
-
-        print(f"Query String: {query_string}")
-        print(f"Query Results: {results}")
-
-        # Convert ObjectId to string for JSON response
-        for result in results:
-            if "_id" in result:
-                result["_id"] = str(result["_id"])
-        return jsonify({"query": query_string, "data": results})
+        # Find queries are paged by (sort key, _id); the token resumes after the last document
+        page_size = data.get("page_size", DEFAULT_FIND_PAGE_SIZE)
+        page_token = data.get("page_token")
+        include_count = bool(data.get("include_count"))
+        cache_key = query_string if aggregation else f"{query_string} page_size={page_size} token={page_token} count={include_count}"
+        cost = {**estimate.to_dict(), "action": action}
+
+        if action == "stream":
+            # Too large for one response: one JSON document per line straight from the cursor
+            collection = connect_to_mongodb_localhost(MONGO_DB_NAME)[collection_name]
+            record_nosql_workload(collection_name, conditions, None, None, metadata)
+            running = query_manager.admit(request_id, "nosql", collection_name, query_string)
+
+            def generate_documents():
+                outcome = "error"
+                try:
+                    with running.bound(lambda: kill_operations(collection.database.client, request_id)), \
+                            running.interruptible():
+                        with timer.span("execute"):
+                            cursor = collection.aggregate(pipeline, **plan.options(), **running.command_options())
+                        for document in cursor:
+                            with timer.span("serialize"):
+                                line = json.dumps(document, default=str) + "\n"
+                            yield line
+                    outcome = "ok"
+                except QueryControlError as e:
+                    # The status line is already sent; a last line says why the stream stopped
+                    outcome = e.outcome
+                    query_manager.record(e)
+                    yield json.dumps({"error": str(e), "request_id": request_id}) + "\n"
+                finally:
+                    query_manager.done(running)
+                    timer.finish(outcome)
+
+            response = Response(
+                stream_with_context(generate_documents()),
+                mimetype="application/x-ndjson",
+                headers={"X-Query": query_string, "X-Query-Cost": json.dumps(cost), "X-Request-Id": request_id,
+                         "X-Pipeline-Rewrites": json.dumps(plan.rewrites)},
+            )
+            # Frees the collection slot even when the client leaves before the first document
+            response.call_on_close(lambda: query_manager.done(running))
+            return response
+
+        # Data only changes on upload, so results are cached per data version
+        page = result_cache.get("nosql", collection_name, data_version, cache_key)
+        cached = page is not None
+        if not cached:
+            with timer.span("connect"):
+                db = connect_to_mongodb_localhost(MONGO_DB_NAME)
+                collection = db[collection_name]
+            with query_manager.run(request_id, "nosql", collection_name, query_string) as running:
+                if aggregation:
+                    # Execute aggregation query; aggregate() runs it and returns the first batch
+                    with running.bound(lambda: kill_operations(db.client, request_id)):
+                        with timer.span("execute"):
+                            cursor = collection.aggregate(pipeline, **plan.options(), **running.command_options())
+                        with timer.span("fetch"):
+                            results = list(cursor)
+                    # Only the leading $match can use an index; the $sort runs on grouped output
+                    record_nosql_workload(collection_name, conditions, None, None, metadata)
+
+                    # Convert ObjectId to string for JSON response
+                    for result in results:
+                        if "_id" in result:
+                            result["_id"] = str(result["_id"])
+                    page = {"data": results}
+                else:
+                    # Execute find query
+                    try:
+                        page = fetch_find_page(
+                            collection, conditions, display_columns, sorting, query_string, data_version,
+                            page_size=page_size, token=page_token, include_count=include_count, timer=timer,
+                            control=running,
+                        )
+                    except InvalidFindToken as e:
+                        timer.finish("invalid_token")
+                        return jsonify({"error": str(e)}), 409
+                    record_nosql_workload(collection_name, conditions, sorting, display_columns, metadata)
+            result_cache.put("nosql", collection_name, data_version, cache_key, page)
+        if action == "limit":
+            cost["truncated"] = len(page["data"]) > cost_guard.max_rows
+            page = {**page, "data": page["data"][:cost_guard.max_rows]}
+
+        # Result dumps are sampled and formatted only when actually logged
+        log_sampled(logger, logging.DEBUG, "Query %s returned %s", query_string, page["data"])
+
+        payload = {"query": query_string, **page, "cached": cached, "cost": cost, "request_id": request_id}
+        if aggregation:
+            payload["pipeline"] = plan.to_dict()
+        return timed_response(timer, payload, "cached" if cached else "ok")
+    except QueryRejected as e:
+        timer.finish("rejected")
+        return jsonify({"error": str(e), "cost": {**e.estimate.to_dict(), "action": "reject"}}), 422
+    except QueryControlError as e:
+        return query_control_response(timer, e, request_id)
     except Exception as e:
-        print(f"Error processing query: {str(e)}")
+        timer.finish("error")
+        logger.exception("NoSQL query failed for collection '%s'", collection_name)
         return jsonify({"error": f"Failed to process query: {str(e)}"}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition: request/stage latency histograms plus pool and cache gauges."""
+    pool = get_mysql_pool().stats()
+    mongo_pool = mongo_client_stats()["pool"]
+    caches = {"translation": translation_cache.stats(), "result": result_cache.stats()}
+    queries = query_manager.stats()
+    body = render_metrics(
+        gauge_lines("chatdb_mysql_pool_connections", "MySQL pool connections by state.",
+                    {"in_use": pool["in_use"], "idle": pool["idle"]}, "state"),
+        gauge_lines("chatdb_mysql_pool_wait_seconds_max", "Longest MySQL pool checkout wait.",
+                    {None: pool["wait_time_max"]}),
+        gauge_lines("chatdb_mongo_pool_connections", "MongoDB connections open and checked out.",
+                    {"open": mongo_pool["connections_created"] - mongo_pool["connections_closed"],
+                     "in_use": mongo_pool["checkouts"] - mongo_pool["checkins"]}, "state"),
+        gauge_lines("chatdb_cache_entries", "Cached entries per cache.",
+                    {name: stats["entries"] for name, stats in caches.items()}, "cache"),
+        gauge_lines("chatdb_cache_hit_ratio", "Lifetime hit ratio per cache.",
+                    {name: stats["hit_ratio"] for name, stats in caches.items()}, "cache"),
+        gauge_lines("chatdb_upload_jobs", "Upload jobs by status (finished ones until trimmed).",
+                    upload_jobs.counts(), "status"),
+        gauge_lines("chatdb_cost_guard_decisions", "Queries by cost guard decision since start.",
+                    cost_guard.stats()["decisions"], "action"),
+        gauge_lines("chatdb_queries", "Queries running and waiting for a table slot.",
+                    {state: queries[state] for state in ("running", "waiting")}, "state"),
+        gauge_lines("chatdb_query_control_events", "Admitted, queued, shed, timed-out and cancelled queries since start.",
+                    {event: queries[event] for event in ("admitted", "queued", "shed", "timeout", "cancelled")}, "event"),
+    )
+    return Response(body, mimetype="text/plain; version=0.0.4")
     
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+"""
+Ingest benchmark for the MySQL and MongoDB upload loaders.
+
+Generates a synthetic CSV and runs each loader against local stand-ins (SQLite
+for MySQL, mongomock for MongoDB), each in a fresh process so peak RSS is measured
+per loader. CSV parsing, metadata extraction (of which column profiling) and
+insert time are reported separately. Run from the project directory:
+
+    python benchmarks/bench_ingest.py --rows 200000 --numeric 8 --categorical 6 --dates 1
+    python benchmarks/bench_ingest.py --profile-workers 8 --csv-engine pyarrow
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADERS = ["mysql-full", "mysql-stream", "mongo-full", "mongo-stream"]
+
+
+def generate_csv(path, rows, numeric=5, categorical=5, dates=1, cardinality=100, null_fraction=0.0,
+                 seed=551, chunk_rows=100000):
+    """
+    Write a synthetic CSV in chunks (bounded memory).
+
+    Columns: an integer `row_id`, `numeric` float measures, `categorical` string
+    columns drawing from `cardinality` distinct values, and `dates` date columns.
+    `null_fraction` of the non-key cells are left empty.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"value_{i}" for i in range(cardinality)])
+    epoch = np.datetime64("2020-01-01")
+    written = 0
+    with open(path, "w", newline="") as handle:
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            frame = {"row_id": np.arange(written, written + n)}
+            for i in range(numeric):
+                frame[f"measure_{i}"] = rng.normal(100, 25, n).round(3)
+            for i in range(categorical):
+                frame[f"attr_{i}"] = vocabulary[rng.integers(0, cardinality, n)]
+            for i in range(dates):
+                frame[f"date_{i}"] = (epoch + rng.integers(0, 3650, n).astype("timedelta64[D]")).astype(str)
+            chunk = pd.DataFrame(frame)
+            if null_fraction:
+                mask = rng.random((n, chunk.shape[1] - 1)) < null_fraction
+                chunk.iloc[:, 1:] = chunk.iloc[:, 1:].mask(mask)
+            chunk.to_csv(handle, index=False, header=written == 0)
+            written += n
+    return path
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_loader(loader, csv_path, options, work_dir, queue):
+    """Child process: import the app with stand-ins, run one loader, report stats."""
+    os.environ["CHATDB_CATALOG_PATH"] = os.path.join(work_dir, f"catalog-{loader}.sqlite3")
+    if options["profile_workers"]:
+        os.environ["CHATDB_PROFILE_WORKERS"] = str(options["profile_workers"])
+    os.environ["CHATDB_CSV_ENGINE"] = options["csv_engine"]
+    sys.path.insert(0, PROJECT_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import contextlib
+    import io
+    from standins import SQLitePool, mongomock_client, use_mongo_standin
+
+    import app
+    import nosql_ingest
+    import sql_ingest
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    error = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        if loader.startswith("mysql"):
+            pool = SQLitePool(os.path.join(work_dir, f"{loader}.sqlite3"))
+            if loader == "mysql-full":
+                metadata, error = app.process_and_load_csv(csv_path, pool)
+            else:
+                metadata, error = sql_ingest.stream_csv_to_mysql(
+                    csv_path, pool, chunk_size=options["chunk_size"], batch_size=options["batch_size"]
+                )
+            stats = metadata["ingest_stats"] if metadata else {}
+        else:
+            use_mongo_standin(mongomock_client(), app, nosql_ingest)
+            collection_name = os.path.splitext(os.path.basename(csv_path))[0]
+            if loader == "mongo-full":
+                metadata = app.csv_to_mongo_loader(csv_path, "bench", collection_name)
+            else:
+                metadata = nosql_ingest.stream_csv_to_mongo(
+                    csv_path, "bench", collection_name, chunk_size=options["chunk_size"],
+                    batch_size=options["batch_size"], workers=options["workers"],
+                )
+            stats = metadata[collection_name]["ingest_stats"] if metadata else {}
+            error = None if metadata else "loader returned no metadata"
+    wall = time.perf_counter() - started
+    queue.put({
+        "loader": loader,
+        "error": error,
+        "wall_seconds": wall,
+        "stats": stats,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": rss_before,
+    })
+
+
+def run_loader(loader, csv_path, options, work_dir):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_loader, args=(loader, csv_path, options, work_dir, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def print_report(results, rows):
+    print(f"{'loader':<14}{'rows/s':>10}{'total s':>9}{'read s':>9}{'meta s':>9}{'prof s':>9}{'insert s':>10}{'peak RSS MB':>13}{'+RSS MB':>9}")
+    for result in results:
+        if result["error"]:
+            print(f"{result['loader']:<14} ERROR: {result['error']}")
+            continue
+        stats = result["stats"]
+        print(
+            f"{result['loader']:<14}{rows / result['wall_seconds']:>10.0f}{stats.get('seconds', 0):>9.2f}"
+            f"{stats.get('read_seconds', 0):>9.2f}{stats.get('metadata_seconds', 0):>9.2f}{stats.get('profile_seconds', 0):>9.2f}"
+            f"{stats.get('insert_seconds', 0):>10.2f}{result['peak_rss_mb']:>13.1f}"
+            f"{result['peak_rss_mb'] - result['rss_before_mb']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--numeric", type=int, default=5, help="number of float columns")
+    parser.add_argument("--categorical", type=int, default=5, help="number of string columns")
+    parser.add_argument("--dates", type=int, default=1, help="number of date columns")
+    parser.add_argument("--cardinality", type=int, default=100, help="distinct values per string column")
+    parser.add_argument("--null-fraction", type=float, default=0.0, help="share of empty cells")
+    parser.add_argument("--loaders", nargs="+", choices=LOADERS, default=LOADERS)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4, help="MongoDB streaming insert workers")
+    parser.add_argument("--profile-workers", type=int, help="column profiling threads (default CHATDB_PROFILE_WORKERS)")
+    parser.add_argument("--csv-engine", choices=["c", "pyarrow"], default="c", help="parser for whole-file reads")
+    parser.add_argument("--csv", help="benchmark an existing CSV instead of generating one")
+    args = parser.parse_args()
+
+    options = {
+        "chunk_size": args.chunk_size, "batch_size": args.batch_size, "workers": args.workers,
+        "profile_workers": args.profile_workers, "csv_engine": args.csv_engine,
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = args.csv
+        if not csv_path:
+            csv_path = os.path.join(work_dir, "bench_ingest.csv")
+            started = time.perf_counter()
+            generate_csv(csv_path, args.rows, args.numeric, args.categorical, args.dates,
+                         args.cardinality, args.null_fraction)
+            size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+            print(f"Generated {args.rows} rows ({size_mb:.1f} MB) in {time.perf_counter() - started:.1f}s")
+        rows = sum(1 for _ in open(csv_path)) - 1
+
+        results = [run_loader(loader, csv_path, options, work_dir) for loader in args.loaders]
+        print_report(results, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
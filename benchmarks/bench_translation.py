@@ -0,0 +1,229 @@
+"""
+Translation throughput micro-benchmarks for the SQL and NoSQL translators.
+
+No database is needed: every function runs against synthetic metadata of growing
+width. Run from the project directory:
+
+    python benchmarks/bench_translation.py                   # print results
+    python benchmarks/bench_translation.py --save-baseline   # store as baseline
+    python benchmarks/bench_translation.py --compare         # fail on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_func import input_to_sql, selecting, filtering, sortlimit
+from nosql_func import parse_conditions, parse_aggregation, parse_sorting, parse_display_columns
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "translation.json")
+DEFAULT_WIDTHS = [10, 100, 1000]
+
+
+def synthetic_sql_metadata(width):
+    """Table metadata with `width` columns: half attributes, the rest measures and one date."""
+    attributes = [f"attr_{i}" for i in range(width // 2)]
+    measures = [f"measure_{i}" for i in range(width - len(attributes) - 1)]
+    dates = ["event_date"]
+    return {
+        "bench": {
+            "column_names": attributes + measures + dates,
+            "attributes": attributes,
+            "measures": measures,
+            "dates": dates,
+            "column_profiles": {},
+        }
+    }
+
+
+def synthetic_nosql_metadata(width):
+    categorical = [f"attr_{i}" for i in range(width // 2)]
+    numeric = [f"measure_{i}" for i in range(width - len(categorical))]
+    return {
+        "bench": {
+            "columns": categorical + numeric,
+            "categorical_columns": categorical,
+            "numeric_columns": numeric,
+            "column_profiles": {},
+        }
+    }
+
+
+def sql_corpus(width):
+    """Realistic NL questions covering every selecting/filtering/sortlimit pattern family."""
+    a0, a1 = "attr_0", f"attr_{width // 2 - 1}"
+    m0, m1 = "measure_0", f"measure_{width - width // 2 - 2}"
+    return [
+        f"total {m0} by {a0}",
+        f"average {m1} for each {a1} where {m0} greater than 10",
+        f"min {m0} per {a0} sorted by {a0} descending",
+        f"maximum {m1} grouped by {a1} limit 5",
+        f"count {a0} by {a1}",
+        f"sum of {m0} where {a0} is north",
+        f"mean {m1} where {m0} is less than or equal to 3",
+        f"smallest {m0}",
+        f"highest {m1} where event_date is 2020-01-01",
+        "number of rows",
+        f"Find {a0}, {m0} where {m0} between 5 and 10 limit 20 offset 40",
+        f"Show {a1} where {a0} is not equal to west sort by {m1} descending",
+        f"List {a0}, {a1}, {m0} where {m1} above 100 and {a1} is east",
+        f"top 5 {a0} by {m0}",
+        f"bottom 3 {a1} ordered by {m1}",
+        f"total {m0} by {a0} having sum {m0} greater than 1000",
+    ]
+
+
+def nosql_corpus(width):
+    a0, a1 = "attr_0", f"attr_{width // 2 - 1}"
+    m0, m1 = "measure_0", f"measure_{width - width // 2 - 1}"
+    return [
+        f"find {a0}, {m0} where {m0} greater than 10 order by {m0} desc",
+        f"find {a1} where {m1} less than 5",
+        f"find {a0} where {a0} equals north",
+        f"find {a0} where {a1} is not west",
+        f"find {m0} where {a0} is in (north, south, east)",
+        f"find {m0} where {a1} is not in (west)",
+        f"find {m1} where {m0} between 10 and 20 sort by {m1} asc",
+        f"find {a0} where {a0} starts with 'no'",
+        f"find average {m0} where {m1} greater than 3",
+        f"find sum {m1} where {a0} equals north order by {m1} asc",
+    ]
+
+
+def benchmark_cases(width):
+    """(family, function name, callable) for every translator entry point."""
+    sql_meta = synthetic_sql_metadata(width)
+    nosql_meta = synthetic_nosql_metadata(width)
+    column_names = sql_meta["bench"]["column_names"]
+    sql_queries = sql_corpus(width)
+    nosql_queries = nosql_corpus(width)
+
+    def safe(function, *args):
+        try:
+            function(*args)
+        except ValueError:
+            # NoSQL parsers raise on columns missing from the metadata; that path is timed too
+            pass
+
+    cases = []
+    for name, function in [
+        ("input_to_sql", lambda q: input_to_sql(q, "bench", sql_meta)),
+        ("selecting", lambda q: selecting(q, "bench", sql_meta)),
+        ("filtering", lambda q: filtering(q, column_names)),
+        ("sortlimit", lambda q: sortlimit(q, column_names)),
+    ]:
+        cases.append(("sql", name, function, sql_queries))
+    for name, function in [
+        ("parse_conditions", parse_conditions),
+        ("parse_aggregation", parse_aggregation),
+        ("parse_sorting", parse_sorting),
+        ("parse_display_columns", parse_display_columns),
+    ]:
+        cases.append(("nosql", name, lambda q, f=function: safe(f, q, "bench", nosql_meta), nosql_queries))
+    return cases
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(widths, iterations, warmup):
+    results = {}
+    for width in widths:
+        for family, name, function, queries in benchmark_cases(width):
+            for query in queries[:warmup]:
+                function(query)
+            samples = []
+            for _ in range(iterations):
+                for query in queries:
+                    started = time.perf_counter_ns()
+                    function(query)
+                    samples.append(time.perf_counter_ns() - started)
+            samples.sort()
+            total_seconds = sum(samples) / 1e9
+            results[f"{name}[{width}]"] = {
+                "family": family,
+                "function": name,
+                "width": width,
+                "calls": len(samples),
+                "p50_us": percentile(samples, 0.50) / 1000,
+                "p90_us": percentile(samples, 0.90) / 1000,
+                "p99_us": percentile(samples, 0.99) / 1000,
+                "mean_us": statistics.fmean(samples) / 1000,
+                "ops_per_second": len(samples) / total_seconds if total_seconds else 0.0,
+            }
+    return results
+
+
+def print_results(results, baseline=None):
+    header = f"{'benchmark':<30}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'ops/s':>12}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+    for key, row in results.items():
+        line = f"{key:<30}{row['p50_us']:>10.1f}{row['p90_us']:>10.1f}{row['p99_us']:>10.1f}{row['ops_per_second']:>12.0f}"
+        if baseline and key in baseline:
+            line += f"{row['p50_us'] / baseline[key]['p50_us']:>9.2f}x"
+        print(line)
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose median latency grew by more than `tolerance` over the baseline."""
+    regressions = []
+    for key, row in results.items():
+        base = baseline.get(key)
+        if base and row["p50_us"] > base["p50_us"] * (1 + tolerance):
+            regressions.append((key, base["p50_us"], row["p50_us"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--widths", type=int, nargs="+", default=DEFAULT_WIDTHS, help="column counts to test")
+    parser.add_argument("--iterations", type=int, default=50, help="passes over the query corpus")
+    parser.add_argument("--warmup", type=int, default=5, help="warm-up queries per benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit non-zero if any benchmark regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args.widths, args.iterations, args.warmup)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)["results"]
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as handle:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "results": results,
+            }, handle, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline found at {args.baseline}; run with --save-baseline first.")
+            return 2
+        regressions = compare(results, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: p50 {before:.1f}us -> {after:.1f}us")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Local stand-ins for MySQL and MongoDB so loaders can be benchmarked without servers.
+
+SQLitePool mimics the MySQLPool interface on top of an embedded SQLite database and
+rewrites the few MySQL-only bits of the generated SQL. mongomock provides an
+in-memory MongoClient.
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+_MYSQL_TO_SQLITE = [
+    (re.compile(r"BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY INVISIBLE", re.IGNORECASE),
+     "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    # SQLite has no ENUM and cannot change a column's type; its columns take any value anyway
+    (re.compile(r"ENUM\((?:'(?:[^'\\]|''|\\.)*'(?:,\s*)?)*\)", re.IGNORECASE), "TEXT"),
+    (re.compile(r"^ALTER TABLE \S+ MODIFY COLUMN .*$", re.IGNORECASE | re.DOTALL), "SELECT 1"),
+    (re.compile(r"^ALTER TABLE (\S+) ADD UNIQUE INDEX (\S+) \((.*)\)$", re.IGNORECASE),
+     r"CREATE UNIQUE INDEX \2 ON \1 (\3)"),
+    (re.compile(r"^SHOW INDEX FROM (\S+) WHERE Key_name = ", re.IGNORECASE),
+     r"SELECT name AS Key_name FROM sqlite_master WHERE type = 'index' AND tbl_name = '\1' AND name = "),
+    (re.compile(r"ON DUPLICATE KEY UPDATE", re.IGNORECASE), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"<=>"), " IS "),
+    (re.compile(r"%s"), "?"),
+]
+
+
+def to_sqlite(query):
+    for pattern, replacement in _MYSQL_TO_SQLITE:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class SQLiteCursor:
+    def __init__(self, connection, dictionary=False, **_):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(to_sqlite(query), params)
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(to_sqlite(query), rows)
+
+    def _rows(self, rows):
+        if not self._dictionary:
+            return rows
+        names = [column[0] for column in self._cursor.description]
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def fetchmany(self, size):
+        return self._rows(self._cursor.fetchmany(size))
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, **options):
+        return SQLiteCursor(self._connection, **options)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLitePool:
+    """Drop-in for sql_pool.MySQLPool backed by one embedded SQLite connection."""
+
+    def __init__(self, path=":memory:"):
+        self._connection = SQLiteConnection(path)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        with self._lock:
+            try:
+                yield self._connection
+            finally:
+                self._connection.rollback()
+
+    def stats(self):
+        in_use = int(self._lock.locked())
+        return {"pool_size": 1, "open": 1, "in_use": in_use, "idle": 1 - in_use, "wait_time_max": 0.0, "backend": "sqlite"}
+
+
+def _drop_arguments(method, *names):
+    def call(*args, **kwargs):
+        for name in names:
+            kwargs.pop(name, None)
+        return method(*args, **kwargs)
+    return call
+
+
+def _accept_new_pymongo_arguments():
+    """Ignore arguments newer pymongo versions pass that mongomock does not know yet."""
+    from mongomock.collection import BulkOperationBuilder, Collection
+
+    if getattr(Collection, "_chatdb_compatible", False):
+        return
+    # Bulk UpdateOne/ReplaceOne pass a sort; queries tagged for killOp pass a comment
+    BulkOperationBuilder.add_update = _drop_arguments(BulkOperationBuilder.add_update, "sort")
+    BulkOperationBuilder.add_replace = _drop_arguments(BulkOperationBuilder.add_replace, "sort")
+    for name in ("find", "count_documents", "estimated_document_count"):
+        setattr(Collection, name, _drop_arguments(getattr(Collection, name), "comment"))
+    Collection._chatdb_compatible = True
+
+
+def mongomock_client():
+    """In-memory MongoClient, or a clear error when mongomock is not installed."""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The MongoDB stand-in needs mongomock: pip install mongomock")
+    _accept_new_pymongo_arguments()
+    return mongomock.MongoClient()
+
+
+def use_mongo_standin(client, *modules):
+    """Point get_mongo_client() at `client` in mongo_client and in modules that imported it."""
+    import mongo_client
+    getter = lambda: client
+    mongo_client.get_mongo_client = getter
+    for module in modules:
+        module.get_mongo_client = getter
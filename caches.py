@@ -0,0 +1,180 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+TRANSLATION_CACHE_SIZE = int(os.environ.get("CHATDB_TRANSLATION_CACHE_SIZE", "2048"))
+
+
+class TranslationCache:
+    """
+    Bounded LRU of natural-language translations.
+
+    Keys are (kind, table, schema_version, normalized_query). Because the schema
+    version is part of the key, a re-uploaded table never hits translations made
+    for its old schema; invalidate() additionally frees those entries right away.
+    """
+
+    def __init__(self, max_entries=TRANSLATION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(kind, query):
+        # The SQL translator is case-insensitive; the NoSQL parsers keep literal values as typed
+        return query.lower() if kind == "sql" else query
+
+    def get_or_translate(self, kind, name, version, query, translate):
+        """Return the cached translation or call translate() and remember its result."""
+        key = (kind, name, version, self.normalize(kind, query))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+            self.misses += 1
+
+        translation = translate()
+
+        with self._lock:
+            self._entries[key] = copy.deepcopy(translation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return translation
+
+    def invalidate(self, kind, name):
+        """Drop every cached translation for one table or collection."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == kind and key[1] == name]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+def catalog_version(metadata_store, name):
+    """Catalog version of `name`, bumped by every upload; plain dicts count as version 0."""
+    version = getattr(metadata_store, "version", None)
+    return version(name) if version else 0
+
+
+def schema_version(metadata_store, name):
+    """
+    Data version at which the schema of `name` last changed. Incremental uploads
+    that keep the columns and their classification carry it over (see
+    carry_schema_version()), so translations stay cached across them.
+    """
+    metadata = metadata_store.get(name) or {}
+    version = metadata.get("schema_version")
+    return version if version is not None else catalog_version(metadata_store, name)
+
+
+def carry_schema_version(metadata_store, name, metadata, schema_fields):
+    """
+    Copy the current schema version into `metadata` when none of `schema_fields`
+    changed. Returns True when the schema is unchanged.
+    """
+    previous = metadata_store.get(name)
+    if not previous or any(previous.get(field) != metadata.get(field) for field in schema_fields):
+        return False
+    metadata["schema_version"] = schema_version(metadata_store, name)
+    return True
+
+
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("CHATDB_RESULT_CACHE_MB", "64")) * 1024 * 1024
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("CHATDB_RESULT_CACHE_ENTRY_MB", "4")) * 1024 * 1024
+
+
+class ResultCache:
+    """
+    Memory-bounded LRU of executed query results.
+
+    Keys are (kind, table, data_version, translated_query), so an upload that bumps
+    the table's version makes old results unreachable; invalidate() frees them.
+    Entry size is the length of the result's JSON encoding. Results larger than
+    `max_entry_bytes` are not cached. Cached results are shared: treat them as read-only.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, max_entry_bytes=RESULT_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()  # key -> (size, result)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.invalidations = 0
+
+    def get(self, kind, name, version, query):
+        key = (kind, name, version, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind, name, version, query, result):
+        size = len(json.dumps(result, default=str))
+        key = (kind, name, version, query)
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self.rejected += 1
+                return False
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[0]
+            self._entries[key] = (size, result)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def invalidate(self, kind, name):
+        """Drop every cached result for one table or collection."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == kind and key[1] == name]
+            for key in stale:
+                self.current_bytes -= self._entries.pop(key)[0]
+            self.invalidations += 1
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+# Location of the shared metadata catalog (one file for all worker processes)
+CATALOG_PATH = os.environ.get("CHATDB_CATALOG_PATH", "./chatdb_catalog.sqlite3")
+CATALOG_CACHE_SIZE = int(os.environ.get("CHATDB_CATALOG_CACHE_SIZE", "128"))
+
+
+class MetadataCatalog(MutableMapping):
+    """
+    Dict-like metadata store persisted in SQLite.
+
+    Every write bumps the entry's schema version. Reads load entries lazily and keep
+    them in an in-memory LRU; a cached entry is reused only while its version still
+    matches the catalog, so uploads handled by another worker process are picked up
+    on the next access. `kind` separates the SQL and NoSQL namespaces in one file.
+    """
+
+    def __init__(self, kind, path=CATALOG_PATH, cache_size=CATALOG_CACHE_SIZE):
+        self.kind = kind
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # name -> (version, metadata)
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS catalog ("
+            " kind TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, name))"
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _cache_put(self, name, version, metadata):
+        with self._cache_lock:
+            self._cache[name] = (version, metadata)
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def version(self, name):
+        """Current schema version of `name`, or None if it is not in the catalog."""
+        row = self._connect().execute(
+            "SELECT version FROM catalog WHERE kind = ? AND name = ?", (self.kind, name)
+        ).fetchone()
+        return row[0] if row else None
+
+    def __getitem__(self, name):
+        current = self.version(name)
+        if current is None:
+            with self._cache_lock:
+                self._cache.pop(name, None)
+            raise KeyError(name)
+
+        with self._cache_lock:
+            cached = self._cache.get(name)
+            if cached and cached[0] == current:
+                self._cache.move_to_end(name)
+                return cached[1]
+
+        row = self._connect().execute(
+            "SELECT version, metadata FROM catalog WHERE kind = ? AND name = ?", (self.kind, name)
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        metadata = json.loads(row[1])
+        self._cache_put(name, row[0], metadata)
+        return metadata
+
+    def __setitem__(self, name, metadata):
+        self.set(name, metadata)
+
+    def set(self, name, metadata):
+        """Store metadata for `name` and return its new schema version."""
+        connection = self._connect()
+        payload = json.dumps(metadata, default=str)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT version FROM catalog WHERE kind = ? AND name = ?", (self.kind, name)
+            ).fetchone()
+            version = row[0] + 1 if row else 1
+            connection.execute(
+                "INSERT OR REPLACE INTO catalog (kind, name, version, metadata, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (self.kind, name, version, payload, time.time()),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._cache_put(name, version, json.loads(payload))
+        return version
+
+    def __delitem__(self, name):
+        cursor = self._connect().execute("DELETE FROM catalog WHERE kind = ? AND name = ?", (self.kind, name))
+        with self._cache_lock:
+            self._cache.pop(name, None)
+        if cursor.rowcount == 0:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return self.version(name) is not None
+
+    def __iter__(self):
+        rows = self._connect().execute("SELECT name FROM catalog WHERE kind = ? ORDER BY name", (self.kind,))
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM catalog WHERE kind = ?", (self.kind,)).fetchone()[0]
@@ -0,0 +1,526 @@
+import datetime
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+
+POLICIES = ("limit", "stream", "reject", "off")
+# Results estimated above this many rows are never buffered into one JSON response
+COST_MAX_ROWS = int(os.environ.get("CHATDB_COST_MAX_ROWS", "10000"))
+# Queries estimated to examine more rows than this are rejected in every mode (0 disables)
+COST_MAX_EXAMINED = int(os.environ.get("CHATDB_COST_MAX_EXAMINED", "0"))
+# Selectivity assumed where the statistics say nothing (HAVING, unknown columns, operators)
+DEFAULT_SELECTIVITY = 1 / 3
+
+logger = logging.getLogger(__name__)
+
+
+def _cost_policy(requested):
+    """What happens to buffered results over COST_MAX_ROWS: "limit", "stream", "reject" or "off"."""
+    if requested not in POLICIES:
+        logger.warning("Unknown CHATDB_COST_POLICY %r; using 'limit'.", requested)
+        return "limit"
+    return requested
+
+
+COST_POLICY = _cost_policy(os.environ.get("CHATDB_COST_POLICY", "limit"))
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Shape of the SELECTs produced by input_to_sql(), including GROUP BY and HAVING
+_SQL_RE = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>\w+)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+GROUP BY\s+(?P<group>[\w,\s]+?))?"
+    r"(?:\s+HAVING\s+(?P<having>.+?))?"
+    r"(?:\s+ORDER BY\s+(?P<order>[\w,\s]*?)(?:\s+(?:ASC|DESC))?)?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\d+))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_LIMIT_RE = re.compile(r"(?:\s+LIMIT\s+(?P<limit>\d+))?(?:\s+OFFSET\s+(?P<offset>\d+))?\s*;?\s*$", re.IGNORECASE)
+_TERM_RE = re.compile(
+    r"^\s*\(?\s*(?P<column>\w+)\s*(?P<op>>=|<=|!=|<>|=|>|<|between\b|like\b|is\s+not\s+null\b|is\s+null\b)\s*(?P<value>.*?)\)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_AGGREGATE_RE = re.compile(r"\b(?:SUM|AVG|MIN|MAX|COUNT)\s*\(", re.IGNORECASE)
+_DISTINCT_RE = re.compile(r"^\s*DISTINCT\s+", re.IGNORECASE)
+
+
+class QueryRejected(ValueError):
+    """Raised when the cost guard refuses to run a query."""
+
+    def __init__(self, message, estimate):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+class CostEstimate:
+    """
+    Predicted size of one query: rows returned, rows examined and rows sorted.
+    Examined rows are the whole table (`full_scan`) unless an existing index
+    leads with filtered columns, in which case they are the rows its seek
+    reads. `cost` is in row operations: every examined row once plus
+    n*log2(k) for sorting n rows of which the first k are kept (k = n without
+    a limit).
+    """
+
+    __slots__ = ("rows", "examined", "sorted", "table_rows", "top", "full_scan")
+
+    def __init__(self, rows, examined, sorted_rows, table_rows, top=None, full_scan=True):
+        self.rows = rows
+        self.examined = examined
+        self.sorted = sorted_rows
+        self.table_rows = table_rows
+        self.top = top
+        self.full_scan = full_scan
+
+    @property
+    def cost(self):
+        kept = min(self.sorted, self.top or self.sorted)
+        return self.examined + (self.sorted * math.log2(kept) if kept > 1 else 0)
+
+    def to_dict(self):
+        return {
+            "estimated_rows": self.rows,
+            "rows_examined": self.examined,
+            "rows_sorted": self.sorted,
+            "table_rows": self.table_rows,
+            "full_scan": self.full_scan,
+            "cost": round(self.cost),
+        }
+
+
+def _number(value):
+    """Value on a numeric axis for range interpolation (numbers, numeric text, ISO dates), else None."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return (value.replace(tzinfo=None) - _EPOCH).total_seconds()
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return float(text)
+        except ValueError:
+            pass
+        try:
+            return _number(datetime.datetime.fromisoformat(text))
+        except ValueError:
+            return None
+    return None
+
+
+def _same(stored, value):
+    low, high = _number(stored), _number(value)
+    if low is not None and high is not None:
+        return low == high
+    # MySQL's default collation compares text case-insensitively
+    return str(stored).casefold() == str(value).casefold()
+
+
+def _shares(profile):
+    count = profile.get("count", 0)
+    return count, (count - profile.get("null_count", 0)) / count if count else 0.0
+
+
+def equality_selectivity(profile, value):
+    """Share of rows equal to `value`: its frequent-value count, else an even split of the remaining rows."""
+    count, non_null = _shares(profile)
+    if not count:
+        return 0.0
+    if value is None:
+        return 1.0 - non_null
+    top = profile.get("top_values", [])
+    for stored, frequency in top:
+        if _same(stored, value):
+            return frequency / count
+    rest_rows = count * non_null - sum(frequency for _, frequency in top)
+    rest_values = profile.get("distinct_estimate", 0) - len(top)
+    if rest_rows <= 0 or rest_values <= 0:
+        # Every value of the column is among the frequent ones
+        return 0.0
+    return rest_rows / rest_values / count
+
+
+def range_selectivity(profile, low=None, high=None):
+    """Share of rows within [low, high], interpolated between the column's min and max."""
+    count, non_null = _shares(profile)
+    if not count:
+        return 0.0
+    column_low, column_high = _number(profile.get("min")), _number(profile.get("max"))
+    bounds = [_number(bound) for bound in (low, high) if bound is not None]
+    if column_low is None or column_high is None or None in bounds:
+        return DEFAULT_SELECTIVITY * non_null
+    start = column_low if low is None else max(column_low, _number(low))
+    end = column_high if high is None else min(column_high, _number(high))
+    if end < start:
+        return 0.0
+    if column_high == column_low:
+        return non_null
+    if all(value.is_integer() for value in (start, end, column_low, column_high)):
+        # Integer columns: count the values covered, 5..8 is four of them
+        return non_null * (end - start + 1) / (column_high - column_low + 1)
+    # A range inside the column always keeps at least one value's worth of rows
+    one_value = 1 / max(1, profile.get("distinct_estimate", 1))
+    return non_null * max((end - start) / (column_high - column_low), one_value)
+
+
+def prefix_selectivity(profile, prefix):
+    """Share of rows starting with `prefix` (case-insensitive), from the column's sample."""
+    count, non_null = _shares(profile)
+    sample = [str(value).casefold() for value in profile.get("sample", []) if value is not None]
+    if not count or not sample:
+        return DEFAULT_SELECTIVITY * non_null
+    matches = sum(value.startswith(prefix.casefold()) for value in sample)
+    return non_null * max(matches / len(sample), 1 / count)
+
+
+def _rows(value):
+    # Any predicted match counts as at least one row
+    return max(1, round(value)) if value > 0 else 0
+
+
+def _table_rows(profiles):
+    return max((profile.get("count", 0) for profile in profiles.values()), default=0)
+
+
+def _distinct(profile):
+    # NULL forms its own group
+    return max(1, profile.get("distinct_estimate", 0) + (1 if profile.get("null_count") else 0))
+
+
+def _index_share(indexes, equality, ranges):
+    """
+    Smallest share of rows an index seek reads: the selectivities of the index's
+    leading equality columns and of one range column after them. None when no
+    index starts with a filtered column, so the query scans the table.
+    """
+    best = None
+    for columns in indexes:
+        share, used = 1.0, False
+        for column in columns:
+            if column in equality:
+                share *= equality[column]
+            elif column in ranges:
+                share *= ranges[column]
+                used = True
+                break
+            else:
+                break
+            used = True
+        if used:
+            best = share if best is None else min(best, share)
+    return best
+
+
+def _examined(table_rows, indexes, equality, ranges):
+    """(rows examined, full scan) for a filter whose indexable columns have these selectivities."""
+    share = _index_share(indexes, equality, ranges)
+    if share is None:
+        return table_rows, True
+    return _rows(table_rows * share), False
+
+
+def _literal(text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    return text
+
+
+def _split_where(where):
+    """Split a WHERE clause on AND, keeping `x BETWEEN a AND b` together."""
+    terms = []
+    pending_between = False
+    for part in _AND_RE.split(where):
+        if pending_between and terms:
+            terms[-1] += f" AND {part}"
+            pending_between = False
+            continue
+        terms.append(part)
+        pending_between = re.search(r"\bbetween\b", part, re.IGNORECASE) is not None
+    return terms
+
+
+def _sql_term_selectivity(term, profiles):
+    match = _TERM_RE.match(term)
+    profile = profiles.get(match.group("column").lower()) if match else None
+    if profile is None:
+        return DEFAULT_SELECTIVITY
+    op = " ".join(match.group("op").lower().split())
+    value = _literal(match.group("value"))
+    if op == "=":
+        return equality_selectivity(profile, value)
+    if op in ("!=", "<>"):
+        return max(0.0, _shares(profile)[1] - equality_selectivity(profile, value))
+    if op in (">", ">="):
+        return range_selectivity(profile, low=value)
+    if op in ("<", "<="):
+        return range_selectivity(profile, high=value)
+    if op == "between":
+        bounds = _AND_RE.split(match.group("value"), maxsplit=1)
+        if len(bounds) == 2:
+            return range_selectivity(profile, _literal(bounds[0]), _literal(bounds[1]))
+    elif op == "like":
+        prefix = re.split(r"[%_]", value, maxsplit=1)[0]
+        if prefix:
+            return prefix_selectivity(profile, prefix)
+    elif op == "is null":
+        return 1.0 - _shares(profile)[1]
+    elif op == "is not null":
+        return _shares(profile)[1]
+    return DEFAULT_SELECTIVITY
+
+
+def _sql_term_access(term):
+    """(column, "equality" | "range") when an index on the column can serve the term, else None."""
+    match = _TERM_RE.match(term)
+    if not match:
+        return None
+    op = " ".join(match.group("op").lower().split())
+    if op in ("=", "is null"):
+        return match.group("column").lower(), "equality"
+    if op in (">", ">=", "<", "<=", "between"):
+        return match.group("column").lower(), "range"
+    if op == "like" and not _literal(match.group("value")).startswith(("%", "_")):
+        return match.group("column").lower(), "range"
+    return None
+
+
+def estimate_sql(query, metadata, indexes=()):
+    """
+    CostEstimate of a translated SELECT from the table's column profiles, or None
+    when the query does not have the translator's single-table shape. Predicates
+    are assumed independent. `indexes` (column tuples of the table's secondary
+    indexes) let the rows examined follow an index seek instead of a full scan.
+    """
+    match = _SQL_RE.match(" ".join(query.split()))
+    if not match:
+        return None
+    profiles = metadata.get("column_profiles", {})
+    table_rows = _table_rows(profiles)
+
+    selectivity = 1.0
+    access = {"equality": {}, "range": {}}
+    if match.group("where"):
+        for term in _split_where(match.group("where")):
+            term_selectivity = _sql_term_selectivity(term, profiles)
+            selectivity *= term_selectivity
+            served = _sql_term_access(term)
+            if served:
+                column, kind = served
+                shares = access[kind]
+                shares[column] = shares.get(column, 1.0) * term_selectivity
+    rows = table_rows * selectivity
+    examined, full_scan = _examined(table_rows, indexes, access["equality"], access["range"])
+
+    select = match.group("select")
+    group = [column.strip().lower() for column in (match.group("group") or "").split(",") if column.strip()]
+    if group:
+        groups = math.prod(_distinct(profiles.get(column, {})) for column in group)
+        rows = min(rows, groups)
+        if match.group("having"):
+            rows *= DEFAULT_SELECTIVITY
+    elif _AGGREGATE_RE.search(select):
+        rows = 1
+    elif _DISTINCT_RE.match(select):
+        columns = [column.strip().lower() for column in _DISTINCT_RE.sub("", select).split(",")]
+        if all(column in profiles for column in columns):
+            rows = min(rows, math.prod(_distinct(profiles[column]) for column in columns))
+
+    sorted_rows = _rows(rows) if match.group("order") else 0
+    offset = int(match.group("offset") or 0)
+    rows = max(0, rows - offset)
+    top = None
+    if match.group("limit"):
+        top = int(match.group("limit")) + offset
+        rows = min(rows, int(match.group("limit")))
+    return CostEstimate(_rows(rows), examined, sorted_rows, table_rows, top, full_scan)
+
+
+def limit_sql(query, limit):
+    """The query returning at most `limit` rows: a smaller LIMIT replaces a larger one, OFFSET is kept."""
+    match = _LIMIT_RE.search(query)
+    existing = int(match.group("limit")) if match.group("limit") else None
+    clause = f" LIMIT {limit if existing is None else min(existing, limit)}"
+    if match.group("offset"):
+        clause += f" OFFSET {match.group('offset')}"
+    return query[:match.start()].rstrip() + clause
+
+
+def _field_selectivity(profile, condition):
+    if profile is None:
+        return DEFAULT_SELECTIVITY
+    if not isinstance(condition, dict):
+        return equality_selectivity(profile, condition)
+    if not any(key.startswith("$") for key in condition):
+        # Equality with an embedded document
+        return DEFAULT_SELECTIVITY
+
+    selectivity, low, high = 1.0, None, None
+    for op, operand in condition.items():
+        if op == "$eq":
+            selectivity *= equality_selectivity(profile, operand)
+        elif op == "$ne":
+            # Missing and null fields match $ne too
+            selectivity *= max(0.0, 1.0 - equality_selectivity(profile, operand))
+        elif op in ("$in", "$nin"):
+            share = min(1.0, sum(equality_selectivity(profile, value) for value in operand))
+            selectivity *= share if op == "$in" else 1.0 - share
+        elif op in ("$gt", "$gte"):
+            low = operand
+        elif op in ("$lt", "$lte"):
+            high = operand
+        elif op == "$regex":
+            prefix = re.match(r"\^([\w\s-]*)", operand) if isinstance(operand, str) else None
+            selectivity *= prefix_selectivity(profile, prefix.group(1)) if prefix and prefix.group(1) else DEFAULT_SELECTIVITY
+        elif op == "$exists":
+            non_null = _shares(profile)[1]
+            selectivity *= non_null if operand else 1.0 - non_null
+        elif op != "$options":
+            selectivity *= DEFAULT_SELECTIVITY
+    if low is not None or high is not None:
+        selectivity *= range_selectivity(profile, low, high)
+    return selectivity
+
+
+def filter_selectivity(conditions, profiles):
+    """Share of documents a find/$match filter keeps, from the collection's column profiles."""
+    selectivity = 1.0
+    for key, value in (conditions or {}).items():
+        if key == "$and":
+            selectivity *= math.prod(filter_selectivity(clause, profiles) for clause in value)
+        elif key == "$or":
+            selectivity *= 1.0 - math.prod(1.0 - filter_selectivity(clause, profiles) for clause in value)
+        elif key == "$nor":
+            selectivity *= math.prod(1.0 - filter_selectivity(clause, profiles) for clause in value)
+        elif key.startswith("$"):
+            selectivity *= DEFAULT_SELECTIVITY
+        else:
+            selectivity *= _field_selectivity(profiles.get(key), value)
+    return selectivity
+
+
+def _filter_access(conditions, profiles):
+    """({field: selectivity} of equality and $in conditions, {field: selectivity} of ranges) an index can serve."""
+    equality, ranges = {}, {}
+    for key, value in (conditions or {}).items():
+        if key == "$and":
+            for clause in value:
+                clause_equality, clause_ranges = _filter_access(clause, profiles)
+                for shares, found in ((equality, clause_equality), (ranges, clause_ranges)):
+                    for field, share in found.items():
+                        shares[field] = shares.get(field, 1.0) * share
+            continue
+        if key.startswith("$"):
+            continue
+        if not isinstance(value, dict) or set(value) <= {"$eq", "$in"}:
+            shares = equality
+        elif set(value) <= {"$gt", "$gte", "$lt", "$lte"}:
+            shares = ranges
+        else:
+            continue
+        shares[key] = shares.get(key, 1.0) * _field_selectivity(profiles.get(key), value)
+    return equality, ranges
+
+
+def _group_count(group_id, profiles):
+    if isinstance(group_id, str) and group_id.startswith("$"):
+        return _distinct(profiles.get(group_id[1:], {}))
+    if isinstance(group_id, dict):
+        return math.prod(_group_count(value, profiles) for value in group_id.values())
+    # A constant _id (None) folds everything into one group
+    return 1
+
+
+def estimate_pipeline(pipeline, metadata, indexes=()):
+    """
+    CostEstimate of an aggregation pipeline, stage by stage. Profiles describe
+    the stored documents only, so $match stages after a $group use the default
+    selectivity. `indexes` (field tuples of the collection's indexes) let a
+    leading $match examine only the documents an index seek reads.
+    """
+    profiles = metadata.get("column_profiles", {})
+    table_rows = _table_rows(profiles)
+    examined, full_scan = table_rows, True
+    if pipeline and "$match" in pipeline[0]:
+        examined, full_scan = _examined(table_rows, indexes, *_filter_access(pipeline[0]["$match"], profiles))
+    rows, sorted_rows, top, grouped = float(table_rows), 0, None, False
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            rows *= DEFAULT_SELECTIVITY if grouped else filter_selectivity(spec, profiles)
+        elif name == "$group":
+            rows = min(rows, _group_count(spec.get("_id"), profiles)) if rows >= 1 else rows
+            grouped = True
+        elif name == "$sort":
+            sorted_rows += _rows(rows)
+        elif name == "$limit":
+            # $sort followed by $limit keeps a top-k heap
+            top = spec if sorted_rows and top is None else top
+            rows = min(rows, spec)
+        elif name == "$skip":
+            rows = max(0, rows - spec)
+        elif name == "$count":
+            rows = 1
+    return CostEstimate(_rows(rows), examined, sorted_rows, table_rows, top, full_scan)
+
+
+def estimate_find(conditions, sorting, metadata, indexes=()):
+    """CostEstimate of a find() with an optional sort."""
+    pipeline = [{"$match": conditions or {}}]
+    if sorting:
+        pipeline.append({"$sort": sorting})
+    return estimate_pipeline(pipeline, metadata, indexes)
+
+
+class CostGuard:
+    """
+    Decides, before execution, what to do with a query from its CostEstimate.
+
+    Buffered responses (a JSON body built from fetchall() or list(cursor))
+    estimated above `max_rows` are limited to `max_rows`, switched to a
+    streamed response or rejected, depending on `policy`. Streamed and paged
+    responses hold bounded memory and are only checked against `max_examined`.
+    """
+
+    def __init__(self, policy=COST_POLICY, max_rows=COST_MAX_ROWS, max_examined=COST_MAX_EXAMINED):
+        self.policy = policy
+        self.max_rows = max_rows
+        self.max_examined = max_examined
+        self.decisions = Counter()
+        self._lock = threading.Lock()
+
+    def decide(self, estimate, buffered=True):
+        """Return "allow", "limit" or "stream"; raise QueryRejected when the query must not run."""
+        action, reason = "allow", None
+        if estimate is not None and self.policy != "off":
+            if self.max_examined and estimate.examined > self.max_examined:
+                action = "reject"
+                if estimate.full_scan:
+                    reason = (f"it would scan all {estimate.examined} rows (limit {self.max_examined}); filter on "
+                              f"an indexed column or create the index the index advisor suggests")
+                else:
+                    reason = (f"it would examine about {estimate.examined} rows through an index "
+                              f"(limit {self.max_examined}); narrow the filter")
+            elif buffered and estimate.rows > self.max_rows:
+                action = self.policy
+                reason = (f"it would return about {estimate.rows} rows, more than the {self.max_rows} "
+                          f"returned at once; add a filter or a limit")
+        with self._lock:
+            self.decisions[action] += 1
+        if action == "reject":
+            raise QueryRejected(f"Query rejected: {reason}.", estimate)
+        return action
+
+    def stats(self):
+        with self._lock:
+            decisions = {action: self.decisions[action] for action in ("allow", "limit", "stream", "reject")}
+        return {"policy": self.policy, "max_rows": self.max_rows, "max_examined": self.max_examined,
+                "decisions": decisions}
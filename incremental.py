@@ -0,0 +1,34 @@
+WRITE_MODES = ("replace", "append", "upsert")
+
+# Unique index that backs an append/upsert key
+KEY_INDEX_PREFIX = "ux_chatdb_"
+
+
+class KeyTracker:
+    """
+    Splits incoming rows of an append/upsert into new and already-present keys.
+
+    Keys seen earlier in the same upload are remembered, so the database is only
+    asked about keys the upload has not written yet (one indexed lookup per batch).
+    The set grows with the upload, which is meant for incremental files.
+    """
+
+    def __init__(self, lookup, batch_size):
+        self.lookup = lookup  # list of keys -> set of those already stored
+        self.batch_size = batch_size
+        self.seen = set()
+
+    def split(self, keys, keep):
+        """
+        Boolean mask of rows to write (one per key, the first or last occurrence
+        per `keep`) and a mask of which of those rows have a new key.
+        """
+        write = (~keys.duplicated(keep=keep)).tolist()
+        values = keys.astype(object).tolist()
+        unknown = list({value for value, selected in zip(values, write) if selected and value not in self.seen})
+        stored = set()
+        for start in range(0, len(unknown), self.batch_size):
+            stored |= self.lookup(unknown[start:start + self.batch_size])
+        new = [selected and value not in self.seen and value not in stored for value, selected in zip(values, write)]
+        self.seen.update(unknown)
+        return write, new
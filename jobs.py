@@ -0,0 +1,363 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import CATALOG_PATH
+
+
+# Uploads loading at the same time; the rest wait in the queue
+UPLOAD_WORKERS = int(os.environ.get("CHATDB_UPLOAD_WORKERS", "2"))
+# Finished jobs kept for status polling
+JOB_HISTORY = int(os.environ.get("CHATDB_JOB_HISTORY", "200"))
+# Seconds between progress writes to the shared job table while a job runs
+JOB_SAVE_INTERVAL = float(os.environ.get("CHATDB_JOB_SAVE_INTERVAL", "1"))
+# Seconds between checks for a cancellation requested through another worker process
+JOB_CANCEL_POLL = float(os.environ.get("CHATDB_JOB_CANCEL_POLL", "0.5"))
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+_DONE_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised inside a loader when its job was cancelled."""
+
+
+class NullProgress:
+    """Stand-in when a loader runs outside a job."""
+
+    cancel_requested = False
+
+    def phase(self, name):
+        pass
+
+    def advance(self, rows):
+        pass
+
+    def check(self):
+        pass
+
+
+NULL_PROGRESS = NullProgress()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Upload jobs in the shared SQLite catalog file, so every worker process can
+    report and cancel any job. A unique index over the active (kind, name) rows
+    is the per-table upload lock across processes; the lock of a job whose
+    process exited (the workers share the file, so they run on one host) is
+    released by the next upload of that table.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS upload_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " active INTEGER NOT NULL,"
+            " pid INTEGER NOT NULL,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " submitted REAL NOT NULL,"
+            " job TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS upload_jobs_active ON upload_jobs (kind, name) WHERE active = 1"
+        )
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def insert(self, job):
+        """Register a queued job; False while a live job of the same (kind, name) is queued or running."""
+        for _ in range(2):
+            try:
+                self._connect().execute(
+                    "INSERT INTO upload_jobs (id, kind, name, status, active, pid, submitted, job)"
+                    " VALUES (?, ?, ?, ?, 1, ?, ?, ?)",
+                    (job.id, job.kind, job.name, job.status, os.getpid(), job.submitted, _dumps(job.to_dict())),
+                )
+                return True
+            except sqlite3.IntegrityError:
+                if not self._release_orphan(job.kind, job.name):
+                    return False
+        return False
+
+    def _release_orphan(self, kind, name):
+        """Fail the active job of (kind, name) if its process is gone; False while it is alive."""
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT id, pid, job FROM upload_jobs WHERE kind = ? AND name = ? AND active = 1", (kind, name)
+        ).fetchone()
+        if row is None:
+            return True
+        if process_alive(row[1]):
+            return False
+        state = dict(json.loads(row[2]), status="failed", phase="done",
+                     error="The worker process running this upload exited.")
+        connection.execute(
+            "UPDATE upload_jobs SET status = 'failed', active = 0, job = ? WHERE id = ? AND active = 1",
+            (_dumps(state), row[0]),
+        )
+        return True
+
+    def save(self, job):
+        self._connect().execute(
+            "UPDATE upload_jobs SET status = ?, active = ?, job = ? WHERE id = ?",
+            (job.status, int(not job.done), _dumps(job.to_dict()), job.id),
+        )
+
+    def request_cancel(self, job_id):
+        self._connect().execute("UPDATE upload_jobs SET cancel_requested = 1 WHERE id = ? AND active = 1", (job_id,))
+
+    def cancel_requested(self, job_id):
+        row = self._connect().execute("SELECT cancel_requested FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _records(self, where, params):
+        rows = self._connect().execute(
+            f"SELECT job, cancel_requested FROM upload_jobs WHERE {where} ORDER BY submitted", params
+        )
+        return [JobRecord(json.loads(state), cancel_requested) for state, cancel_requested in rows]
+
+    def get(self, job_id):
+        records = self._records("id = ?", (job_id,))
+        return records[0] if records else None
+
+    def active(self, kind, name):
+        records = self._records("kind = ? AND name = ? AND active = 1", (kind, name))
+        return records[0] if records else None
+
+    def jobs(self):
+        return self._records("1 = 1", ())
+
+    def counts(self):
+        counts = dict.fromkeys(JOB_STATES, 0)
+        for status, count in self._connect().execute("SELECT status, COUNT(*) FROM upload_jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def trim(self, history):
+        """Keep the newest `history` finished jobs."""
+        self._connect().execute(
+            "DELETE FROM upload_jobs WHERE active = 0 AND id NOT IN"
+            " (SELECT id FROM upload_jobs WHERE active = 0 ORDER BY submitted DESC LIMIT ?)",
+            (history,),
+        )
+
+
+def _dumps(state):
+    return json.dumps(state, default=str)
+
+
+class JobRecord:
+    """A job as last saved to the job table, possibly by another worker process."""
+
+    def __init__(self, state, cancel_requested=False):
+        self._state = state
+        self.id = state["job_id"]
+        self.kind = state["kind"]
+        self.name = state["name"]
+        self.status = state["status"]
+        self.cancel_requested = bool(cancel_requested) or state["cancel_requested"]
+
+    @property
+    def done(self):
+        return self.status in _DONE_STATES
+
+    def to_dict(self):
+        return dict(self._state, cancel_requested=self.cancel_requested)
+
+
+class Job:
+    """
+    One background upload. Loaders report into it: phase() names the current
+    step, advance() counts loaded rows and check() raises JobCancelled once
+    cancellation was requested (loaders call it between chunks and batches).
+    With a JobStore, progress is saved at most every JOB_SAVE_INTERVAL seconds
+    and check() also notices cancellations requested through other processes.
+    """
+
+    def __init__(self, kind, name, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.name = name
+        self.status = "queued"
+        self.current_phase = "queued"
+        self.rows = 0
+        self.error = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.visited = set()
+        self._cancel = threading.Event()
+        self._store = store
+        self._saved = 0.0
+        self._polled = time.monotonic()
+
+    def save(self, force=True):
+        if self._store is None:
+            return
+        now = time.monotonic()
+        if force or now - self._saved >= JOB_SAVE_INTERVAL:
+            self._saved = now
+            self._store.save(self)
+
+    def phase(self, name):
+        self.current_phase = name
+        self.visited.add(name)
+        self.save(force=False)
+
+    def reached(self, name):
+        """Whether the job ever entered phase `name` (e.g. replaced data before being cancelled)."""
+        return name in self.visited
+
+    def advance(self, rows):
+        self.rows += rows
+        self.save(force=False)
+
+    def poll_cancel(self, force=False):
+        """Pick up a cancellation requested through the job table by another process."""
+        if self._cancel.is_set() or self._store is None:
+            return
+        if force or time.monotonic() - self._polled >= JOB_CANCEL_POLL:
+            self._polled = time.monotonic()
+            if self._store.cancel_requested(self.id):
+                self._cancel.set()
+
+    def check(self):
+        self.poll_cancel()
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled.")
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.status in _DONE_STATES
+
+    def to_dict(self):
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "phase": self.current_phase,
+            "rows_processed": self.rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "queued_seconds": round((self.started or end) - self.submitted, 3),
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class JobManager:
+    """
+    Runs upload jobs on a bounded worker pool and keeps their status for polling.
+
+    Jobs run in the process that accepted them, but their rows live in the
+    shared catalog (JobStore): any worker process answers status requests and
+    cancels any job, and only one job per (kind, name) may be queued or running
+    across all processes, so two uploads of the same table never interleave.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, history=JOB_HISTORY, path=CATALOG_PATH):
+        self.workers = workers
+        self.history = history
+        self._store = JobStore(path)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="upload")
+        self._jobs = {}  # id -> Job queued or running in this process
+        self._lock = threading.Lock()
+
+    def active(self, kind, name):
+        return self._store.active(kind, name)
+
+    def submit(self, kind, name, run):
+        """
+        Queue run(job), which returns the job result, and return the Job right away;
+        None while another job for the same (kind, name) is queued or running.
+        """
+        job = Job(kind, name, self._store)
+        if not self._store.insert(job):
+            return None
+        with self._lock:
+            self._jobs[job.id] = job
+        self._store.trim(self.history)
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job, run):
+        try:
+            job.poll_cancel(force=True)
+            if job.cancel_requested:
+                job.status, job.finished = "cancelled", time.time()
+                return
+            job.status, job.started = "running", time.time()
+            job.save()
+            try:
+                job.result = run(job)
+                job.status = "succeeded"
+            except Exception as e:
+                # Loaders turn exceptions into error messages, so cancellation is judged by the flag
+                job.status = "cancelled" if job.cancel_requested else "failed"
+                job.error = str(e)
+        finally:
+            job.current_phase = "done"
+            job.finished = job.finished or time.time()
+            job.save()
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    def get(self, job_id):
+        """The live Job when it runs in this process, else its last saved JobRecord (or None)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._store.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; a queued job never starts, a running one stops at its next check()."""
+        job = self.get(job_id)
+        if job is None or job.done:
+            return job
+        self._store.request_cancel(job_id)
+        if isinstance(job, Job):
+            job._cancel.set()
+            return job
+        return self.get(job_id)
+
+    def jobs(self):
+        return self._store.jobs()
+
+    def counts(self):
+        return self._store.counts()
@@ -0,0 +1,193 @@
+import datetime
+import json
+import os
+from collections import Counter
+
+from bson import json_util
+
+
+# Largest document accepted (MongoDB's BSON limit); also bounds the parse buffer
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024
+# Characters read from the file at a time
+READ_SIZE = 1 << 20
+# Distinct field paths profiled per collection; documents with dynamic keys stop adding paths here
+MAX_FIELD_PATHS = int(os.environ.get("CHATDB_JSON_MAX_FIELD_PATHS", "1000"))
+
+_WHITESPACE = " \t\r\n"
+# Extended JSON ({"$oid": ...}, {"$date": ...}) from mongoexport becomes BSON types
+_decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+
+
+def iter_json_documents(path, read_size=READ_SIZE):
+    """
+    Yield the documents of a JSON array or of a stream of JSON objects (NDJSON or
+    concatenated objects) without loading the file: only the current read block
+    and the document being decoded are held in memory.
+    """
+    with open(path, encoding="utf-8-sig") as handle:
+        buffer, position, eof = "", 0, False
+
+        def fill():
+            nonlocal buffer, position, eof
+            block = handle.read(read_size)
+            eof = not block
+            buffer, position = buffer[position:] + block, 0
+
+        def next_char():
+            # First non-whitespace character from position on, None at the end of the file
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in _WHITESPACE:
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if eof:
+                    return None
+                fill()
+
+        in_array = next_char() == "["
+        if in_array:
+            position += 1
+        count = 0
+        while True:
+            char = next_char()
+            if in_array:
+                if char is None:
+                    raise ValueError("The JSON array is not closed.")
+                if char == "]":
+                    position += 1
+                    if next_char() is not None:
+                        raise ValueError("Unexpected data after the JSON array.")
+                    return
+                if count:
+                    if char != ",":
+                        raise ValueError(f"Expected ',' or ']' after document {count}.")
+                    position += 1
+                    char = next_char()
+            if char is None:
+                if in_array:
+                    raise ValueError("The JSON array is not closed.")
+                return
+
+            while True:
+                try:
+                    document, position = _decoder.raw_decode(buffer, position)
+                    break
+                except json.JSONDecodeError as err:
+                    # Objects end with "}", so a failed decode before the end of the file
+                    # means the document continues in the next block
+                    if eof:
+                        raise ValueError(f"Invalid JSON in document {count + 1}: {err.msg}.") from err
+                    if len(buffer) - position > MAX_DOCUMENT_BYTES:
+                        raise ValueError(f"Document {count + 1} is larger than {MAX_DOCUMENT_BYTES} bytes.") from err
+                    fill()
+            if not isinstance(document, dict):
+                raise ValueError(f"Document {count + 1} is not a JSON object.")
+            count += 1
+            yield document
+
+
+def type_name(value):
+    """BSON-style type name of a decoded JSON value."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, datetime.datetime):
+        return "date"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return type(value).__name__  # ObjectId, Decimal128, Binary, ...
+
+
+def _profile_value(value):
+    # Sketches keep JSON-friendly values; ObjectId, Decimal128 etc. by their text
+    if value is None or isinstance(value, (bool, int, float, str, datetime.datetime)):
+        return value
+    return str(value)
+
+
+class FieldPaths:
+    """
+    Field-path profile of a document stream, built batch by batch.
+
+    Nested documents are walked into dotted paths ("address.city"); array
+    elements share their array's path, as in MongoDB queries ("items.sku").
+    For each path it counts the documents containing it and the types seen
+    there, and notes whether it was reached through an array. observe() returns
+    the scalar values of each path in the batch for the column sketches. The
+    top-level `_id` is left out like for CSV uploads.
+    """
+
+    def __init__(self, max_paths=MAX_FIELD_PATHS):
+        self.max_paths = max_paths
+        self.paths = {}  # path -> {"documents": n, "types": Counter, "in_array": bool}
+        self.documents = 0
+        self.truncated = False
+
+    def observe(self, documents):
+        """Record a batch of documents; return {path: [scalar values]} for the sketches."""
+        values = {}
+        for document in documents:
+            self.documents += 1
+            seen = set()
+            for key, value in document.items():
+                if key != "_id":
+                    self._walk(value, key, False, values, seen)
+            for path in seen:
+                self.paths[path]["documents"] += 1
+        return values
+
+    def _walk(self, value, path, in_array, values, seen):
+        if isinstance(value, dict):
+            if self._record(path, "object", in_array, seen):
+                for key, child in value.items():
+                    self._walk(child, f"{path}.{key}", in_array, values, seen)
+        elif isinstance(value, list):
+            if self._record(path, "array", in_array, seen):
+                for item in value:
+                    self._walk(item, path, True, values, seen)
+        elif self._record(path, type_name(value), in_array, seen):
+            values.setdefault(path, []).append(_profile_value(value))
+
+    def _record(self, path, kind, in_array, seen):
+        entry = self.paths.get(path)
+        if entry is None:
+            if len(self.paths) >= self.max_paths:
+                self.truncated = True
+                return False
+            entry = self.paths[path] = {"documents": 0, "types": Counter(), "in_array": False}
+        entry["types"][kind] += 1
+        entry["in_array"] = entry["in_array"] or in_array
+        seen.add(path)
+        return True
+
+    def leaf_paths(self):
+        """
+        Paths holding values but no sub-documents, in first-seen order: the fields
+        queries filter and project on (a path and its parent cannot both be projected).
+        """
+        parents = {path.rsplit(".", 1)[0] for path in self.paths if "." in path}
+        return [
+            path for path, entry in self.paths.items()
+            if path not in parents and set(entry["types"]) - {"object", "array"}
+        ]
+
+    def to_dict(self):
+        return {
+            path: {
+                "documents": entry["documents"],
+                "share": round(entry["documents"] / self.documents, 4) if self.documents else 0.0,
+                "types": dict(entry["types"]),
+                "in_array": entry["in_array"],
+            }
+            for path, entry in self.paths.items()
+        }
@@ -0,0 +1,176 @@
+import atexit
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+
+# Default MongoDB settings (can be overridden with environment variables)
+MONGO_URI = os.environ.get("CHATDB_MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.environ.get("CHATDB_MONGO_DB", "nosql_db")
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get("CHATDB_MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.environ.get("CHATDB_MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.environ.get("CHATDB_MONGO_MAX_IDLE_TIME_MS", "300000")),
+    "waitQueueTimeoutMS": int(os.environ.get("CHATDB_MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.environ.get("CHATDB_MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.environ.get("CHATDB_MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.environ.get("CHATDB_MONGO_SOCKET_TIMEOUT_MS", "60000")),
+}
+
+
+class _PoolStatsListener(monitoring.ConnectionPoolListener, monitoring.ServerHeartbeatListener):
+    """Counts connection pool and server heartbeat events for the shared client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkins": 0,
+            "pool_clears": 0,
+            "heartbeats": 0,
+            "heartbeat_failures": 0,
+            "heartbeat_time_total": 0.0,
+        }
+
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters["checked_out"] = counters["checkouts"] - counters["checkins"]
+        counters["open_connections"] = counters["connections_created"] - counters["connections_closed"]
+        beats = counters["heartbeats"]
+        counters["heartbeat_time_avg"] = counters["heartbeat_time_total"] / beats if beats else 0.0
+        return counters
+
+    # Connection pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._incr("checkouts")
+
+    def connection_checked_in(self, event):
+        self._incr("checkins")
+
+    # Server heartbeat events
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            self.counters["heartbeats"] += 1
+            self.counters["heartbeat_time_total"] += event.duration
+
+    def failed(self, event):
+        self._incr("heartbeat_failures")
+
+
+_mongo_client = None
+_mongo_client_pid = None
+_mongo_client_created = None
+_mongo_listener = _PoolStatsListener()
+_mongo_lock = threading.Lock()
+
+
+def get_mongo_client():
+    """
+    Return the process-wide MongoClient, creating it on first use.
+
+    A new client is created after a fork so every worker process owns its own
+    pool and monitor threads.
+    """
+    global _mongo_client, _mongo_client_pid, _mongo_client_created
+    with _mongo_lock:
+        if _mongo_client is None or _mongo_client_pid != os.getpid():
+            _mongo_client = MongoClient(MONGO_URI, event_listeners=[_mongo_listener], **MONGO_CLIENT_OPTIONS)
+            _mongo_client_pid = os.getpid()
+            _mongo_client_created = time.time()
+        return _mongo_client
+
+
+def get_mongo_db(database_name=MONGO_DB_NAME):
+    return get_mongo_client()[database_name]
+
+
+def kill_operations(client, comment):
+    """killOp every operation tagged with `comment` (queries pass their request id); returns how many."""
+    operations = client.admin.aggregate([
+        {"$currentOp": {"allUsers": True}},
+        {"$match": {"command.comment": comment}},
+    ])
+    killed = 0
+    for operation in operations:
+        client.admin.command("killOp", op=operation["opid"])
+        killed += 1
+    return killed
+
+
+def close_mongo_client():
+    """Close the shared client and stop its monitor threads."""
+    global _mongo_client, _mongo_client_pid
+    with _mongo_lock:
+        if _mongo_client is not None and _mongo_client_pid == os.getpid():
+            _mongo_client.close()
+        _mongo_client = None
+        _mongo_client_pid = None
+
+
+def mongo_client_stats():
+    """Pool counters, configured limits and the current view of each server."""
+    with _mongo_lock:
+        client = _mongo_client
+        created = _mongo_client_created
+
+    servers = []
+    if client is not None:
+        for address, description in client.topology_description.server_descriptions().items():
+            servers.append({
+                "address": f"{address[0]}:{address[1]}",
+                "type": description.server_type_name,
+                "round_trip_time_ms": round(description.round_trip_time * 1000, 3)
+                if description.round_trip_time is not None else None,
+                "error": str(description.error) if description.error else None,
+            })
+
+    return {
+        "connected": client is not None,
+        "client_created": created,
+        "options": dict(MONGO_CLIENT_OPTIONS),
+        "pool": _mongo_listener.snapshot(),
+        "servers": servers,
+    }
+
+
+atexit.register(close_mongo_client)
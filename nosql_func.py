@@ -1,5 +1,9 @@
+import logging
 import random
 from pymongo import MongoClient
+from profiling import profile_values
+
+logger = logging.getLogger(__name__)
 
 def generate_random_mongodb_query(query_type, collection_name, collection_metadata):
     # Ensure the collection exists in the metadata store
@@ -9,7 +13,10 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
     metadata = collection_metadata[collection_name]
     attributes = metadata.get("categorical_columns", [])
     numeric_columns = metadata.get("numeric_columns", [])
-    unique_values = metadata.get("unique_values", {})
+    # Candidate values come from the bounded column sketches (top-k + sample)
+    unique_values = {
+        column: profile_values(profile) for column, profile in metadata.get("column_profiles", {}).items()
+    }
 
     # Define query generators
     def generate_filter_queries(operator):
@@ -20,7 +27,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
                 column = random.choice(numeric_columns if numeric_columns else attributes)
                 value = random.randint(1, 100) if column in numeric_columns else random.choice(unique_values.get(column, ["unknown"]))
                 query = {column: {f"${operator}": value}}
-                print(f"Generated Query ({operator}): {query}")
+                logger.debug("Generated Query (%s): %s", operator, query)
                 queries.append(query)
         return queries
 
@@ -31,7 +38,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
             column = random.choice(attributes + numeric_columns)
             sort_order = random.choice([1, -1])  # 1 for ascending, -1 for descending
             query = {"$sort": {column: sort_order}}
-            print(f"Generated Query (Sort): {query}")
+            logger.debug("Generated Query (Sort): %s", query)
             queries.append(query)
         return queries
 
@@ -47,7 +54,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
                     "total": {"$sum": f"${agg_column}"},
                 }
             }
-            print(f"Generated Query (Group): {query}")
+            logger.debug("Generated Query (Group): %s", query)
             queries.append(query)
         return queries
 
@@ -61,7 +68,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
                 value = random.randint(1, 100) if column in numeric_columns else random.choice(unique_values.get(column, ["unknown"]))
                 conditions.append({column: {"$eq": value}})
             query = {f"${operator}": conditions}
-            print(f"Generated Query ({operator}): {query}")
+            logger.debug("Generated Query (%s): %s", operator, query)
             queries.append(query)
         return queries
 
@@ -72,7 +79,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
             column = random.choice(attributes)
             values = random.sample(unique_values.get(column, ["unknown"]), min(3, len(unique_values.get(column, []))))
             query = {column: {f"${operator}": values}}
-            print(f"Generated Query ({operator}): {query}")
+            logger.debug("Generated Query (%s): %s", operator, query)
             queries.append(query)
         return queries
 
@@ -83,7 +90,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
             column = random.choice(attributes)
             values = random.sample(unique_values.get(column, ["unknown"]), min(3, len(unique_values.get(column, []))))
             query = {column: {"$all": values}}
-            print(f"Generated Query (All): {query}")
+            logger.debug("Generated Query (All): %s", query)
             queries.append(query)
         return queries
 
@@ -94,7 +101,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
             column = random.choice(attributes)
             value = random.choice(unique_values.get(column, ["unknown"]))
             query = {column: {"$elemMatch": {"$eq": value}}}
-            print(f"Generated Query (ElemMatch): {query}")
+            logger.debug("Generated Query (ElemMatch): %s", query)
             queries.append(query)
         return queries
 
@@ -105,7 +112,7 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
             column = random.choice(attributes + numeric_columns)
             value = random.randint(1, 100) if column in numeric_columns else random.choice(unique_values.get(column, ["unknown"]))
             query = {"$match": {column: value}}
-            print(f"Generated Query (Match): {query}")
+            logger.debug("Generated Query (Match): %s", query)
             queries.append(query)
         return queries
 
@@ -139,6 +146,8 @@ def generate_random_mongodb_query(query_type, collection_name, collection_metada
 
 import re
 
+from nosql_pipeline import build_pipeline
+
 def parse_conditions(user_query, collection_name, collection_metadata):
     metadata = collection_metadata[collection_name]
     attributes = metadata.get("categorical_columns", [])
@@ -198,7 +207,7 @@ def parse_conditions(user_query, collection_name, collection_metadata):
     elif conditions:
         return conditions[0]  # Single condition
     else:
-        raise ValueError(f"Could not parse the conditions: '{user_query}'.")
+        return {}  # No filter: every document matches
 
 
 def parse_sorting(user_query, collection_name, collection_metadata):
@@ -258,16 +267,21 @@ def parse_aggregation(user_query, collection_name, collection_metadata):
     agg_function_map = {
         "average": "$avg",
         "sum": "$sum",
-        "count": "$count",
+        "count": "$sum",
         "min": "$min",
         "max": "$max"
     }
 
-    # Pattern to detect aggregation commands
-    match = re.search(r"(find\s+(average|sum|count|min|max)\s+(\w+))", user_query, re.IGNORECASE)
+    # Pattern to detect aggregation commands, optionally grouped by a categorical column
+    match = re.search(
+        r"(find\s+(average|sum|count|min|max)\s+(\w+)"
+        r"(?:\s+(?:grouped by|group by|by|per|for each|for every|of each)\s+(\w+))?)",
+        user_query, re.IGNORECASE,
+    )
     if match:
         agg_func = match.group(2).lower()
         agg_column = match.group(3).lower()
+        group_column = match.group(4).lower() if match.group(4) else None
 
         if agg_func not in agg_function_map:
             raise ValueError(f"Aggregation function '{agg_func}' is not supported.")
@@ -275,16 +289,32 @@ def parse_aggregation(user_query, collection_name, collection_metadata):
         if agg_column not in column_names:
             raise ValueError(f"Column '{agg_column}' not found in metadata.")
 
+        if group_column is not None and group_column not in attributes:
+            raise ValueError(f"Column '{group_column}' is not a categorical column to group by.")
+
+        # Counts add one per document that has the column
+        accumulator = (
+            {"$sum": {"$cond": [{"$gt": [f"${agg_column}", None]}, 1, 0]}}
+            if agg_func == "count" else {agg_function_map[agg_func]: f"${agg_column}"}
+        )
         aggregation_pipeline = {
             "$group": {
-                "_id": None,
-                "result": {agg_function_map[agg_func]: f"${agg_column}"}
+                "_id": f"${group_column}" if group_column else None,
+                "result": accumulator
             }
         }
         return aggregation_pipeline
 
     return None
 
+
+def parse_limit(user_query):
+    """Number of results asked for ("limit 5", "top 10"), or None."""
+    match = re.search(r"(?:limit(?:ed)?(?: to)?|top)\s+(\d+)", user_query, re.IGNORECASE)
+    if match and int(match.group(1)) > 0:
+        return int(match.group(1))
+    return None
+
 def input_to_mongodb(user_query, collection_name, collection_metadata):
     # Parse aggregation
     aggregation = parse_aggregation(user_query, collection_name, collection_metadata)
@@ -297,12 +327,7 @@ def input_to_mongodb(user_query, collection_name, collection_metadata):
 
     if aggregation:
         # Aggregation query
-        pipeline = []
-        if conditions:
-            pipeline.append({"$match": conditions})
-        pipeline.append(aggregation)
-        if sorting:
-            pipeline.append({"$sort": sorting})
+        pipeline = build_pipeline(conditions, aggregation, sorting, parse_limit(user_query))
         query = f"db.{collection_name}.aggregate({pipeline})"
     else:
         # Standard find query
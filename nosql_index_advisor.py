@@ -0,0 +1,327 @@
+import threading
+from collections import Counter, defaultdict
+
+from pymongo import ASCENDING
+
+from sql_index_advisor import AUTO_INDEX, AUTO_INDEX_MIN_QUERIES, MIN_TABLE_ROWS
+
+
+MAX_INDEX_FIELDS = 4
+INDEX_PREFIX = "ix_chatdb_"
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+
+class FilterShape:
+    """Index-relevant fields of one find() or $match filter and its sort."""
+
+    __slots__ = ("equality", "ranges", "sort", "projection")
+
+    def __init__(self, equality, ranges, sort, projection):
+        self.equality = equality
+        self.ranges = ranges
+        self.sort = sort
+        self.projection = projection
+
+    def key(self):
+        return (tuple(sorted(self.equality)), tuple(self.ranges), tuple(self.sort))
+
+    def to_dict(self):
+        return {
+            "equality": list(self.equality),
+            "range": list(self.ranges),
+            "sort": [list(pair) for pair in self.sort],
+        }
+
+
+def _field_role(condition):
+    """'equality', 'range' or None (not usable as index bounds) for one field condition."""
+    if not isinstance(condition, dict) or not any(str(key).startswith("$") for key in condition):
+        return "equality"
+    operators = set(condition)
+    if operators == {"$in"}:
+        return "equality"
+    if operators <= _RANGE_OPERATORS:
+        return "range"
+    if "$regex" in condition and str(condition["$regex"]).startswith("^"):
+        # Anchored patterns scan only part of the index; case-insensitive ones still
+        # scan every key but avoid fetching non-matching documents
+        return "range"
+    if operators & {"$ne", "$nin"}:
+        return "range"
+    return None
+
+
+def parse_filter_shape(conditions, sorting=None, projection=None):
+    """Fields a filter matches by equality or range plus the sort keys, or None for $or/$nor filters."""
+    equality, ranges = [], []
+    clauses = [conditions or {}]
+    while clauses:
+        clause = clauses.pop()
+        for field, condition in clause.items():
+            if field == "$and":
+                clauses.extend(condition)
+                continue
+            if field.startswith("$"):
+                return None
+            role = _field_role(condition)
+            if role == "equality" and field not in equality:
+                equality.append(field)
+            elif role == "range" and field not in ranges and field not in equality:
+                ranges.append(field)
+    sort = [(field, direction) for field, direction in (sorting or {}).items()]
+    fields = [field for field, included in (projection or {}).items() if included and field != "_id"]
+    return FilterShape(equality, ranges, sort, fields)
+
+
+def candidate_keys(shape, profiles):
+    """
+    Compound index key in equality-sort-range order: equality fields (most
+    selective first), then the sort keys with their directions, then range fields.
+    """
+    def distinct(field):
+        return (profiles.get(field) or {}).get("distinct_estimate", 0)
+
+    keys = [(field, ASCENDING) for field in sorted(shape.equality, key=distinct, reverse=True)]
+    used = set(shape.equality)
+    # After an equality prefix the index can be walked backwards, so {a: 1} serves {a: -1}
+    sort = shape.sort
+    if sort and sort[0][1] < 0:
+        sort = [(field, -direction) for field, direction in sort]
+    for field, direction in sort:
+        if field not in used:
+            keys.append((field, direction))
+            used.add(field)
+    for field in shape.ranges:
+        if field not in used:
+            keys.append((field, ASCENDING))
+            used.add(field)
+    keys = keys[:MAX_INDEX_FIELDS]
+
+    # A lone equality field with a single distinct value filters nothing
+    if len(keys) == 1 and shape.equality and not shape.sort and not shape.ranges and distinct(keys[0][0]) < 2:
+        return []
+    return keys
+
+
+def _normalize(keys):
+    # {a: 1, b: -1} also serves the reversed sort {a: -1, b: 1}
+    keys = tuple(keys)
+    if keys and keys[0][1] < 0:
+        keys = tuple((field, -direction) for field, direction in keys)
+    return keys
+
+
+def _serves(index_keys, keys):
+    index_keys, keys = _normalize(index_keys), _normalize(keys)
+    return len(keys) <= len(index_keys) and index_keys[:len(keys)] == keys
+
+
+def index_name(keys):
+    return INDEX_PREFIX + "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _plan_stages(plan):
+    """Stage names and index names of a winning plan tree."""
+    stages, indexes = [], []
+    pending = [plan or {}]
+    while pending:
+        stage = pending.pop()
+        if "queryPlan" in stage:
+            # Slot-based engine wraps the classic plan
+            stage = stage["queryPlan"]
+        stages.append(stage.get("stage"))
+        if stage.get("indexName"):
+            indexes.append(stage["indexName"])
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending.extend(stage.get("inputStages", []))
+    return stages, indexes
+
+
+class MongoIndexAdvisor:
+    """
+    Index recommendations for uploaded MongoDB collections.
+
+    record() counts, per collection, each field's use for equality, range and
+    sorting and each distinct filter/sort shape. candidates() proposes single-field
+    and compound indexes in equality-sort-range order, folds indexes that are a
+    prefix of a wider one into it, and reports the share of the recorded workload
+    each one serves, avoids an in-memory sort for and fully covers.
+    """
+
+    def __init__(self, auto_index=AUTO_INDEX, auto_min_queries=AUTO_INDEX_MIN_QUERIES):
+        self.auto_index = auto_index
+        self.auto_min_queries = auto_min_queries
+        self._lock = threading.Lock()
+        self._usage = defaultdict(lambda: defaultdict(Counter))  # collection -> field -> role -> count
+        self._shapes = defaultdict(dict)  # collection -> shape key -> [count, shape, (filter, sort)]
+        self._queries = Counter()
+        self._applied = defaultdict(dict)
+        self._applying = set()
+
+    def record(self, collection_name, conditions, sorting=None, projection=None):
+        shape = parse_filter_shape(conditions, sorting, projection)
+        if shape is None:
+            return None
+        with self._lock:
+            self._queries[collection_name] += 1
+            usage = self._usage[collection_name]
+            for role, fields in (("equality", shape.equality), ("range", shape.ranges),
+                                 ("sort", [field for field, _ in shape.sort])):
+                for field in fields:
+                    usage[field][role] += 1
+            entry = self._shapes[collection_name].setdefault(shape.key(), [0, shape, None])
+            entry[0] += 1
+            entry[2] = (conditions or {}, dict(sorting or {}))
+        return shape
+
+    def reset(self, collection_name):
+        """Forget state for a collection that was re-uploaded with a new schema."""
+        with self._lock:
+            for state in (self._usage, self._shapes, self._queries, self._applied):
+                state.pop(collection_name, None)
+
+    def candidates(self, collection_name, metadata, existing=()):
+        profiles = metadata.get("column_profiles", {})
+        with self._lock:
+            shapes = list(self._shapes.get(collection_name, {}).values())
+            total = self._queries.get(collection_name, 0)
+
+        by_keys = {}
+        for count, shape, sample in shapes:
+            keys = tuple(candidate_keys(shape, profiles))
+            if not keys:
+                continue
+            entry = by_keys.setdefault(keys, {"queries": 0, "shapes": [], "sample": sample, "top": 0})
+            entry["queries"] += count
+            entry["shapes"].append((count, shape))
+            if count > entry["top"]:
+                entry["top"], entry["sample"] = count, sample
+
+        for keys in sorted(by_keys, key=len):
+            wider = [other for other in by_keys if other != keys and _serves(other, keys)]
+            if wider:
+                target = max(wider, key=lambda other: by_keys[other]["queries"])
+                by_keys[target]["queries"] += by_keys[keys]["queries"]
+                by_keys[target]["shapes"].extend(by_keys[keys]["shapes"])
+                del by_keys[keys]
+
+        documents = max((profile.get("count", 0) for profile in profiles.values()), default=0)
+        existing = [tuple(keys) for keys in existing]
+        candidates = []
+        for keys, entry in by_keys.items():
+            fields = {field for field, _ in keys}
+            sorted_queries = covered_queries = 0
+            for count, shape in entry["shapes"]:
+                # The sort is served when it directly follows the equality prefix of the index
+                prefix = len(shape.equality)
+                if shape.sort and _serves(keys[prefix:], shape.sort):
+                    sorted_queries += count
+                if shape.projection and set(shape.projection) | set(shape.equality) | set(shape.ranges) <= fields:
+                    covered_queries += count
+            conditions, sorting = entry["sample"]
+            candidates.append({
+                "collection": collection_name,
+                "name": index_name(keys),
+                "keys": [list(pair) for pair in keys],
+                "queries_served": entry["queries"],
+                "workload_share": entry["queries"] / total if total else 0.0,
+                "sort_avoided_share": sorted_queries / total if total else 0.0,
+                "covered_share": covered_queries / total if total else 0.0,
+                "shapes": [shape.to_dict() for _, shape in entry["shapes"]],
+                "sample_filter": conditions,
+                "sample_sort": sorting,
+                "exists": any(_serves(index, keys) for index in existing),
+                "small_collection": documents < MIN_TABLE_ROWS,
+            })
+        candidates.sort(key=lambda candidate: candidate["queries_served"], reverse=True)
+        return candidates
+
+    def workload(self, collection_name):
+        with self._lock:
+            return {
+                "queries": self._queries.get(collection_name, 0),
+                "fields": {field: dict(roles) for field, roles in self._usage.get(collection_name, {}).items()},
+                "applied": list(self._applied.get(collection_name, {}).values()),
+            }
+
+    def due(self, collection_name, metadata):
+        if not self.auto_index:
+            return []
+        with self._lock:
+            if collection_name in self._applying:
+                return []
+            applied = set(self._applied.get(collection_name, {}))
+        return [
+            candidate for candidate in self.candidates(collection_name, metadata)
+            if candidate["queries_served"] >= self.auto_min_queries
+            and not candidate["small_collection"] and candidate["name"] not in applied
+        ]
+
+    def explain(self, collection, candidate):
+        """Winning plan summary for the candidate's sample filter and sort."""
+        cursor = collection.find(candidate["sample_filter"])
+        if candidate["sample_sort"]:
+            cursor = cursor.sort(list(candidate["sample_sort"].items()))
+        explanation = cursor.explain()
+        stages, indexes = _plan_stages(explanation.get("queryPlanner", {}).get("winningPlan"))
+        stats = explanation.get("executionStats", {})
+        return {
+            "stages": stages,
+            "indexes": indexes,
+            "collection_scan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned"),
+            "millis": stats.get("executionTimeMillis"),
+        }
+
+    def apply(self, collection, candidate):
+        """Build the index, then keep it only if the query planner picks it for the sample query."""
+        before = self.explain(collection, candidate)
+        keys = [tuple(pair) for pair in candidate["keys"]]
+        collection.create_index(keys, name=candidate["name"])
+        after = self.explain(collection, candidate)
+        if candidate["name"] in after["indexes"]:
+            status = "created"
+        else:
+            collection.drop_index(candidate["name"])
+            status = "dropped_unused"
+        result = {"name": candidate["name"], "keys": candidate["keys"], "status": status, "before": before, "after": after}
+        if status == "created":
+            with self._lock:
+                self._applied[candidate["collection"]][candidate["name"]] = result
+        return result
+
+    def apply_many(self, collection, candidates):
+        with self._lock:
+            if collection.name in self._applying:
+                return [{"name": candidate["name"], "status": "busy"} for candidate in candidates]
+            self._applying.add(collection.name)
+        try:
+            existing = existing_indexes(collection)
+            results = []
+            for candidate in candidates:
+                keys = [tuple(pair) for pair in candidate["keys"]]
+                if any(_serves(index, keys) for index in existing):
+                    results.append({"name": candidate["name"], "keys": candidate["keys"], "status": "exists"})
+                    continue
+                result = self.apply(collection, candidate)
+                if result["status"] == "created":
+                    existing.append(tuple(keys))
+                results.append(result)
+            return results
+        finally:
+            with self._lock:
+                self._applying.discard(collection.name)
+
+
+def existing_indexes(collection):
+    """Key tuples of the collection's indexes other than the default _id index."""
+    indexes = []
+    for name, info in collection.index_information().items():
+        # Text, hashed and geo indexes cannot serve these filters and sorts
+        if name != "_id_" and all(isinstance(direction, (int, float)) for _, direction in info["key"]):
+            indexes.append(tuple((field, int(direction)) for field, direction in info["key"]))
+    return indexes
@@ -0,0 +1,360 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from incremental import KEY_INDEX_PREFIX, KeyTracker
+from jobs import NULL_PROGRESS
+from json_documents import FieldPaths, iter_json_documents
+from mongo_client import get_mongo_client
+from profile_engine import ProfilingEngine
+from profiling import ingest_stats, timed
+from upload_sources import open_upload
+
+
+# Streaming ingest defaults
+DEFAULT_CHUNK_SIZE = int(os.environ.get("CHATDB_MONGO_INGEST_CHUNK_SIZE", "50000"))
+DEFAULT_BATCH_SIZE = int(os.environ.get("CHATDB_MONGO_INGEST_BATCH_SIZE", "5000"))
+DEFAULT_WORKERS = int(os.environ.get("CHATDB_MONGO_INGEST_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+def sparse_documents(data_frame):
+    """Yield one document per row, leaving out fields whose value is NaN/None."""
+    columns = list(data_frame.columns)
+    present = data_frame.notna().to_numpy()
+    values = data_frame.astype(object).to_numpy()
+    for row, row_present in zip(values, present):
+        yield {column: value for column, value, keep in zip(columns, row, row_present) if keep}
+
+
+def _insert_batch(collection, documents):
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids), 0
+    except BulkWriteError as err:
+        inserted = err.details.get("nInserted", 0)
+        return inserted, len(documents) - inserted
+
+
+def stream_csv_to_mongo(file_path, db_name, collection_name, chunk_size=DEFAULT_CHUNK_SIZE,
+                        batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, progress_callback=None,
+                        progress=NULL_PROGRESS):
+    """
+    Load a CSV, Parquet or Arrow IPC file into MongoDB in unordered batches without
+    reading the whole file.
+
+    Batches of `batch_size` sparse documents are handed to `workers` threads that
+    share the pooled client; at most two batches per worker are in flight so memory
+    stays bounded. `progress_callback(rows_read, rows_inserted)` is called after
+    every chunk; `progress` (a jobs.Job) gets the phase and inserted rows and can
+    cancel the load between batches. Returns metadata keyed by collection name
+    like csv_to_mongo_loader().
+    """
+    started = time.perf_counter()
+    collection = get_mongo_client()[db_name][collection_name]
+
+    columns = None
+    engine = None
+    rows_read = 0
+    rows_inserted = 0
+    rows_failed = 0
+    in_flight = set()
+    timings = {"read": 0.0, "metadata": 0.0}
+
+    def collect(done):
+        nonlocal rows_inserted, rows_failed
+        for future in done:
+            inserted, failed = future.result()
+            rows_inserted += inserted
+            rows_failed += failed
+            progress.advance(inserted + failed)
+
+    with open_upload(file_path) as source, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        progress.phase("reading")
+        for chunk in timed(source.chunks(chunk_size, date_objects=False), timings, "read"):
+            progress.check()
+            progress.phase("profiling")
+            tick = time.perf_counter()
+            if columns is None:
+                columns = chunk.columns.tolist()
+                engine = source.profiling_engine(columns)
+            engine.update(chunk, convert=False)
+            timings["metadata"] += time.perf_counter() - tick
+
+            progress.phase("inserting")
+            batch = []
+            for document in sparse_documents(chunk):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    progress.check()
+                    if len(in_flight) >= 2 * workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(_insert_batch, collection, batch))
+                    batch = []
+            if batch:
+                in_flight.add(executor.submit(_insert_batch, collection, batch))
+
+            rows_read += len(chunk)
+            elapsed = time.perf_counter() - started
+            logger.info("Read %d rows into '%s' (%.0f rows/sec)", rows_read, collection_name, rows_read / elapsed)
+            if progress_callback:
+                progress_callback(rows_read, rows_inserted)
+            progress.phase("reading")
+
+        collect(in_flight)
+
+    if columns is None:
+        raise ValueError("The uploaded file is empty.")
+    # Classified from the types seen over the whole file: a column empty or numeric-looking
+    # in the first chunk may turn out otherwise later
+    categorical_columns, numeric_columns = engine.mongo_classify()
+
+    elapsed = time.perf_counter() - started
+    logger.info("Inserted %d documents into MongoDB collection '%s' in database '%s'.", rows_inserted, collection_name, db_name)
+
+    return {
+        collection_name: {
+            "columns": columns,
+            "categorical_columns": categorical_columns,
+            "numeric_columns": numeric_columns,
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                "stream", rows_read, elapsed, timings["read"], timings["metadata"],
+                inserted=rows_inserted, failed=rows_failed, workers=workers, **engine.stats(), **source.stats(),
+            ),
+            "ingest_state": engine.to_state(),
+        }
+    }
+
+
+def stream_json_to_mongo(file_path, db_name, collection_name, batch_size=DEFAULT_BATCH_SIZE,
+                         workers=DEFAULT_WORKERS, progress=NULL_PROGRESS):
+    """
+    Load a JSON array or newline-delimited JSON file into MongoDB without reading it whole.
+
+    Documents are parsed one at a time (json_documents.iter_json_documents) and
+    inserted as they are, nested documents and arrays included, in unordered
+    batches of `batch_size` on `workers` threads like stream_csv_to_mongo().
+    Each batch also feeds a field-path profile: dotted paths become the columns
+    and their scalar values the column sketches, so memory stays bounded by the
+    batches in flight. Returns metadata keyed by collection name, with the
+    per-path document counts and types under "field_paths".
+    """
+    started = time.perf_counter()
+    collection = get_mongo_client()[db_name][collection_name]
+
+    paths = FieldPaths()
+    engine = ProfilingEngine()
+    rows_read = 0
+    rows_inserted = 0
+    rows_failed = 0
+    in_flight = set()
+    timings = {"read": 0.0, "metadata": 0.0}
+
+    def collect(done):
+        nonlocal rows_inserted, rows_failed
+        for future in done:
+            inserted, failed = future.result()
+            rows_inserted += inserted
+            rows_failed += failed
+            progress.advance(inserted + failed)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+
+        def load(batch):
+            nonlocal in_flight
+            progress.check()
+            progress.phase("profiling")
+            tick = time.perf_counter()
+            values = paths.observe(batch)
+            engine.update_columns({path: pd.Series(items).convert_dtypes() for path, items in values.items()})
+            timings["metadata"] += time.perf_counter() - tick
+
+            progress.phase("inserting")
+            if len(in_flight) >= 2 * workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(_insert_batch, collection, batch))
+            progress.phase("reading")
+
+        progress.phase("reading")
+        batch = []
+        for document in timed(iter_json_documents(file_path), timings, "read"):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                load(batch)
+                rows_read += len(batch)
+                batch = []
+        if batch:
+            load(batch)
+            rows_read += len(batch)
+
+        collect(in_flight)
+
+    if not rows_read:
+        raise ValueError("The uploaded file has no documents.")
+
+    elapsed = time.perf_counter() - started
+    logger.info("Inserted %d documents into MongoDB collection '%s' in database '%s'.", rows_inserted, collection_name, db_name)
+
+    columns = paths.leaf_paths()
+    categorical_columns, numeric_columns = engine.mongo_classify(columns)
+    profiles = engine.profiler.to_dict()
+    return {
+        collection_name: {
+            "columns": columns,
+            "categorical_columns": categorical_columns,
+            "numeric_columns": numeric_columns,
+            "field_paths": paths.to_dict(),
+            "column_profiles": {path: profiles[path] for path in columns if path in profiles},
+            "ingest_stats": ingest_stats(
+                "stream", rows_read, elapsed, timings["read"], timings["metadata"],
+                inserted=rows_inserted, failed=rows_failed, workers=workers, source_format="json",
+                field_paths=len(paths.paths), field_paths_truncated=paths.truncated, **engine.stats(),
+            ),
+            "ingest_state": engine.to_state(),
+        }
+    }
+
+
+def _upsert_operation(document, key, columns):
+    # Like the MySQL upsert: the upload's fields are overwritten (null ones removed, as
+    # documents are sparse) and fields the upload does not have are kept
+    update = {"$set": document}
+    cleared = {column: "" for column in columns if column not in document}
+    if cleared:
+        update["$unset"] = cleared
+    return UpdateOne({key: document[key]}, update, upsert=True)
+
+
+def _upsert_batch(collection, documents, key, columns):
+    operations = [_upsert_operation(document, key, columns) for document in documents]
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.matched_count, 0
+    except BulkWriteError as err:
+        written = err.details.get("nUpserted", 0) + err.details.get("nMatched", 0)
+        return written, len(documents) - written
+
+
+def merge_csv_into_mongo(file_path, db_name, collection_name, metadata, state, write_mode, key,
+                         chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                         progress=NULL_PROGRESS):
+    """
+    Append or upsert a CSV, Parquet or Arrow IPC file into an existing collection, keyed on the `key` field.
+
+    "append" inserts only documents whose key is not in the collection yet (the
+    first row per key wins); "upsert" updates the document of an existing key
+    with the upload's fields and keeps the others (the last row per key wins). A unique index on `key` is created if missing.
+    Column sketches resume from the `state` saved by the previous upload and only
+    see the new rows; new columns are classified from the whole upload. Returns metadata
+    keyed by collection name like stream_csv_to_mongo().
+    """
+    started = time.perf_counter()
+    collection = get_mongo_client()[db_name][collection_name]
+    collection.create_index([(key, ASCENDING)], unique=True, name=KEY_INDEX_PREFIX + key)
+
+    def lookup(keys):
+        return {document[key] for document in collection.find({key: {"$in": keys}}, {key: 1, "_id": 0})}
+
+    tracker = KeyTracker(lookup, batch_size)
+    keep = "first" if write_mode == "append" else "last"
+    columns = list(metadata["columns"])
+    categorical_columns = list(metadata["categorical_columns"])
+    numeric_columns = list(metadata["numeric_columns"])
+    engine = ProfilingEngine.from_state(state, columns)
+    added = []
+    rows_read = rows_inserted = rows_updated = rows_skipped = 0
+    rows_written = rows_failed = 0
+    in_flight = set()
+    timings = {"read": 0.0, "metadata": 0.0}
+
+    def collect(done):
+        nonlocal rows_written, rows_failed
+        for future in done:
+            written, failed = future.result()
+            rows_written += written
+            rows_failed += failed
+            progress.advance(written + failed)
+
+    with open_upload(file_path) as source, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        progress.phase("reading")
+        for chunk in timed(source.chunks(chunk_size, date_objects=False), timings, "read"):
+            if key not in chunk.columns:
+                raise ValueError(f"Upload has no '{key}' column to match documents on.")
+
+            progress.check()
+            progress.phase("profiling")
+            tick = time.perf_counter()
+            chunk_rows = len(chunk)
+            rows_read += len(chunk)
+            present = chunk[key].notna()
+            rows_skipped += int((~present).sum())
+            chunk = chunk[present]
+
+            engine.update(chunk, convert=False, sketch=False)
+            # Documents are schemaless: new columns join the metadata
+            added += [column for column in chunk.columns if column not in columns + added]
+
+            # Sketches only see the documents that are written
+            write, new = tracker.split(chunk[key], keep)
+            if write_mode == "append":
+                chunk = chunk[new]
+                engine.sketch(chunk)
+            else:
+                chunk = chunk[write]
+                inserted = sum(new)
+                engine.sketch(chunk)
+                engine.profiler.discount(len(chunk) - inserted)
+                rows_updated += len(chunk) - inserted
+            rows_inserted += sum(new)
+            timings["metadata"] += time.perf_counter() - tick
+
+            progress.phase("inserting")
+            progress.advance(chunk_rows - len(chunk))
+            documents = list(sparse_documents(chunk))
+            for start in range(0, len(documents), batch_size):
+                progress.check()
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                batch = documents[start:start + batch_size]
+                if write_mode == "append":
+                    in_flight.add(executor.submit(_insert_batch, collection, batch))
+                else:
+                    in_flight.add(executor.submit(_upsert_batch, collection, batch, key, list(chunk.columns)))
+            progress.phase("reading")
+
+        collect(in_flight)
+
+    # New columns are classified once every chunk has been observed
+    new_categorical, new_numeric = engine.mongo_classify(added)
+    columns += added
+    categorical_columns += new_categorical
+    numeric_columns += new_numeric
+
+    elapsed = time.perf_counter() - started
+    logger.info("%s %d rows into MongoDB collection '%s' (%d new, %d updated).",
+                write_mode.capitalize(), rows_read, collection_name, rows_inserted, rows_updated)
+
+    return {
+        collection_name: {
+            "columns": columns,
+            "categorical_columns": categorical_columns,
+            "numeric_columns": numeric_columns,
+            "key_column": key,
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                write_mode, rows_read, elapsed, timings["read"], timings["metadata"],
+                inserted=rows_inserted, updated=rows_updated, skipped=rows_skipped,
+                written=rows_written, failed=rows_failed, workers=workers, **engine.stats(), **source.stats(),
+            ),
+            "ingest_state": engine.to_state(),
+        }
+    }
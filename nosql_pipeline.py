@@ -0,0 +1,226 @@
+import os
+
+from cost_guard import estimate_pipeline
+
+
+# Estimated documents a $group holds (one per group) or a $sort buffers above which
+# the aggregation may spill to disk instead of failing at MongoDB's 100 MB stage limit
+DISK_USE_ROWS = int(os.environ.get("CHATDB_MONGO_DISK_USE_ROWS", "100000"))
+
+# Stages that keep the documents' count and order, so a $limit may move ahead of them
+_PER_DOCUMENT_STAGES = ("$project", "$addFields", "$set", "$unset")
+_LOGICAL_OPERATORS = ("$and", "$or", "$nor")
+
+
+class PipelinePlan:
+    """An optimized aggregation pipeline with its aggregate() options and the rewrites applied."""
+
+    def __init__(self, stages, allow_disk_use=False, rewrites=()):
+        self.stages = stages
+        self.allow_disk_use = allow_disk_use
+        self.rewrites = list(rewrites)
+
+    def options(self):
+        """Keyword arguments for collection.aggregate()."""
+        return {"allowDiskUse": True} if self.allow_disk_use else {}
+
+    def to_dict(self):
+        return {"stages": self.stages, "allow_disk_use": self.allow_disk_use, "rewrites": self.rewrites}
+
+
+def _field(reference):
+    """Field path of a "$field" reference, None for literals and "$$" variables."""
+    if isinstance(reference, str) and reference.startswith("$") and not reference.startswith("$$"):
+        return reference[1:]
+    return None
+
+
+def build_pipeline(conditions, aggregation, sorting=None, limit=None):
+    """
+    Pipeline of a parsed aggregation: $match, $group, then $sort and $limit on
+    the grouped documents. Sort keys name collection fields, so the group field
+    becomes `_id` and the aggregated field `result`; other keys no longer exist
+    after the $group and are dropped, as is any sort of a single global group.
+    """
+    pipeline = []
+    if conditions:
+        pipeline.append({"$match": conditions})
+    pipeline.append(aggregation)
+    group = aggregation["$group"]
+    group_field = _field(group["_id"])
+    if group_field is not None:
+        accumulated = {_field(value) for value in group["result"].values()}
+        renamed = {}
+        for key, order in (sorting or {}).items():
+            if key == group_field:
+                renamed["_id"] = order
+            elif key in accumulated:
+                renamed["result"] = order
+        if renamed:
+            pipeline.append({"$sort": renamed})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline
+
+
+def _merge_match(first, second):
+    if not set(first) & set(second) and not any(key.startswith("$") for key in (*first, *second)):
+        return {**first, **second}
+    terms = []
+    for condition in (first, second):
+        terms.extend(condition["$and"] if list(condition) == ["$and"] else [condition])
+    return {"$and": terms}
+
+
+def _match_fields(conditions, fields):
+    """Add the fields a $match filter reads; False when they cannot be listed ($expr, $where, $text)."""
+    for key, value in conditions.items():
+        if key in _LOGICAL_OPERATORS:
+            if not all(_match_fields(term, fields) for term in value):
+                return False
+        elif key.startswith("$"):
+            return False
+        else:
+            fields.add(key)
+    return True
+
+
+def _expression_fields(expression, fields):
+    """Add the fields an expression references; False on "$$" variables ($$ROOT, $$CURRENT)."""
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            return False
+        if expression.startswith("$"):
+            fields.add(expression[1:])
+        return True
+    if isinstance(expression, dict):
+        return all(_expression_fields(value, fields) for value in expression.values())
+    if isinstance(expression, list):
+        return all(_expression_fields(value, fields) for value in expression)
+    return True
+
+
+def _needed_fields(stages):
+    """
+    Fields the stages read before the first reshaping stage, or None when all
+    fields may reach the output (no reshaping stage) or cannot be determined.
+    """
+    fields = set()
+    for stage in stages:
+        (name, spec), = stage.items()
+        if name == "$match":
+            if not _match_fields(spec, fields):
+                return None
+        elif name == "$sort":
+            fields.update(spec)
+        elif name in ("$limit", "$skip"):
+            pass
+        elif name == "$count":
+            return fields
+        elif name == "$group":
+            return fields if _expression_fields(list(spec.values()), fields) else None
+        elif name == "$project":
+            if any(value in (0, False) for key, value in spec.items() if key != "_id"):
+                # An exclusion projection passes every other field on
+                return None
+            for key, value in spec.items():
+                if value in (1, True):
+                    fields.add(key)
+                elif value not in (0, False) and not _expression_fields(value, fields):
+                    return None
+            return fields
+        else:
+            return None
+    return None
+
+
+def _projection(fields):
+    # A path and its parent cannot both be projected; the parent covers the path
+    paths = sorted(fields)
+    kept = [path for path in paths if not any(path.startswith(f"{other}.") for other in paths)]
+    projection = {path: 1 for path in kept}
+    if "_id" not in projection:
+        # {"_id": 0} alone would be an exclusion keeping every field; _id alone keeps none
+        projection["_id"] = 0 if projection else 1
+    return projection
+
+
+def optimize_pipeline(pipeline, metadata=None, allow_disk_use=None):
+    """
+    Rewrite a pipeline the way a hand-tuned one would look and return a PipelinePlan:
+
+    - a $match after a $sort is moved ahead of it, and adjacent $match stages are
+      merged, so the whole filter is one stage that can use an index;
+    - a $project of only the fields later stages read is inserted after the
+      leading $match, so a wide document is trimmed before the $group;
+    - a $limit is moved up to its $sort (past per-document stages) and adjacent
+      limits are merged, so the sort keeps a top-k instead of sorting everything.
+
+    allowDiskUse is set when `allow_disk_use` says so or, when left None, when the
+    estimate from `metadata` puts more than DISK_USE_ROWS documents in a $group
+    or a full $sort.
+    """
+    stages = [dict(stage) for stage in pipeline]
+    rewrites = []
+
+    def note(rewrite):
+        if rewrite not in rewrites:
+            rewrites.append(rewrite)
+
+    # $match ahead of $sort, then merge neighbouring filters and limits
+    moved = True
+    while moved:
+        moved = False
+        for index in range(len(stages) - 1):
+            (name, spec), = stages[index].items()
+            (next_name, next_spec), = stages[index + 1].items()
+            if name == "$sort" and next_name == "$match":
+                stages[index], stages[index + 1] = stages[index + 1], stages[index]
+                note("moved $match ahead of $sort")
+            elif name == "$match" and next_name == "$match":
+                stages[index:index + 2] = [{"$match": _merge_match(spec, next_spec)}]
+                note("merged adjacent $match stages")
+            elif name in _PER_DOCUMENT_STAGES and next_name == "$limit":
+                stages[index], stages[index + 1] = stages[index + 1], stages[index]
+                note(f"moved $limit ahead of {name}")
+            elif name == "$limit" and next_name == "$limit":
+                stages[index:index + 2] = [{"$limit": min(spec, next_spec)}]
+                note("merged adjacent $limit stages")
+            else:
+                continue
+            moved = True
+            break
+
+    # Early projection after the leading filter
+    start = 0
+    while start < len(stages) and "$match" in stages[start]:
+        start += 1
+    if start < len(stages) and "$project" not in stages[start]:
+        fields = _needed_fields(stages[start:])
+        if fields is not None:
+            projection = _projection(fields)
+            stages.insert(start, {"$project": projection})
+            note(f"projected {', '.join(path for path in projection if path != '_id') or '_id'} "
+                            f"before {next(iter(stages[start + 1]))}")
+
+    for index in range(len(stages) - 1):
+        if "$sort" in stages[index] and "$limit" in stages[index + 1]:
+            note(f"top-{stages[index + 1]['$limit']} $sort")
+
+    if allow_disk_use is None:
+        allow_disk_use = bool(metadata) and _exceeds_memory(stages, metadata)
+    return PipelinePlan(stages, bool(allow_disk_use), rewrites)
+
+
+def _exceeds_memory(stages, metadata):
+    """Whether a $group or a $sort without a following $limit may hold more than DISK_USE_ROWS documents."""
+    for index, stage in enumerate(stages):
+        if "$group" in stage:
+            held = estimate_pipeline(stages[:index + 1], metadata).rows
+        elif "$sort" in stage and not (index + 1 < len(stages) and "$limit" in stages[index + 1]):
+            held = estimate_pipeline(stages[:index], metadata).rows
+        else:
+            continue
+        if held > DISK_USE_ROWS:
+            return True
+    return False
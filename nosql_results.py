@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import os
+
+from bson import json_util
+
+from mongo_client import kill_operations
+from query_control import NULL_QUERY
+from telemetry import NULL_TIMER
+
+
+DEFAULT_FIND_PAGE_SIZE = int(os.environ.get("CHATDB_MONGO_PAGE_SIZE", "10"))
+MAX_FIND_PAGE_SIZE = int(os.environ.get("CHATDB_MONGO_MAX_PAGE_SIZE", "1000"))
+# count_documents() stops here; larger totals are reported as a lower bound
+COUNT_ESTIMATE_LIMIT = int(os.environ.get("CHATDB_MONGO_COUNT_LIMIT", "100000"))
+
+
+class InvalidFindToken(ValueError):
+    """Raised when a find continuation token is malformed or stale."""
+
+
+def encode_find_token(state):
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_find_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidFindToken("Malformed continuation token.")
+
+
+def query_fingerprint(query_string):
+    return hashlib.sha1(query_string.encode()).hexdigest()[:16]
+
+
+def _after_value(field, direction, value):
+    """Filter for values of `field` strictly after `value`, or None if nothing sorts after it."""
+    if direction == 1:
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def keyset_filter(sort_keys, last_values, last_id):
+    """
+    Filter for documents strictly after (last_values..., last_id) in the order
+    sort_keys + [(_id, 1)], where sort_keys is a list of (field, direction). A
+    document is later when it ties on the first i keys and is after the last
+    document on key i + 1 (or, tying on every key, has a larger _id). Null and
+    missing values sort first ascending and last descending, matching MongoDB's
+    ordering.
+    """
+    branches = []
+    equal = {}
+    for (field, direction), value in zip(sort_keys, last_values):
+        after = _after_value(field, direction, value)
+        if after is not None:
+            branches.append({"$and": [equal, after]} if equal else after)
+        equal = {**equal, field: value}
+    branches.append({**equal, "_id": {"$gt": last_id}})
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def fetch_find_page(collection, conditions, projection, sorting, query_string, data_version,
+                    page_size=DEFAULT_FIND_PAGE_SIZE, token=None, include_count=False, timer=NULL_TIMER,
+                    control=NULL_QUERY):
+    """
+    One page of a find() query using keyset pagination on (sort keys..., _id).
+
+    Each page seeks past the last document of the previous page through the filter
+    instead of skip(), so deep pages cost the same as the first one. Returns a dict
+    with the documents, the next continuation token (None on the last page) and,
+    when requested, a total-count estimate. `control` (a RunningQuery) adds
+    maxTimeMS and tags the operations with its request id so they can be killed.
+    """
+    page_size = max(1, min(int(page_size), MAX_FIND_PAGE_SIZE))
+    sort_keys = list((sorting or {}).items())
+    sort_fields = [field for field, _ in sort_keys]
+
+    state = None
+    if token:
+        state = decode_find_token(token)
+        if state.get("q") != query_fingerprint(query_string):
+            raise InvalidFindToken("Continuation token belongs to a different query.")
+        if state.get("v") != data_version:
+            raise InvalidFindToken("The collection changed since this page was produced; restart from the first page.")
+        if not isinstance(state.get("last"), list) or len(state["last"]) != len(sort_keys):
+            raise InvalidFindToken("Malformed continuation token.")
+
+    # The page key (_id and the sort fields) must be fetched even if not displayed
+    projection = dict(projection or {})
+    hide_id = projection.pop("_id", 1) == 0
+    hidden_fields = set()
+    if projection:
+        for field in sort_fields:
+            if field not in projection:
+                projection[field] = 1
+                hidden_fields.add(field)
+
+    query_filter = conditions or {}
+    if state:
+        after = keyset_filter(sort_keys, state["last"], state["id"])
+        query_filter = {"$and": [query_filter, after]} if query_filter else after
+
+    order = sort_keys + [("_id", 1)]
+    options = control.command_options()
+    with control.bound(lambda: kill_operations(collection.database.client, control.request_id)):
+        with timer.span("execute"):
+            # find() is lazy; pulling the first document runs the query and returns its first batch
+            cursor = collection.find(query_filter, projection or None, comment=control.request_id,
+                                     max_time_ms=control.timeout_ms or None).sort(order).limit(page_size + 1)
+            first = next(cursor, None)
+        with timer.span("fetch"):
+            documents = [] if first is None else [first] + list(cursor)
+
+    next_token = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_token = encode_find_token({
+            "q": query_fingerprint(query_string),
+            "v": data_version,
+            "last": [last.get(field) for field in sort_fields],
+            # json_util keeps the _id type: ObjectId, or the int/string ids of imported JSON documents
+            "id": last["_id"],
+        })
+
+    for document in documents:
+        if hide_id:
+            document.pop("_id", None)
+        elif "_id" in document:
+            document["_id"] = str(document["_id"])
+        for field in hidden_fields:
+            document.pop(field, None)
+
+    page = {"data": documents, "next_page_token": next_token}
+    if include_count:
+        with control.bound(lambda: kill_operations(collection.database.client, control.request_id)):
+            with timer.span("execute"):
+                if conditions:
+                    total = collection.count_documents(conditions, limit=COUNT_ESTIMATE_LIMIT, **options)
+                    page["total_estimate"] = total
+                    page["total_is_lower_bound"] = total >= COUNT_ESTIMATE_LIMIT
+                else:
+                    page["total_estimate"] = collection.estimated_document_count(**options)
+                    page["total_is_lower_bound"] = False
+    return page
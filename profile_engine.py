@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+import pandas as pd
+
+from profiling import ColumnProfile, TableProfiler
+from sql_types import ColumnType, TypeInference
+
+
+# Threads profiling the columns of a chunk in parallel (shared by all uploads)
+PROFILE_WORKERS = int(os.environ.get("CHATDB_PROFILE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+logger = logging.getLogger(__name__)
+
+
+def _csv_engine(requested):
+    """Parser for whole-file reads: "c" (pandas default) or "pyarrow" (multi-threaded) when it is installed."""
+    if requested == "pyarrow" and find_spec("pyarrow") is None:
+        logger.warning("CHATDB_CSV_ENGINE=pyarrow but pyarrow is not installed; using the C parser.")
+        return "c"
+    return "pyarrow" if requested == "pyarrow" else "c"
+
+
+CSV_ENGINE = _csv_engine(os.environ.get("CHATDB_CSV_ENGINE", "c"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, PROFILE_WORKERS), thread_name_prefix="profile")
+        return _executor
+
+
+def _releases_gil(series):
+    """Whether profiling `series` runs mostly in numpy/pandas kernels that release the GIL."""
+    return pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+
+
+def normalize_columns(data_frame):
+    data_frame.columns = data_frame.columns.str.replace(' ', '_').str.lower()
+    return data_frame
+
+
+def read_csv_frame(path, engine=None):
+    """Whole CSV with upload column names, parsed by CSV_ENGINE unless `engine` is given."""
+    return normalize_columns(pd.read_csv(path, engine=engine or CSV_ENGINE))
+
+
+def read_csv_chunks(path, chunk_size):
+    """
+    CSV in chunks of `chunk_size` rows with upload column names. Always the C parser:
+    pandas cannot stream row chunks from the pyarrow one.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        yield normalize_columns(chunk)
+
+
+class ProfilingEngine:
+    """
+    Column metadata for uploads, shared by the MySQL and MongoDB loaders: exact
+    types (TypeInference), the attribute/measure/date classification derived
+    from them and bounded sketches (TableProfiler).
+
+    Each column of a chunk is one task (widen its type, convert its values,
+    update its sketch) that only touches that column's state. Tasks of numeric,
+    boolean and datetime columns run on a shared pool of PROFILE_WORKERS
+    threads, where the numpy/pandas kernels release the GIL. Text columns get
+    no speedup from threads: their hashing, counting and sampling run largely
+    in Python under the GIL, so they run one after another in the calling
+    thread while the pooled numeric tasks proceed. `seconds` adds up the
+    engine's wall time so loaders can report it apart from parsing and
+    inserting.
+    """
+
+    def __init__(self, columns=(), types=None, profiler=None):
+        columns = list(columns)
+        self.types = types if types is not None else TypeInference(columns)
+        self.profiler = profiler if profiler is not None else TableProfiler(columns)
+        self.seconds = 0.0
+
+    @classmethod
+    def from_state(cls, state, columns=()):
+        """Resume from a saved ingest_state; states saved without types restart inference for `columns`."""
+        types = TypeInference.from_state(state["types"]) if state.get("types") else TypeInference(columns)
+        return cls(types=types, profiler=TableProfiler.from_state(state["profiles"]))
+
+    def _map(self, function, names, columns):
+        """[function(name) for name in names], with the numeric columns of `columns` done on the pool."""
+        pooled = [name for name in names if _releases_gil(columns[name])]
+        if PROFILE_WORKERS <= 1 or len(names) < 2 or not pooled:
+            return [function(name) for name in names]
+        futures = {name: _pool().submit(function, name) for name in pooled}
+        results = {name: function(name) for name in names if name not in futures}
+        return [futures[name].result() if name in futures else results[name] for name in names]
+
+    def _add_columns(self, names, sketch):
+        # Registered up front so the column tasks never resize the shared dicts
+        for name in names:
+            if name not in self.types.columns:
+                self.types.columns[name] = ColumnType(name)
+            if sketch and name not in self.profiler.profiles:
+                self.profiler.profiles[name] = ColumnProfile(**self.profiler.sketch_options)
+
+    def update(self, chunk, convert=True, sketch=True):
+        """
+        Observe one chunk; return (chunk, {column: new SQL type}) like TypeInference.update().
+        With `convert` the returned chunk holds values in the form MySQL expects, otherwise it
+        is the chunk as read. `sketch=False` leaves the sketches to a later sketch() call on the
+        rows actually written.
+        """
+        values, changed = self.update_columns({name: chunk[name] for name in chunk.columns}, convert, sketch)
+        if convert:
+            chunk = pd.DataFrame(values, index=chunk.index)
+        return chunk, changed
+
+    def update_columns(self, columns, convert=False, sketch=True):
+        """
+        update() for {name: Series} whose lengths may differ (values of document field
+        paths); returns ({name: Series}, {column: new SQL type}).
+        """
+        tick = time.perf_counter()
+        names = list(columns)
+        self._add_columns(names, sketch)
+        before = self.types.sql_types()
+
+        def work(name):
+            column = self.types.columns[name]
+            column.update(columns[name])
+            values = column.convert(columns[name]) if convert else columns[name]
+            if sketch:
+                self.profiler.profiles[name].update(values)
+            return values
+
+        values = dict(zip(names, self._map(work, names, columns)))
+        changed = {name: sql_type for name, sql_type in self.types.sql_types().items() if before[name] != sql_type}
+        self.seconds += time.perf_counter() - tick
+        return values, changed
+
+    def sketch(self, chunk):
+        """Update only the sketches, for rows whose types were observed by update()."""
+        tick = time.perf_counter()
+        names = list(chunk.columns)
+        self._add_columns(names, True)
+        self._map(lambda name: self.profiler.profiles[name].update(chunk[name]), names, chunk)
+        self.seconds += time.perf_counter() - tick
+
+    def classify(self):
+        """(attributes, measures, dates) for MySQL metadata."""
+        return self.types.classify()
+
+    def mongo_classify(self, columns=None):
+        """(categorical, numeric) for MongoDB metadata: measures are numeric, everything else categorical."""
+        _, measures, _ = self.types.classify()
+        names = list(columns) if columns is not None else list(self.types.columns)
+        return [name for name in names if name not in measures], [name for name in names if name in measures]
+
+    def stats(self):
+        """Profiling figures for ingest_stats()."""
+        return {"profile_seconds": round(self.seconds, 3), "profile_workers": PROFILE_WORKERS}
+
+    def to_state(self):
+        return {"types": self.types.to_state(), "profiles": self.profiler.to_state()}
@@ -0,0 +1,281 @@
+import base64
+import datetime
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# Sketch sizes (bounded regardless of column cardinality)
+DEFAULT_TOP_K = int(os.environ.get("CHATDB_PROFILE_TOP_K", "20"))
+DEFAULT_SAMPLE_SIZE = int(os.environ.get("CHATDB_PROFILE_SAMPLE_SIZE", "50"))
+DEFAULT_HLL_PRECISION = int(os.environ.get("CHATDB_PROFILE_HLL_PRECISION", "12"))
+
+
+def to_python(value):
+    """Convert numpy/pandas scalars into JSON-friendly Python values."""
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class HyperLogLog:
+    """Approximate distinct counter using 2**precision one-byte registers."""
+
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_series(self, series):
+        if series.empty:
+            return
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+        shift = np.uint64(64 - self.precision)
+        index = (hashes >> shift).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # frexp gives the bit length exactly because remainder < 2**53
+        _, bit_length = np.frexp(remainder.astype(np.float64))
+        rank = (64 - self.precision) - bit_length + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_state(self):
+        return base64.b64encode(self.registers.tobytes()).decode("ascii")
+
+    def load_state(self, state):
+        registers = np.frombuffer(base64.b64decode(state), dtype=np.uint8)
+        if len(registers) == len(self.registers):
+            self.registers = registers.copy()
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class SpaceSaving:
+    """Bounded heavy-hitters summary (top-k frequent values with an error bound)."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}  # value -> [count, error]
+
+    def add_counts(self, counts):
+        for value, count in counts:
+            if value in self.counters:
+                self.counters[value][0] += count
+            elif len(self.counters) < self.capacity:
+                self.counters[value] = [count, 0]
+            else:
+                victim = min(self.counters, key=lambda key: self.counters[key][0])
+                floor = self.counters.pop(victim)[0]
+                self.counters[value] = [floor + count, floor]
+
+    def top(self, k=None):
+        """(value, guaranteed_count) pairs ranked by their lower-bound count."""
+        ranked = sorted(
+            ((value, count - error) for value, (count, error) in self.counters.items()),
+            key=lambda item: item[1], reverse=True,
+        )
+        return ranked[:k] if k else ranked
+
+
+class ColumnProfile:
+    """
+    Bounded statistics for one column: row/null counts, approximate distinct count,
+    top-k frequent values, a reservoir sample and min/max. Feed it one chunk at a time.
+    """
+
+    def __init__(self, top_k=DEFAULT_TOP_K, sample_size=DEFAULT_SAMPLE_SIZE, hll_precision=DEFAULT_HLL_PRECISION):
+        self.top_k = top_k
+        self.sample_size = sample_size
+        self.count = 0
+        self.null_count = 0
+        self.distinct = HyperLogLog(hll_precision)
+        self.frequent = SpaceSaving(top_k * 2)
+        self.sample = []
+        self.min = None
+        self.max = None
+        self._seen = 0  # non-null values offered to the reservoir
+        self._rng = np.random.default_rng()
+        self._footer = False  # counts and range already known from a file footer
+
+    def load_footer(self, count, null_count, low, high):
+        """Take row/null counts and min/max from file statistics; update() then only feeds the sketches."""
+        self.count, self.null_count = count, null_count
+        self.min, self.max = low, high
+        self._footer = True
+
+    def update(self, series):
+        values = series.dropna()
+        if not self._footer:
+            self.count += len(series)
+            self.null_count += len(series) - len(values)
+        if values.empty:
+            return
+
+        self.distinct.add_series(values)
+        # Only the chunk's own heavy hitters can be heavy hitters overall; keys are kept
+        # JSON-friendly so counts restored by load_state() keep matching new values
+        counts = values.value_counts().head(self.frequent.capacity)
+        self.frequent.add_counts((to_python(value), int(count)) for value, count in counts.items())
+        self._update_sample(values)
+        if not self._footer:
+            self._update_range(values)
+
+    def _update_sample(self, values):
+        # Reservoir sampling (Algorithm R), only touching accepted positions
+        array = values.to_numpy()
+        start = 0
+        if len(self.sample) < self.sample_size:
+            start = min(self.sample_size - len(self.sample), len(array))
+            self.sample.extend(array[:start])
+        positions = np.arange(start, len(array))
+        slots = np.floor(self._rng.random(len(positions)) * (self._seen + positions + 1)).astype(np.int64)
+        accepted = slots < self.sample_size
+        for slot, offset in zip(slots[accepted], positions[accepted]):
+            self.sample[slot] = array[offset]
+        self._seen += len(array)
+
+    def _update_range(self, values):
+        try:
+            low, high = values.min(), values.max()
+        except TypeError:
+            # Mixed types cannot be ordered; compare their text form instead
+            as_text = values.astype(str)
+            low, high = as_text.min(), as_text.max()
+        if self.min is None:
+            self.min, self.max = low, high
+            return
+        try:
+            self.min, self.max = min(self.min, low), max(self.max, high)
+        except TypeError:
+            # Restored bounds are JSON values (dates as ISO text)
+            self.min = min(str(to_python(self.min)), str(to_python(low)))
+            self.max = max(str(to_python(self.max)), str(to_python(high)))
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "null_count": self.null_count,
+            "distinct_estimate": min(self.distinct.estimate(), self.count - self.null_count),
+            "top_values": [[to_python(value), int(count)] for value, count in self.frequent.top(self.top_k)],
+            "sample": [to_python(value) for value in self.sample],
+            "min": to_python(self.min),
+            "max": to_python(self.max),
+        }
+
+    def to_state(self):
+        """Full sketch state (JSON-friendly) so later appends can keep updating it."""
+        return {
+            "count": self.count,
+            "null_count": self.null_count,
+            "distinct": self.distinct.to_state(),
+            "frequent": [[value, count, error] for value, (count, error) in self.frequent.counters.items()],
+            "sample": [to_python(value) for value in self.sample],
+            "seen": self._seen,
+            "min": to_python(self.min),
+            "max": to_python(self.max),
+        }
+
+    def load_state(self, state):
+        self.count = state["count"]
+        self.null_count = state["null_count"]
+        self.distinct.load_state(state["distinct"])
+        self.frequent.counters = {value: [count, error] for value, count, error in state["frequent"]}
+        self.sample = list(state["sample"])
+        self._seen = state["seen"]
+        self.min = state["min"]
+        self.max = state["max"]
+
+
+class TableProfiler:
+    """Keeps a ColumnProfile per column and updates them chunk by chunk."""
+
+    def __init__(self, columns=None, **sketch_options):
+        self.sketch_options = sketch_options
+        self.profiles = {}
+        for column in columns or []:
+            self.profiles[column] = ColumnProfile(**sketch_options)
+
+    def update(self, data_frame):
+        for column in data_frame.columns:
+            if column not in self.profiles:
+                self.profiles[column] = ColumnProfile(**self.sketch_options)
+            self.profiles[column].update(data_frame[column])
+
+    def discount(self, rows):
+        """Take rows that replaced existing ones (upserts) back off the row counts."""
+        for profile in self.profiles.values():
+            profile.count = max(0, profile.count - rows)
+            profile.null_count = min(profile.null_count, profile.count)
+
+    def to_dict(self):
+        return {column: profile.to_dict() for column, profile in self.profiles.items()}
+
+    def to_state(self):
+        return {column: profile.to_state() for column, profile in self.profiles.items()}
+
+    @classmethod
+    def from_state(cls, state, **sketch_options):
+        profiler = cls(list(state), **sketch_options)
+        for column, column_state in state.items():
+            profiler.profiles[column].load_state(column_state)
+        return profiler
+
+
+def profile_values(profile):
+    """Representative values of a column: frequent values first, then sampled ones."""
+    if not profile:
+        return []
+    values = [value for value, _ in profile.get("top_values", [])]
+    seen = set(map(repr, values))
+    for value in profile.get("sample", []):
+        if repr(value) not in seen:
+            seen.add(repr(value))
+            values.append(value)
+    return values
+
+
+def timed(iterable, timings, key):
+    """Yield from iterable, adding the time spent producing each item to timings[key]."""
+    iterator = iter(iterable)
+    while True:
+        tick = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - tick
+            return
+        timings[key] += time.perf_counter() - tick
+        yield item
+
+
+def ingest_stats(mode, rows, elapsed, read_seconds, metadata_seconds, **extra):
+    """
+    Loader timing summary. CSV parsing and metadata extraction are reported
+    separately; the rest of the wall time is attributed to inserting.
+    """
+    stats = {
+        "mode": mode,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "read_seconds": round(read_seconds, 3),
+        "metadata_seconds": round(metadata_seconds, 3),
+        "insert_seconds": round(max(0.0, elapsed - read_seconds - metadata_seconds), 3),
+    }
+    stats.update(extra)
+    return stats
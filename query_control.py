@@ -0,0 +1,504 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from catalog import CATALOG_PATH
+from jobs import process_alive
+
+
+# Server-side execution limit per query (MySQL MAX_EXECUTION_TIME, MongoDB maxTimeMS); 0 disables
+QUERY_TIMEOUT_MS = int(os.environ.get("CHATDB_QUERY_TIMEOUT_MS", "30000"))
+# Queries running at once against one table or collection
+TABLE_MAX_QUERIES = int(os.environ.get("CHATDB_TABLE_MAX_QUERIES", "4"))
+# Queries waiting for a slot per table; further ones are shed right away
+TABLE_MAX_QUEUED = int(os.environ.get("CHATDB_TABLE_MAX_QUEUED", "16"))
+# Longest wait for a slot before a queued query is shed
+TABLE_QUEUE_TIMEOUT = float(os.environ.get("CHATDB_TABLE_QUEUE_TIMEOUT", "10"))
+# Seconds between checks for a slot freed, or a cancellation requested, by another worker process
+QUERY_POLL_INTERVAL = float(os.environ.get("CHATDB_QUERY_POLL_INTERVAL", "0.2"))
+
+# Error codes for "stopped by the time limit" and "killed"
+MYSQL_TIMEOUT_ERRNO = 3024
+MYSQL_INTERRUPTED_ERRNO = 1317
+MONGO_TIMEOUT_CODE = 50
+MONGO_INTERRUPTED_CODE = 11601
+
+_REQUEST_ID_RE = re.compile(r"^[\w.-]{1,64}$")
+_SELECT_RE = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryControlError(Exception):
+    """A query stopped or refused by query control; routes answer with `status_code`."""
+
+    status_code = 500
+    outcome = "error"
+
+
+class TableBusy(QueryControlError):
+    """Raised when a table's query slots and wait queue are full, or the wait timed out."""
+
+    status_code = 503
+    outcome = "shed"
+
+
+class QueryTimeout(QueryControlError):
+    """The database stopped the query at its execution time limit."""
+
+    status_code = 504
+    outcome = "timeout"
+
+
+class QueryCancelled(QueryControlError):
+    """The query was cancelled through the cancel endpoint."""
+
+    status_code = 409
+    outcome = "cancelled"
+
+
+class RequestIdInUse(QueryControlError):
+    """Raised when a client reuses the id of a query that is still running."""
+
+    status_code = 409
+    outcome = "duplicate"
+
+
+def new_request_id(supplied=None):
+    """The client's request id when it is usable (letters, digits, '_', '.', '-'), else a fresh one."""
+    if supplied and _REQUEST_ID_RE.match(str(supplied)):
+        return str(supplied)
+    return uuid.uuid4().hex
+
+
+class NullQuery:
+    """Stand-in when a caller runs a query outside query control: no time limit, nothing to cancel."""
+
+    request_id = None
+    timeout_ms = 0
+    cancelled = False
+
+    def statement(self, sql):
+        return sql
+
+    def command_options(self):
+        return {}
+
+    def bound(self, cancel):
+        return nullcontext()
+
+    def check(self):
+        pass
+
+    def interruptible(self):
+        return nullcontext()
+
+
+NULL_QUERY = NullQuery()
+
+
+class RunningQuery:
+    """
+    One admitted query, handed to the executors. statement() and
+    command_options() add the server-side time limit, bound() installs how to
+    kill the query while it holds a connection, check() raises once it was
+    cancelled (streams call it between batches) and interruptible() turns the
+    database's timeout and kill errors into QueryTimeout / QueryCancelled.
+    """
+
+    def __init__(self, request_id, kind, name, query, timeout_ms=QUERY_TIMEOUT_MS):
+        self.request_id = request_id
+        self.kind = kind
+        self.name = name
+        self.query = query
+        self.timeout_ms = timeout_ms
+        self.started = time.time()
+        self.cancelled = False
+        self._cancel = None
+        self._lock = threading.Lock()
+
+    def statement(self, sql):
+        """MySQL SELECT with a MAX_EXECUTION_TIME optimizer hint."""
+        if not self.timeout_ms:
+            return sql
+        return _SELECT_RE.sub(f"SELECT /*+ MAX_EXECUTION_TIME({int(self.timeout_ms)}) */", sql, count=1)
+
+    def command_options(self):
+        """MongoDB aggregate()/count_documents() options: maxTimeMS, and the request id as comment for killOp."""
+        options = {"comment": self.request_id}
+        if self.timeout_ms:
+            options["maxTimeMS"] = self.timeout_ms
+        return options
+
+    @contextmanager
+    def bound(self, cancel):
+        """
+        Make cancel() call `cancel` while the block runs. The hook is removed
+        under the same lock cancel() holds while calling it, so a late cancel
+        can never reach a connection already handed to another query.
+        """
+        with self._lock:
+            self._cancel = cancel
+        try:
+            self.check()
+            yield
+        finally:
+            with self._lock:
+                self._cancel = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self._cancel is not None:
+                self._cancel()
+
+    def check(self):
+        if self.cancelled:
+            raise QueryCancelled(f"Query {self.request_id} was cancelled.")
+
+    @contextmanager
+    def interruptible(self):
+        try:
+            yield
+        except QueryControlError:
+            raise
+        except Exception as e:
+            code = getattr(e, "errno", None) or getattr(e, "code", None)
+            if self.cancelled or code in (MYSQL_INTERRUPTED_ERRNO, MONGO_INTERRUPTED_CODE):
+                raise QueryCancelled(f"Query {self.request_id} was cancelled.") from e
+            if code in (MYSQL_TIMEOUT_ERRNO, MONGO_TIMEOUT_CODE):
+                raise QueryTimeout(f"Query {self.request_id} exceeded the {self.timeout_ms} ms time limit; "
+                                   f"add a filter or a limit.") from e
+            raise
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "kind": self.kind,
+            "name": self.name,
+            "query": self.query,
+            "elapsed_seconds": round(time.time() - self.started, 3),
+            "timeout_ms": self.timeout_ms,
+            "cancel_requested": self.cancelled,
+        }
+
+
+class QueryRecord:
+    """A query as registered in the query table, possibly by another worker process."""
+
+    def __init__(self, request_id, kind, name, query, state, started, timeout_ms, cancel_requested):
+        self.request_id = request_id
+        self.kind = kind
+        self.name = name
+        self.query = query
+        self.state = state
+        self.started = started
+        self.timeout_ms = timeout_ms
+        self.cancelled = bool(cancel_requested)
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "kind": self.kind,
+            "name": self.name,
+            "query": self.query,
+            "state": self.state,
+            "elapsed_seconds": round(time.time() - self.started, 3),
+            "timeout_ms": self.timeout_ms,
+            "cancel_requested": self.cancelled,
+        }
+
+
+class QueryStore:
+    """
+    Running and queued queries in the shared SQLite catalog file, so the
+    per-table slots are counted across all worker processes and any process can
+    list and cancel any query. Like upload jobs, rows of a process that exited
+    are dropped the next time their table is full.
+    """
+
+    _COLUMNS = "request_id, kind, name, query, state, started, timeout_ms, cancel_requested"
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " request_id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " pid INTEGER NOT NULL,"
+            " started REAL NOT NULL,"
+            " timeout_ms INTEGER NOT NULL,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS queries_table ON queries (kind, name, state)")
+
+    def _connect(self):
+        # A connection inherited through fork() must not be used by the child
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction: slots are counted and taken without another process in between."""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _counts(self, connection, kind, name):
+        counts = {"running": 0, "waiting": 0}
+        counts.update(connection.execute(
+            "SELECT state, COUNT(*) FROM queries WHERE kind = ? AND name = ? GROUP BY state", (kind, name)
+        ))
+        return counts
+
+    def _release_orphans(self, connection, kind, name):
+        """Drop the rows of (kind, name) left by exited processes; returns whether any were."""
+        pids = [pid for pid, in connection.execute(
+            "SELECT DISTINCT pid FROM queries WHERE kind = ? AND name = ?", (kind, name)
+        ) if not process_alive(pid)]
+        for pid in pids:
+            connection.execute("DELETE FROM queries WHERE kind = ? AND name = ? AND pid = ?", (kind, name, pid))
+        return bool(pids)
+
+    def _free_counts(self, connection, kind, name, max_running):
+        counts = self._counts(connection, kind, name)
+        if counts["running"] >= max_running and self._release_orphans(connection, kind, name):
+            counts = self._counts(connection, kind, name)
+        return counts
+
+    def enter(self, running, max_running, max_queued):
+        """
+        Register `running` as "running" when its (kind, name) has a free slot,
+        else as "waiting" when the wait queue has room. Returns the state, or
+        None when the query is shed, with the counts it was decided on.
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT pid FROM queries WHERE request_id = ?", (running.request_id,)).fetchone()
+            if row is not None:
+                if process_alive(row[0]):
+                    raise RequestIdInUse(f"A query with request id {running.request_id} is already running.")
+                connection.execute("DELETE FROM queries WHERE request_id = ?", (running.request_id,))
+            counts = self._free_counts(connection, running.kind, running.name, max_running)
+            if counts["running"] < max_running:
+                state = "running"
+            elif counts["waiting"] < max_queued:
+                state = "waiting"
+            else:
+                return None, counts
+            connection.execute(
+                f"INSERT INTO queries ({self._COLUMNS}, pid) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (running.request_id, running.kind, running.name, running.query, state, running.started,
+                 running.timeout_ms, os.getpid()),
+            )
+        return state, counts
+
+    def promote(self, running, max_running):
+        """Move a waiting query into a free slot; True once it holds one."""
+        with self._transaction() as connection:
+            if self._free_counts(connection, running.kind, running.name, max_running)["running"] >= max_running:
+                return False
+            connection.execute(
+                "UPDATE queries SET state = 'running', started = ? WHERE request_id = ? AND pid = ?",
+                (running.started, running.request_id, os.getpid()),
+            )
+        return True
+
+    def remove(self, request_id):
+        self._connect().execute("DELETE FROM queries WHERE request_id = ? AND pid = ?", (request_id, os.getpid()))
+
+    def request_cancel(self, request_id):
+        """Flag the query for cancellation; returns its record, or None when no query has that id."""
+        self._connect().execute("UPDATE queries SET cancel_requested = 1 WHERE request_id = ?", (request_id,))
+        return self.get(request_id)
+
+    def cancel_requested(self):
+        """Request ids of this process's queries flagged for cancellation."""
+        rows = self._connect().execute(
+            "SELECT request_id FROM queries WHERE pid = ? AND cancel_requested = 1", (os.getpid(),)
+        )
+        return [request_id for request_id, in rows]
+
+    def _records(self, where, params):
+        rows = self._connect().execute(f"SELECT {self._COLUMNS} FROM queries WHERE {where} ORDER BY started", params)
+        return [QueryRecord(*row) for row in rows]
+
+    def get(self, request_id):
+        records = self._records("request_id = ?", (request_id,))
+        return records[0] if records else None
+
+    def queries(self):
+        return self._records("1 = 1", ())
+
+    def counts(self):
+        counts = {"running": 0, "waiting": 0}
+        counts.update(self._connect().execute("SELECT state, COUNT(*) FROM queries GROUP BY state"))
+        return counts
+
+
+class QueryManager:
+    """
+    Admission control and the registry of running queries.
+
+    At most `max_running` queries run at once per (kind, name); up to
+    `max_queued` more wait up to `queue_timeout` seconds for a slot and the
+    rest are shed with TableBusy. Slots and the registry are kept in the shared
+    catalog (QueryStore), so the limits hold across all worker processes and
+    cancel() reaches a query admitted by any of them: queries of this process
+    are killed right away, the others by their own process, which polls for
+    cancellations every QUERY_POLL_INTERVAL seconds while it runs queries.
+    """
+
+    def __init__(self, max_running=TABLE_MAX_QUERIES, max_queued=TABLE_MAX_QUEUED,
+                 queue_timeout=TABLE_QUEUE_TIMEOUT, timeout_ms=QUERY_TIMEOUT_MS, path=CATALOG_PATH):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.timeout_ms = timeout_ms
+        self._store = QueryStore(path)
+        self._running = {}  # request id -> RunningQuery admitted by this process
+        self._lock = threading.Condition()
+        self._stats = Counter()
+        self._watcher_pid = None
+
+    def admit(self, request_id, kind, name, query):
+        """Wait for a slot on (kind, name) and register the query; pair every admit() with done()."""
+        running = RunningQuery(request_id, kind, name, query, self.timeout_ms)
+        state, counts = self._store.enter(running, self.max_running, self.max_queued)
+        if state is None:
+            with self._lock:
+                self._stats["shed"] += 1
+            raise TableBusy(f"Too many queries on '{name}' ({counts['running']} running, "
+                            f"{counts['waiting']} waiting); retry shortly.")
+        if state == "waiting":
+            with self._lock:
+                self._stats["queued"] += 1
+            self._wait_for_slot(running)
+        with self._lock:
+            self._stats["admitted"] += 1
+            self._running[request_id] = running
+        self._watch_cancels()
+        return running
+
+    def _wait_for_slot(self, running):
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            with self._lock:
+                running.started = time.time()
+                while not self._store.promote(running, self.max_running):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["shed"] += 1
+                        raise TableBusy(f"No query slot on '{running.name}' became free within "
+                                        f"{self.queue_timeout:g} seconds; retry shortly.")
+                    # done() in this process wakes the waiters; slots freed by other processes are polled
+                    self._lock.wait(min(remaining, QUERY_POLL_INTERVAL))
+                    running.started = time.time()
+        except BaseException:
+            self._store.remove(running.request_id)
+            raise
+
+    def done(self, running):
+        """Release the query's slot; safe to call more than once."""
+        with self._lock:
+            if self._running.get(running.request_id) is not running:
+                return
+            del self._running[running.request_id]
+        self._store.remove(running.request_id)
+        with self._lock:
+            # Waiters of every table share the condition
+            self._lock.notify_all()
+
+    @contextmanager
+    def run(self, request_id, kind, name, query):
+        """admit() ... done() around a block, with database errors turned into QueryTimeout / QueryCancelled."""
+        running = self.admit(request_id, kind, name, query)
+        try:
+            with running.interruptible():
+                yield running
+        except QueryControlError as e:
+            self.record(e)
+            raise
+        finally:
+            self.done(running)
+
+    def cancel(self, request_id):
+        """
+        Cancel a running or queued query of any worker process; returns it (a
+        RunningQuery when it runs here, else its QueryRecord), or None when no
+        query runs under that id.
+        """
+        record = self._store.request_cancel(request_id)
+        if record is None:
+            return None
+        with self._lock:
+            running = self._running.get(request_id)
+        if running is None:
+            return record
+        running.cancel()
+        return running
+
+    def _watch_cancels(self):
+        """Start this process's thread that applies cancellations requested through other processes."""
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self._apply_cancels, name="query-cancel-watch", daemon=True).start()
+
+    def _apply_cancels(self):
+        while True:
+            time.sleep(QUERY_POLL_INTERVAL)
+            with self._lock:
+                running = dict(self._running)
+            if not running:
+                continue
+            try:
+                requested = self._store.cancel_requested()
+            except sqlite3.Error:
+                logger.exception("Polling the query table for cancellations failed")
+                continue
+            for request_id in requested:
+                query = running.get(request_id)
+                if query is not None and not query.cancelled:
+                    query.cancel()
+
+    def record(self, error):
+        """Count a QueryControlError raised outside run() (streamed results)."""
+        with self._lock:
+            self._stats[error.outcome] += 1
+
+    def running(self):
+        """Running and queued queries of every worker process."""
+        return [record.to_dict() for record in self._store.queries()]
+
+    def stats(self):
+        counts = self._store.counts()
+        with self._lock:
+            return {
+                "running": counts["running"],
+                "waiting": counts["waiting"],
+                "max_running_per_table": self.max_running,
+                "max_queued_per_table": self.max_queued,
+                "timeout_ms": self.timeout_ms,
+                **{name: self._stats[name] for name in ("admitted", "queued", "shed", "timeout", "cancelled")},
+            }
@@ -1,10 +1,170 @@
 import pandas as pd
 import random
 import re
+import threading
+import time
+from functools import lru_cache
+from profiling import profile_values
+
+# Natural-language patterns for selecting(), tried in this order
+SELECT_PATTERNS = {
+    "total_group_by": r"(?:sum|total|sum of|total of all|sum of all) (.+?)(?:by|grouped by|group by|for each|per|for every|of each) (.+?)(?:$|where|limit|ordered|sort)",
+    "average_group_by": r"(?:mean|avg|average|average of|mean of|avg of) (.+?)(?:by|group by|grouped by|for every|of each|for each|per) (.+?)(?:$|ordered|where|sort|limit)",
+    "min_group_by": r"(?:smallest|min|lowest|min of|minimum|minimum of) (.+?)(?:by|for each|group by|of each|for every|grouped by|per) (.+?)(?:$|ordered|where|limit|sort)",
+    "max_group_by": r"(?:maximum|max|largest|max of|maximum of|biggest) (.+?)(?:grouped by|by|for every|group by|of each|for each|per) (.+?)(?:$|sort|limit|ordered|where)",
+    "count_group_by": r"(?:number|count) (.+?)(?:group by|grouped by|by|for each|for every|of each|per) (.+?)(?:$|ordered|sort|where|limit)",
+    
+    "total": r"(?:sum|total|total of all|sum of|sum of all) (.+?)(?:$|ordered|sort|limit|where)",
+    "average": r"(?:mean|average|avg|mean of|avg of|average of) (.+?)(?:$|limit|where|ordered|sort)",
+    "min": r"(?:minimum|min|min of|smallest|minimum of|lowest|lowest of) (.+?)(?:$|limit|sort|ordered|where)",
+    "max": r"(?:maximum|max|max of|largest|maximum of|biggest|highest) (.+?)(?:$|where|limit|ordered|sort)",
+    
+    "count": r"(?:number|count) (.+?)(?:$|limit|sort|where|ordered)",
+    "Select": r"(?:Find|Select|List|Give|Show|Provide) (.+?)(?:$|limit|ordered|sort|where)",
+    "order_asc": r"(?:first|top) (.+?)(?:by|ordered by|based on) (.+?)(?:$|where|sort|ordered|limit)",
+    "order_desc": r"(?:last|bottom) (.+?)(?:by|ordered by|based on) (.+?)(?:$|limit|sort|ordered|where)"
+}
+
+
+FILTER_PATTERN = re.compile(r"(?:where|when|whose|with|having) (.+?)(?:$|limit|limited|limit to|sort|sorted|arranged|ordered|order)", re.IGNORECASE)
+
+# Natural-language comparison phrases and their SQL operators (order matters)
+COMPARISON_PATTERNS = {
+    r"(?:is greater than or equal to|greater than or equal to)": ">=",
+    r"(?:is lesser than or equal to|is less than or equal to|lesser than or equal to|less than or equal to)": "<=",
+    r"(?:is greater than|is great than|greater than|great than|more than|is above|above)": ">",
+    r"(?:is lesser than|is less than|lesser than|less than|is below|below)": "<",
+    r"(?:is equal to|equal to)": "=",
+    r"(?:is not equal to|not equal to)": "!=",
+    r"\bis\b": "="
+}
+
+AGGREGATE_FUNCTIONS_MAP = {
+    "Avg": ["average", "avg", "mean"],
+    "Sum": ["sum", "total"],
+    "Min": ["min", "minimum", "lowest", "smallest"],
+    "Max": ["max", "maximum", "biggest", "largest"],
+}
+
+SORT_LIMIT_PATTERNS = {
+    'sort': r"(?:arranged|sort|sorted|ordered by|order by|arrange) (.+?)(?:$|limit|limited|limit to|skip|offset)",
+    'limit': r"(?:limit|limited to|limit to) (.+?)(?:$|arranged|sort|sorted|ordered by|order by|arrange|skip|offset)",
+    'offset': r"(?:skip|offset) (.+?)(?:$|arranged|sort|sorted|ordered by|order by|arrange|limit|limited to|limit)",
+}
+
+
+def _trigger_words(pattern_regex):
+    # First word of every alternative in the leading (?:...) group
+    alternatives = re.match(r"\(\?:([^)]*)\)", pattern_regex).group(1).split("|")
+    return {alternative.split()[0].lower() for alternative in alternatives}
+
+
+class _CompiledPatterns:
+    """
+    All schema-independent regexes, compiled once at import.
+
+    selecting() patterns are classified in one scan: a single overlapping lookahead
+    finds every trigger word in the query, and only patterns whose trigger words
+    occur are tried, still in SELECT_PATTERNS priority order.
+    """
+
+    def __init__(self):
+        self.select = [(name, re.compile(regex, re.IGNORECASE)) for name, regex in SELECT_PATTERNS.items()]
+
+        words = {name: _trigger_words(regex) for name, regex in SELECT_PATTERNS.items()}
+        all_words = set().union(*words.values())
+        # Keep only words with no shorter trigger word as prefix ("minimum" -> "min")
+        roots = {word for word in all_words if not any(other != word and word.startswith(other) for other in all_words)}
+        self.root_patterns = {
+            root: {name for name, pattern_words in words.items() if any(word.startswith(root) for word in pattern_words)}
+            for root in roots
+        }
+        ordered_roots = sorted(roots, key=len, reverse=True)
+        self.trigger = re.compile("(?=(" + "|".join(map(re.escape, ordered_roots)) + "))", re.IGNORECASE)
+
+        self.comparisons = [(re.compile(regex, re.IGNORECASE), operator) for regex, operator in COMPARISON_PATTERNS.items()]
+        self.aggregate_keywords = [
+            (word, re.compile(rf"\b{word}\b", re.IGNORECASE))
+            for func_words in AGGREGATE_FUNCTIONS_MAP.values() for word in func_words
+        ]
+        self.aggregate_function_of = {
+            word: func for func, func_words in AGGREGATE_FUNCTIONS_MAP.items() for word in func_words
+        }
+        self.quote_value = re.compile(r"([=<>!]=?)\s*([^\d\s]+)")
+        self.quote_date = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+        self.sort_limit = {name: re.compile(regex, re.IGNORECASE) for name, regex in SORT_LIMIT_PATTERNS.items()}
+        self.number = re.compile(r'\d+')
+
+    def classify(self, query):
+        """Return (pattern_name, groups) of the first SELECT_PATTERNS entry that matches."""
+        candidates = set()
+        for match in self.trigger.finditer(query):
+            candidates |= self.root_patterns[match.group(1).lower()]
+        for name, regex in self.select:
+            if name in candidates:
+                match = regex.search(query)
+                if match:
+                    return name, match.groups()
+        return None, None
+
+
+PATTERNS = _CompiledPatterns()
+
+
+class SchemaPatterns:
+    """Column lookups and the filtering split regex for one table schema."""
+
+    def __init__(self, column_names, attributes, measures):
+        self.column_names = list(column_names)
+        self.column_set = frozenset(column_names)
+        self.lookups = {
+            "column_names": self._lookup(column_names),
+            "attributes": self._lookup(attributes),
+            "measures": self._lookup(measures),
+        }
+        self.column_split = re.compile('|'.join(
+            f'({re.escape(" " + col)})' for col in list(column_names) + ["and", "but"]
+        ))
+        self.sort_columns = [(col, col.replace('_', ' ')) for col in column_names]
+
+    @staticmethod
+    def _lookup(items):
+        return [(item, item.lower(), item.lower().replace('_', ' ')) for item in items]
+
+    def match(self, kind, text):
+        """Comma-separated items of `kind` mentioned in text (by name or with spaces)."""
+        text_lower = text.lower()
+        return ', '.join(item for item, item_lower, item_spaced in self.lookups[kind]
+                         if item_lower in text_lower or item_spaced in text_lower)
+
+
+@lru_cache(maxsize=256)
+def _schema_patterns(column_names, attributes, measures):
+    return SchemaPatterns(column_names, attributes, measures)
+
+
+def schema_patterns(column_names, attributes=(), measures=()):
+    """Compiled per-schema patterns, built once per distinct table schema."""
+    return _schema_patterns(tuple(column_names), tuple(attributes), tuple(measures))
+
+
+# Translation throughput counters for input_to_sql()
+_translation_stats = {"translations": 0, "failures": 0, "seconds": 0.0}
+_translation_stats_lock = threading.Lock()
+
+
+def translation_stats():
+    with _translation_stats_lock:
+        stats = dict(_translation_stats)
+    seconds = stats["seconds"]
+    stats["avg_latency_ms"] = seconds / stats["translations"] * 1000 if stats["translations"] else 0.0
+    stats["translations_per_second"] = stats["translations"] / seconds if seconds else 0.0
+    return stats
+
 
 def create_sample_query(query_type, table_name, metadata_store):
     
-    #column_names, attributes, measures, unique_elements
+    #column_names, attributes, measures, column_profiles
 
     if table_name not in metadata_store:
         return None, f"Table '{table_name}' not found in metadata store."
@@ -14,7 +174,8 @@ def create_sample_query(query_type, table_name, metadata_store):
     attributes = metadata["attributes"]
     measures = metadata["measures"]
     column_names = metadata["column_names"]
-    unique_elements = metadata["unique_elements"]
+    # Candidate values come from the bounded column sketches (top-k + sample)
+    unique_elements = {column: profile_values(profile) for column, profile in metadata["column_profiles"].items()}
 
     agg_functions = ['Sum', 'Avg', 'Min', 'Max']
     comparison_operators = ['>', '<', '>=', '<=', '=', '!=']
@@ -94,47 +255,16 @@ def selecting(query, table_name, metadata_store):
     measures = metadata["measures"]
     column_names = metadata["column_names"]
 
-    patterns = {
-        "total_group_by": r"(?:sum|total|sum of|total of all|sum of all) (.+?)(?:by|grouped by|group by|for each|per|for every|of each) (.+?)(?:$|where|limit|ordered|sort)",
-        "average_group_by": r"(?:mean|avg|average|average of|mean of|avg of) (.+?)(?:by|group by|grouped by|for every|of each|for each|per) (.+?)(?:$|ordered|where|sort|limit)",
-        "min_group_by": r"(?:smallest|min|lowest|min of|minimum|minimum of) (.+?)(?:by|for each|group by|of each|for every|grouped by|per) (.+?)(?:$|ordered|where|limit|sort)",
-        "max_group_by": r"(?:maximum|max|largest|max of|maximum of|biggest) (.+?)(?:grouped by|by|for every|group by|of each|for each|per) (.+?)(?:$|sort|limit|ordered|where)",
-        "count_group_by": r"(?:number|count) (.+?)(?:group by|grouped by|by|for each|for every|of each|per) (.+?)(?:$|ordered|sort|where|limit)",
-        
-        "total": r"(?:sum|total|total of all|sum of|sum of all) (.+?)(?:$|ordered|sort|limit|where)",
-        "average": r"(?:mean|average|avg|mean of|avg of|average of) (.+?)(?:$|limit|where|ordered|sort)",
-        "min": r"(?:minimum|min|min of|smallest|minimum of|lowest|lowest of) (.+?)(?:$|limit|sort|ordered|where)",
-        "max": r"(?:maximum|max|max of|largest|maximum of|biggest|highest) (.+?)(?:$|where|limit|ordered|sort)",
-        
-        "count": r"(?:number|count) (.+?)(?:$|limit|sort|where|ordered)",
-        "Select": r"(?:Find|Select|List|Give|Show|Provide) (.+?)(?:$|limit|ordered|sort|where)",
-        "order_asc": r"(?:first|top) (.+?)(?:by|ordered by|based on) (.+?)(?:$|where|sort|ordered|limit)",
-        "order_desc": r"(?:last|bottom) (.+?)(?:by|ordered by|based on) (.+?)(?:$|limit|sort|ordered|where)"
-    }
 
 
-    # Detect patterns
-    detected_pattern = None
-    detected_groups = None
-    for pattern_name, pattern_regex in patterns.items():
-        match = re.search(pattern_regex, query, re.IGNORECASE)
-        if match:
-            detected_pattern = pattern_name
-            detected_groups = match.groups()
-            break
+    # Detect patterns (one trigger-word scan, then only the candidate regexes)
+    detected_pattern, detected_groups = PATTERNS.classify(query)
 
     if not detected_pattern:
         return None, "No valid pattern detected."
 
     # Helper function for matching columns and measures
-    def match_columns_or_measures(target_list, text):
-        matched = []
-        for item in target_list:
-            item_lower = item.lower()
-            text_lower = text.lower()
-            if item_lower in text_lower or item_lower.replace('_', ' ') in text_lower:
-                matched.append(item)
-        return ', '.join(matched)
+    schema = schema_patterns(column_names, attributes, measures)
 
     # SQL generation logic
     if detected_pattern.endswith("_group_by"):
@@ -144,8 +274,8 @@ def selecting(query, table_name, metadata_store):
         measure_function = detected_pattern.split("_")[0]
         function_map = {"total": "SUM", "average": "AVG", "min": "MIN", "max": "MAX", "count": "COUNT"}
 
-        selected_measures = match_columns_or_measures(measures, metric)
-        group_by_columns = match_columns_or_measures(attributes, group_by)
+        selected_measures = schema.match("measures", metric)
+        group_by_columns = schema.match("attributes", group_by)
 
         if selected_measures and group_by_columns:
             sql_query = f"SELECT {group_by_columns}, {function_map[measure_function]}({selected_measures}) FROM {table_name} GROUP BY {group_by_columns}"
@@ -164,7 +294,7 @@ def selecting(query, table_name, metadata_store):
         measure_function = detected_pattern
         function_map = {"total": "SUM", "average": "AVG", "min": "MIN", "max": "MAX", "count": "COUNT"}
 
-        selected_measures = match_columns_or_measures(measures if measure_function != "count" else column_names, metric)
+        selected_measures = schema.match("measures" if measure_function != "count" else "column_names", metric)
         if selected_measures:
             sql_query = f"SELECT {function_map[measure_function]}({selected_measures}) FROM {table_name}"
         else:
@@ -177,7 +307,7 @@ def selecting(query, table_name, metadata_store):
 
     if detected_pattern == "Select":
         columns = detected_groups[0]
-        selected_columns = match_columns_or_measures(column_names, columns)
+        selected_columns = schema.match("column_names", columns)
         if selected_columns:
             sql_query = f"SELECT {selected_columns} FROM {table_name}"
         else:
@@ -187,11 +317,12 @@ def selecting(query, table_name, metadata_store):
 
     if detected_pattern in ["order_desc", "order_asc"]:
         columns, order_by = detected_groups
-        limit = re.findall(r'\d+', columns)[0] if re.search(r'\d+', columns) else "1"
+        numbers = PATTERNS.number.findall(columns)
+        limit = numbers[0] if numbers else "1"
         order_direction = "DESC" if detected_pattern == "order_desc" else "ASC"
 
-        selected_columns = match_columns_or_measures(column_names, columns)
-        order_by_column = match_columns_or_measures(column_names, order_by)
+        selected_columns = schema.match("column_names", columns)
+        order_by_column = schema.match("column_names", order_by)
 
         if selected_columns and order_by_column:
             sql_query = f"SELECT {selected_columns} FROM {table_name} ORDER BY {order_by_column} {order_direction} LIMIT {limit}"
@@ -202,17 +333,15 @@ def selecting(query, table_name, metadata_store):
 
 def filtering(query, table_columns):
 
+    schema = schema_patterns(table_columns)
+
     # Extract filtering conditions from the query
-    filter_pattern = r"(?:where|when|whose|with|having) (.+?)(?:$|limit|limited|limit to|sort|sorted|arranged|ordered|order)"
-    extracted_filter_text = re.search(filter_pattern, query, re.IGNORECASE)
+    extracted_filter_text = FILTER_PATTERN.search(query)
     extracted_filter_text = extracted_filter_text.groups()[0].lower() if extracted_filter_text else ""
 
-    # Add leading space for easier parsing and prepare the regex pattern for column matching
+    # Add leading space for easier parsing and split on the schema's cached column regex
     formatted_text = f' {extracted_filter_text}'
-    column_split_pattern = '|'.join(
-        f'({re.escape(" " + col)})' for col in table_columns + ["and", "but"]
-    )
-    parsed_parts = [segment.strip() for segment in re.split(column_split_pattern, formatted_text) if segment]
+    parsed_parts = [segment.strip() for segment in schema.column_split.split(formatted_text) if segment]
 
     # Merge segments for 'between' conditions
     idx = 0
@@ -223,25 +352,6 @@ def filtering(query, table_columns):
         else:
             idx += 1
 
-    # Define comparison patterns and aggregate function mappings
-    comparison_patterns = {
-        r"(?:is greater than or equal to|greater than or equal to)": ">=",
-        r"(?:is lesser than or equal to|is less than or equal to|lesser than or equal to|less than or equal to)": "<=",
-        r"(?:is greater than|is great than|greater than|great than|more than|is above|above)": ">",
-        r"(?:is lesser than|is less than|lesser than|less than|is below|below)": "<",
-        r"(?:is equal to|equal to)": "=",
-        r"(?:is not equal to|not equal to)": "!=",
-        r"\bis\b": "="
-    }
-
-    aggregate_functions_map = {
-        "Avg": ["average", "avg", "mean"],
-        "Sum": ["sum", "total"],
-        "Min": ["min", "minimum", "lowest", "smallest"],
-        "Max": ["max", "maximum", "biggest", "largest"],
-    }
-    aggregate_keywords = [word for func_words in aggregate_functions_map.values() for word in func_words]
-
     # Initialize lists for filtering conditions
     condition_where = []
     condition_having = []
@@ -256,16 +366,16 @@ def filtering(query, table_columns):
         # Identify aggregate conditions
         if not is_aggregate:
             matched_aggregate = next(
-                (word for word in aggregate_keywords if re.search(rf"\b{word}\b", part, re.IGNORECASE)), 
+                (word for word, word_regex in PATTERNS.aggregate_keywords if word_regex.search(part)),
                 None
             )
             if matched_aggregate:
                 is_aggregate = True
-                aggregate_function = next(func for func, words in aggregate_functions_map.items() if matched_aggregate in words)
+                aggregate_function = PATTERNS.aggregate_function_of[matched_aggregate]
                 continue
 
         # Match column names
-        if part.lower() in table_columns:
+        if part.lower() in schema.column_set:
             active_column = part.lower()
             if is_aggregate:
                 active_column = f"{aggregate_function}({active_column})"
@@ -277,18 +387,18 @@ def filtering(query, table_columns):
             condition_expr = part
 
             # Replace natural language expressions with SQL-compatible operators
-            for regex, operator in comparison_patterns.items():
-                condition_expr = re.sub(regex, operator, condition_expr, flags=re.IGNORECASE)
+            for regex, operator in PATTERNS.comparisons:
+                condition_expr = regex.sub(operator, condition_expr)
 
             # Add quotes to non-numeric values and date formats
-            condition_expr = re.sub(r"([=<>!]=?)\s*([^\d\s]+)", r"\1 '\2'", condition_expr)
-            condition_expr = re.sub(r"\b(\d{4})-(\d{2})-(\d{2})\b", r"'\g<0>'", condition_expr)
+            condition_expr = PATTERNS.quote_value.sub(r"\1 '\2'", condition_expr)
+            condition_expr = PATTERNS.quote_date.sub(r"'\g<0>'", condition_expr)
 
             # Combine column and condition expression
             full_condition = f"{active_column} {condition_expr}"
 
             # Determine whether the condition goes to WHERE or HAVING
-            if active_column in table_columns:
+            if active_column in schema.column_set:
                 condition_where.append(full_condition)
             else:
                 condition_having.append(full_condition)
@@ -297,17 +407,12 @@ def filtering(query, table_columns):
 
 
 def sortlimit(query, column_names):
-    # Define patterns
-    pattern = {
-        'sort': r"(?:arranged|sort|sorted|ordered by|order by|arrange) (.+?)(?:$|limit|limited|limit to|skip|offset)",
-        'limit': r"(?:limit|limited to|limit to) (.+?)(?:$|arranged|sort|sorted|ordered by|order by|arrange|skip|offset)",
-        'offset': r"(?:skip|offset) (.+?)(?:$|arranged|sort|sorted|ordered by|order by|arrange|limit|limited to|limit)",
-    }
-    
-    # Detect parts from the query
+    schema = schema_patterns(column_names)
+
+    # Detect parts from the query (patterns are compiled once in PATTERNS)
     pattern_found = {}
-    for pattern_name, pattern in pattern.items():
-        match = re.search(pattern, query, re.IGNORECASE)
+    for pattern_name, pattern in PATTERNS.sort_limit.items():
+        match = pattern.search(query)
         if match:
             pattern_found[pattern_name] = match.groups()
 
@@ -320,8 +425,9 @@ def sortlimit(query, column_names):
     for query_part, text in pattern_found.items():
         if query_part == 'sort':
             order_by_columns = []
-            for col in column_names:
-                if col in text[0].lower() or col.replace('_', ' ') in text[0].lower():
+            sort_text = text[0].lower()
+            for col, col_spaced in schema.sort_columns:
+                if col in sort_text or col_spaced in sort_text:
                     order_by_columns.append(col)
             if 'descending' in text[0].lower():
                 order_by_type = 'DESC'
@@ -331,12 +437,12 @@ def sortlimit(query, column_names):
             order_part = ' order by ' + ','.join(order_by_columns) + ' ' + order_by_type
 
         if query_part == 'limit':
-            numbers = re.findall(r'\d+', text[0])
+            numbers = PATTERNS.number.findall(text[0])
             if numbers:
                 limit_part = ' limit ' + numbers[0]
 
         if query_part == 'offset':
-            numbers = re.findall(r'\d+', text[0])
+            numbers = PATTERNS.number.findall(text[0])
             if numbers:
                 offset_part = ' offset ' + numbers[0]
 
@@ -346,6 +452,19 @@ def input_to_sql(user_query, table_name, metadata_store):
     """
     Translates a natural language query into an SQL query using the table's metadata.
     """
+    started = time.perf_counter()
+    try:
+        final_query = _input_to_sql(user_query, table_name, metadata_store)
+    except Exception:
+        with _translation_stats_lock:
+            _translation_stats["failures"] += 1
+        raise
+    with _translation_stats_lock:
+        _translation_stats["translations"] += 1
+        _translation_stats["seconds"] += time.perf_counter() - started
+    return final_query
+
+def _input_to_sql(user_query, table_name, metadata_store):
     # Retrieve metadata for the given table
     if table_name not in metadata_store:
         raise ValueError(f"Table '{table_name}' not found in metadata store.")
@@ -0,0 +1,361 @@
+import hashlib
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from sql_results import run_query
+
+
+# Queries a candidate must serve before auto-indexing creates it (CHATDB_AUTO_INDEX=1)
+AUTO_INDEX = os.environ.get("CHATDB_AUTO_INDEX", "0") == "1"
+AUTO_INDEX_MIN_QUERIES = int(os.environ.get("CHATDB_AUTO_INDEX_MIN_QUERIES", "20"))
+# Tables smaller than this are scanned faster than an index lookup pays off
+MIN_TABLE_ROWS = int(os.environ.get("CHATDB_INDEX_MIN_ROWS", "1000"))
+MAX_INDEX_COLUMNS = 3
+INDEX_PREFIX = "ix_chatdb_"
+
+_CLAUSE_RE = re.compile(
+    r"\bFROM\s+(?P<table>\w+)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+GROUP BY\s+(?P<group>[\w,\s]+?))?"
+    r"(?:\s+HAVING\s+.+?)?"
+    r"(?:\s+ORDER BY\s+(?P<order>[\w,\s]+?)(?:\s+(?P<direction>ASC|DESC))?)?"
+    r"(?:\s+LIMIT\s+\d+)?(?:\s+OFFSET\s+\d+)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_TERM_RE = re.compile(r"^\s*\(?\s*(?P<column>\w+)\s*(?P<op>=|!=|<>|>=|<=|>|<|between\b|like\b)", re.IGNORECASE)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_EXPLAIN_FULL_SCANS = {"ALL", "index"}
+
+
+class QueryShape:
+    """Index-relevant columns of one translated SELECT."""
+
+    __slots__ = ("table", "equality", "ranges", "group", "order", "descending")
+
+    def __init__(self, table, equality, ranges, group, order, descending):
+        self.table = table
+        self.equality = equality
+        self.ranges = ranges
+        self.group = group
+        self.order = order
+        self.descending = descending
+
+    def key(self):
+        return (tuple(sorted(self.equality)), tuple(self.ranges), tuple(self.group), tuple(self.order))
+
+    def to_dict(self):
+        return {
+            "equality": list(self.equality),
+            "range": list(self.ranges),
+            "group_by": list(self.group),
+            "order_by": list(self.order),
+        }
+
+
+def _split_where(where):
+    """Split a WHERE clause on AND, keeping `x BETWEEN a AND b` together."""
+    terms = []
+    pending_between = False
+    for part in _AND_RE.split(where):
+        if pending_between and terms:
+            terms[-1] += f" AND {part}"
+            pending_between = False
+            continue
+        terms.append(part)
+        pending_between = re.search(r"\bbetween\b", part, re.IGNORECASE) is not None
+    return terms
+
+
+@lru_cache(maxsize=4096)
+def parse_query_shape(query, columns):
+    """
+    Columns a translated query filters, groups and sorts on, or None when the
+    query is not a single-table SELECT. `columns` is the table's column tuple;
+    anything else (aggregates, literals) is ignored.
+    """
+    match = _CLAUSE_RE.search(" ".join(query.split()))
+    if not match:
+        return None
+    known = set(columns)
+
+    equality, ranges = [], []
+    for term in _split_where(match.group("where") or ""):
+        term_match = _TERM_RE.match(term)
+        if not term_match or term_match.group("column").lower() not in known:
+            continue
+        column = term_match.group("column").lower()
+        op = term_match.group("op").lower()
+        if op == "=" and column not in equality:
+            equality.append(column)
+        elif op in (">", "<", ">=", "<=", "between") and column not in ranges:
+            ranges.append(column)
+        elif op == "like" and "'%" not in term and column not in ranges:
+            # Only prefix patterns can seek an index
+            ranges.append(column)
+
+    def column_list(text):
+        return [column.strip().lower() for column in (text or "").split(",") if column.strip().lower() in known]
+
+    return QueryShape(
+        match.group("table").lower(),
+        equality,
+        ranges,
+        column_list(match.group("group")),
+        column_list(match.group("order")),
+        (match.group("direction") or "").upper() == "DESC",
+    )
+
+
+def index_name(table, columns):
+    name = f"{INDEX_PREFIX}{'_'.join(columns)}"
+    if len(name) > 64:
+        # MySQL identifiers are limited to 64 characters
+        digest = hashlib.sha1(f"{table}.{','.join(columns)}".encode()).hexdigest()[:10]
+        name = f"{INDEX_PREFIX}{digest}"
+    return name
+
+
+def candidate_columns(shape, profiles, column_types=None):
+    """
+    Index column order for one query shape: equality columns (most selective
+    first), then the GROUP BY or ORDER BY columns, then one range column.
+    TEXT columns are left out since they can only be indexed by prefix.
+    """
+    def distinct(column):
+        return (profiles.get(column) or {}).get("distinct_estimate", 0)
+
+    def indexable(column):
+        return (column_types or {}).get(column) != "TEXT"
+
+    columns = sorted(filter(indexable, shape.equality), key=distinct, reverse=True)
+    tail = [column for column in shape.group or shape.order if indexable(column)]
+    for column in tail:
+        if column not in columns:
+            columns.append(column)
+    ranges = [column for column in shape.ranges if indexable(column)]
+    if ranges and ranges[0] not in columns:
+        columns.append(ranges[0])
+    columns = columns[:MAX_INDEX_COLUMNS]
+
+    # A lone equality column with a single distinct value filters nothing
+    if columns and columns == shape.equality[:1] and not tail and not ranges and distinct(columns[0]) < 2:
+        return []
+    return columns
+
+
+def _serves(index_columns, shape_columns):
+    return len(shape_columns) <= len(index_columns) and tuple(index_columns[:len(shape_columns)]) == tuple(shape_columns)
+
+
+class IndexAdvisor:
+    """
+    Workload-driven index recommendations for uploaded MySQL tables.
+
+    record() keeps, per table, how often each column is used for equality,
+    range, grouping and ordering, plus a count and sample query for each
+    distinct query shape. candidates() turns the shapes into secondary and
+    composite indexes and folds indexes that are a prefix of a wider one into it.
+    explain() and apply() check candidates against the live table with EXPLAIN.
+    """
+
+    def __init__(self, auto_index=AUTO_INDEX, auto_min_queries=AUTO_INDEX_MIN_QUERIES):
+        self.auto_index = auto_index
+        self.auto_min_queries = auto_min_queries
+        self._lock = threading.Lock()
+        self._usage = defaultdict(lambda: defaultdict(Counter))  # table -> column -> role -> count
+        self._shapes = defaultdict(dict)  # table -> shape key -> [count, shape, sample query]
+        self._queries = Counter()
+        self._applied = defaultdict(dict)  # table -> index name -> result of apply()
+        self._applying = set()
+
+    def record(self, table, query, column_names):
+        """Account for one executed query. Returns its shape (None if not understood)."""
+        shape = parse_query_shape(query, tuple(column_names))
+        if shape is None or shape.table != table:
+            return None
+        with self._lock:
+            self._queries[table] += 1
+            usage = self._usage[table]
+            for role, columns in (("equality", shape.equality), ("range", shape.ranges),
+                                  ("group_by", shape.group), ("order_by", shape.order)):
+                for column in columns:
+                    usage[column][role] += 1
+            entry = self._shapes[table].setdefault(shape.key(), [0, shape, query])
+            entry[0] += 1
+            entry[2] = query
+        return shape
+
+    def reset(self, table, column_names=None):
+        """
+        Forget indexes created on a table that was just re-uploaded (DROP TABLE
+        removed them). Workload history is kept for columns that still exist.
+        """
+        with self._lock:
+            self._applied.pop(table, None)
+            if column_names is None:
+                self._usage.pop(table, None)
+                self._shapes.pop(table, None)
+                self._queries.pop(table, None)
+                return
+            known = set(column_names)
+            usage = self._usage.get(table, {})
+            for column in [column for column in usage if column not in known]:
+                del usage[column]
+            shapes = self._shapes.get(table, {})
+            for key in [key for key in shapes if not {column for part in key for column in part} <= known]:
+                del shapes[key]
+
+    def candidates(self, table, metadata, existing=()):
+        """
+        Recommended indexes for a table, widest coverage first.
+
+        `existing` lists column tuples of indexes already on the table; candidates
+        they serve are reported with "exists": True.
+        """
+        profiles = metadata.get("column_profiles", {})
+        column_types = metadata.get("column_types", {})
+        with self._lock:
+            shapes = [(count, shape, sample) for count, shape, sample in self._shapes.get(table, {}).values()]
+            total = self._queries.get(table, 0)
+
+        by_columns = {}
+        for count, shape, sample in shapes:
+            columns = tuple(candidate_columns(shape, profiles, column_types))
+            if not columns:
+                continue
+            entry = by_columns.setdefault(columns, {"queries": 0, "shapes": [], "sample_query": sample, "top": 0})
+            entry["queries"] += count
+            entry["shapes"].append(shape.to_dict())
+            if count > entry["top"]:
+                entry["top"], entry["sample_query"] = count, sample
+
+        # An index on (a) is redundant next to (a, b): fold its queries into the wider one
+        for columns in sorted(by_columns, key=len):
+            wider = [other for other in by_columns if other != columns and _serves(other, columns)]
+            if wider:
+                target = max(wider, key=lambda other: by_columns[other]["queries"])
+                by_columns[target]["queries"] += by_columns[columns]["queries"]
+                by_columns[target]["shapes"].extend(by_columns[columns]["shapes"])
+                del by_columns[columns]
+
+        rows = max((profile.get("count", 0) for profile in profiles.values()), default=0)
+        existing = [tuple(columns) for columns in existing]
+        candidates = []
+        for columns, entry in by_columns.items():
+            candidates.append({
+                "table": table,
+                "name": index_name(table, columns),
+                "columns": list(columns),
+                "queries_served": entry["queries"],
+                "workload_share": entry["queries"] / total if total else 0.0,
+                "shapes": entry["shapes"],
+                "sample_query": entry["sample_query"],
+                "exists": any(_serves(index, columns) for index in existing),
+                "small_table": rows < MIN_TABLE_ROWS,
+            })
+        candidates.sort(key=lambda candidate: candidate["queries_served"], reverse=True)
+        return candidates
+
+    def workload(self, table):
+        with self._lock:
+            return {
+                "queries": self._queries.get(table, 0),
+                "columns": {column: dict(roles) for column, roles in self._usage.get(table, {}).items()},
+                "applied": list(self._applied.get(table, {}).values()),
+            }
+
+    def due(self, table, metadata, existing=()):
+        """Candidates that auto-indexing should create now."""
+        if not self.auto_index:
+            return []
+        with self._lock:
+            if table in self._applying:
+                return []
+            applied = set(self._applied.get(table, {}))
+        return [
+            candidate for candidate in self.candidates(table, metadata, existing)
+            if candidate["queries_served"] >= self.auto_min_queries
+            and not candidate["exists"] and not candidate["small_table"] and candidate["name"] not in applied
+        ]
+
+    def apply_many(self, pool, table, candidates):
+        """Apply candidates one by one, skipping those an existing index already serves."""
+        with self._lock:
+            if table in self._applying:
+                return [{"name": candidate["name"], "status": "busy"} for candidate in candidates]
+            self._applying.add(table)
+        try:
+            existing = existing_indexes(pool, table)
+            results = []
+            for candidate in candidates:
+                if any(_serves(index, candidate["columns"]) for index in existing):
+                    results.append({"name": candidate["name"], "columns": candidate["columns"], "status": "exists"})
+                    continue
+                result = self.apply(pool, candidate)
+                if result["status"] == "created":
+                    existing.append(tuple(candidate["columns"]))
+                results.append(result)
+            return results
+        finally:
+            with self._lock:
+                self._applying.discard(table)
+
+    def explain(self, pool, candidate):
+        """EXPLAIN the candidate's sample query on the current table."""
+        plan = run_query(pool, f"EXPLAIN {candidate['sample_query']}")
+        row = next((row for row in plan if (row.get("table") or "").lower() == candidate["table"]), plan[0] if plan else {})
+        extra = row.get("Extra") or ""
+        return {
+            "access_type": row.get("type"),
+            "key": row.get("key"),
+            "possible_keys": row.get("possible_keys"),
+            "rows_examined_estimate": row.get("rows"),
+            "extra": extra,
+            "full_scan": row.get("type") in _EXPLAIN_FULL_SCANS,
+            "filesort": "filesort" in extra,
+            "temporary": "temporary" in extra,
+        }
+
+    def apply(self, pool, candidate):
+        """
+        Create the candidate index online, then keep it only if EXPLAIN shows the
+        optimizer can use it for the sample query.
+        """
+        before = self.explain(pool, candidate)
+        columns = ", ".join(candidate["columns"])
+        # InnoDB builds secondary indexes in place without blocking reads or writes
+        execute_ddl(pool, f"ALTER TABLE {candidate['table']} ADD INDEX {candidate['name']} ({columns}), "
+                          f"ALGORITHM=INPLACE, LOCK=NONE")
+        after = self.explain(pool, candidate)
+        possible = (after.get("possible_keys") or "").split(",")
+        if after.get("key") == candidate["name"] or candidate["name"] in possible:
+            status = "created"
+        else:
+            execute_ddl(pool, f"ALTER TABLE {candidate['table']} DROP INDEX {candidate['name']}")
+            status = "dropped_unused"
+        result = {"name": candidate["name"], "columns": candidate["columns"], "status": status,
+                  "before": before, "after": after}
+        if status == "created":
+            with self._lock:
+                self._applied[candidate["table"]][candidate["name"]] = result
+        return result
+
+
+def execute_ddl(pool, statement):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(statement)
+        connection.commit()
+        cursor.close()
+
+
+def existing_indexes(pool, table):
+    """Column tuples of the secondary indexes currently on a table."""
+    indexes = defaultdict(list)
+    for row in run_query(pool, f"SHOW INDEX FROM {table}"):
+        if row.get("Key_name") != "PRIMARY":
+            indexes[row["Key_name"]].append((row["Seq_in_index"], row["Column_name"].lower()))
+    return [tuple(column for _, column in sorted(columns)) for columns in indexes.values()]
@@ -0,0 +1,275 @@
+import os
+import time
+
+from incremental import KEY_INDEX_PREFIX, KeyTracker
+from jobs import NULL_PROGRESS
+from profile_engine import ProfilingEngine
+from profiling import ingest_stats, timed
+from sql_results import ROW_ID_COLUMN
+from upload_sources import open_upload, upload_name
+
+
+# Streaming ingest defaults (rows)
+DEFAULT_CHUNK_SIZE = int(os.environ.get("CHATDB_INGEST_CHUNK_SIZE", "50000"))
+DEFAULT_BATCH_SIZE = int(os.environ.get("CHATDB_INGEST_BATCH_SIZE", "5000"))
+DEFAULT_COMMIT_EVERY = int(os.environ.get("CHATDB_INGEST_COMMIT_EVERY", "50000"))
+
+
+def build_create_table_query(table_name, columns, measures, dates, column_types=None):
+    """
+    CREATE TABLE statement for an upload. `column_types` (from TypeInference)
+    gives each column its exact type; without it measures are FLOAT, dates
+    DATETIME and everything else VARCHAR(255).
+    """
+    # Invisible auto-increment key: not returned by SELECT *, used for keyset pagination
+    create_table_query = f"CREATE TABLE {table_name} ({ROW_ID_COLUMN} BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY INVISIBLE, "
+    for col in columns:
+        if column_types and col in column_types:
+            create_table_query += f"{col} {column_types[col]}, "
+        elif col in dates:
+            create_table_query += f"{col} DATETIME, "
+        elif col in measures:
+            create_table_query += f"{col} FLOAT, "
+        else:
+            create_table_query += f"{col} VARCHAR(255), "
+    return create_table_query.rstrip(', ') + ")"
+
+
+def dataframe_rows(df):
+    """Yield row tuples with NaN/NaT replaced by None so MySQL stores NULL."""
+    df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+
+def stream_csv_to_mysql(csv_path, pool, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                        commit_every=DEFAULT_COMMIT_EVERY, progress=NULL_PROGRESS):
+    """
+    Load a CSV, Parquet or Arrow IPC file into MySQL without holding it in memory.
+
+    The file is read `chunk_size` rows at a time, rows are sent with `executemany`
+    in batches of `batch_size` and the transaction is committed every `commit_every`
+    rows. Column types are inferred from the first chunk (or declared by a Parquet/
+    Arrow schema) and widened with ALTER TABLE when a later chunk does not fit;
+    metadata is accumulated chunk by chunk.
+    `progress` (a jobs.Job) is told the phase and loaded rows, and can cancel
+    the load between batches. Returns (metadata, error) like process_and_load_csv().
+    """
+    try:
+        table_name = upload_name(csv_path)
+        started = time.perf_counter()
+
+        rows_loaded = 0
+        rows_since_commit = 0
+        chunk_count = 0
+        column_names = None
+        engine = None
+        timings = {"read": 0.0, "metadata": 0.0}
+
+        with open_upload(csv_path) as source, pool.connection() as connection:
+            cursor = connection.cursor()
+            insert_query = None
+
+            progress.phase("reading")
+            for chunk in timed(source.chunks(chunk_size), timings, "read"):
+                progress.check()
+                progress.phase("profiling")
+                tick = time.perf_counter()
+                if column_names is None:
+                    # First chunk decides the schema
+                    column_names = list(chunk.columns)
+                    engine = source.profiling_engine(column_names)
+                    chunk, _ = engine.update(chunk)
+                    engine.types.freeze()
+                    attributes, measures, dates = engine.classify()
+
+                    cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+                    cursor.execute(build_create_table_query(table_name, column_names, measures, dates, engine.types.sql_types()))
+                    insert_query = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({', '.join(['%s'] * len(column_names))})"
+                else:
+                    # Widen columns this chunk does not fit (DDL commits the open transaction);
+                    # bounded sketches are updated chunk by chunk
+                    chunk, changed = engine.update(chunk)
+                    for column, column_type in changed.items():
+                        cursor.execute(f"ALTER TABLE {table_name} MODIFY COLUMN {column} {column_type}")
+                        rows_since_commit = 0
+                timings["metadata"] += time.perf_counter() - tick
+
+                progress.phase("inserting")
+                batch = []
+                for row in dataframe_rows(chunk):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        progress.check()
+                        cursor.executemany(insert_query, batch)
+                        rows_since_commit += len(batch)
+                        progress.advance(len(batch))
+                        batch = []
+                        if rows_since_commit >= commit_every:
+                            connection.commit()
+                            rows_since_commit = 0
+                if batch:
+                    cursor.executemany(insert_query, batch)
+                    rows_since_commit += len(batch)
+                    progress.advance(len(batch))
+
+                rows_loaded += len(chunk)
+                chunk_count += 1
+                progress.phase("reading")
+
+            if column_names is None:
+                return None, "The uploaded file is empty."
+
+            connection.commit()
+            cursor.close()
+
+        elapsed = time.perf_counter() - started
+        attributes, measures, dates = engine.classify()
+        return {
+            "table_name": table_name,
+            "column_names": column_names,
+            "column_types": engine.types.sql_types(),
+            "attributes": attributes,
+            "measures": measures,
+            "dates": dates,
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                "stream", rows_loaded, elapsed, timings["read"], timings["metadata"], chunks=chunk_count,
+                **engine.stats(), **source.stats(),
+            ),
+            "ingest_state": engine.to_state(),
+        }, None
+
+    except Exception as e:
+        return None, str(e)
+
+
+# Key columns must compare exactly between pandas and MySQL (no DECIMAL/DOUBLE) and be indexable in full (no TEXT)
+_KEY_KINDS = ("bool", "int", "date", "datetime", "text")
+
+
+def merge_csv_into_mysql(csv_path, pool, metadata, state, write_mode, key, chunk_size=DEFAULT_CHUNK_SIZE,
+                         batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY, progress=NULL_PROGRESS):
+    """
+    Append or upsert a CSV, Parquet or Arrow IPC file into an existing table, keyed on the `key` column.
+
+    "append" inserts only rows whose key is not in the table yet (the first row per
+    key wins); "upsert" also overwrites the columns present in the file for keys
+    that exist (the last row per key wins). A unique index on `key` is added if
+    missing. Type inference and column sketches resume from the `state` saved by
+    the previous upload and only see the new rows, so metadata is merged rather
+    than recomputed; columns are widened with ALTER TABLE when new rows need it.
+    Returns (metadata, error) like stream_csv_to_mysql().
+    """
+    try:
+        table_name = upload_name(csv_path)
+        started = time.perf_counter()
+
+        column_names = metadata["column_names"]
+        engine = ProfilingEngine.from_state(state)
+        if key not in column_names:
+            return None, f"Key column '{key}' is not a column of table '{table_name}'."
+        if engine.types.columns[key].kind not in _KEY_KINDS or engine.types.sql_types()[key] == "TEXT":
+            return None, f"Key column '{key}' must be an integer, date or short text column."
+
+        rows_read = rows_inserted = rows_updated = rows_skipped = 0
+        rows_since_commit = 0
+        chunk_count = 0
+        timings = {"read": 0.0, "metadata": 0.0}
+        keep = "first" if write_mode == "append" else "last"
+
+        with open_upload(csv_path) as source, pool.connection() as connection:
+            cursor = connection.cursor()
+            index_name = KEY_INDEX_PREFIX + key
+            cursor.execute(f"SHOW INDEX FROM {table_name} WHERE Key_name = %s", (index_name,))
+            if not cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {table_name} ADD UNIQUE INDEX {index_name} ({key})")
+
+            def lookup(keys):
+                cursor.execute(
+                    f"SELECT {key} FROM {table_name} WHERE {key} IN ({', '.join(['%s'] * len(keys))})", keys
+                )
+                return {row[0] for row in cursor.fetchall()}
+
+            tracker = KeyTracker(lookup, batch_size)
+
+            progress.phase("reading")
+            for chunk in timed(source.chunks(chunk_size), timings, "read"):
+                unknown = [column for column in chunk.columns if column not in column_names]
+                if unknown or key not in chunk.columns:
+                    connection.rollback()
+                    missing = f"unknown columns {unknown}" if unknown else f"no '{key}' column"
+                    return None, f"Upload has {missing}; append/upsert needs the table's columns and the key."
+
+                progress.check()
+                progress.phase("profiling")
+                tick = time.perf_counter()
+                rows_read += len(chunk)
+                chunk_rows = len(chunk)
+                present = chunk[key].notna()
+                rows_skipped += int((~present).sum())
+                chunk = chunk[present]
+
+                # Widen columns the new rows do not fit (DDL commits the open transaction)
+                chunk, changed = engine.update(chunk, sketch=False)
+                for column, column_type in changed.items():
+                    cursor.execute(f"ALTER TABLE {table_name} MODIFY COLUMN {column} {column_type}")
+                    rows_since_commit = 0
+
+                # Sketches only see the rows that are written
+                write, new = tracker.split(chunk[key], keep)
+                if write_mode == "append":
+                    chunk = chunk[new]
+                    engine.sketch(chunk)
+                else:
+                    chunk = chunk[write]
+                    inserted = sum(new)
+                    engine.sketch(chunk)
+                    engine.profiler.discount(len(chunk) - inserted)
+                    rows_updated += len(chunk) - inserted
+                rows_inserted += sum(new)
+                timings["metadata"] += time.perf_counter() - tick
+
+                columns = list(chunk.columns)
+                query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+                if write_mode == "upsert":
+                    updates = [f"{column} = VALUES({column})" for column in columns if column != key]
+                    query += " ON DUPLICATE KEY UPDATE " + ", ".join(updates or [f"{key} = VALUES({key})"])
+
+                progress.phase("inserting")
+                progress.advance(chunk_rows - len(chunk))
+                rows = list(dataframe_rows(chunk))
+                for start in range(0, len(rows), batch_size):
+                    progress.check()
+                    batch = rows[start:start + batch_size]
+                    cursor.executemany(query, batch)
+                    rows_since_commit += len(batch)
+                    progress.advance(len(batch))
+                    if rows_since_commit >= commit_every:
+                        connection.commit()
+                        rows_since_commit = 0
+                chunk_count += 1
+                progress.phase("reading")
+
+            connection.commit()
+            cursor.close()
+
+        elapsed = time.perf_counter() - started
+        attributes, measures, dates = engine.classify()
+        return {
+            "table_name": table_name,
+            "column_names": column_names,
+            "column_types": engine.types.sql_types(),
+            "attributes": attributes,
+            "measures": measures,
+            "dates": dates,
+            "key_column": key,
+            "column_profiles": engine.profiler.to_dict(),
+            "ingest_stats": ingest_stats(
+                write_mode, rows_read, elapsed, timings["read"], timings["metadata"], chunks=chunk_count,
+                inserted=rows_inserted, updated=rows_updated, skipped=rows_skipped, **engine.stats(), **source.stats(),
+            ),
+            "ingest_state": engine.to_state(),
+        }, None
+
+    except Exception as e:
+        return None, str(e)
@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+
+
+# Default MySQL settings (can be overridden with environment variables)
+MYSQL_CONFIG = {
+    "host": os.environ.get("CHATDB_MYSQL_HOST", "localhost"),
+    "user": os.environ.get("CHATDB_MYSQL_USER", "root"),
+    "password": os.environ.get("CHATDB_MYSQL_PASSWORD", "1234"),
+    "database": os.environ.get("CHATDB_MYSQL_DATABASE", "dsci551_ughh"),
+}
+MYSQL_POOL_SIZE = int(os.environ.get("CHATDB_MYSQL_POOL_SIZE", "8"))
+MYSQL_CHECKOUT_TIMEOUT = float(os.environ.get("CHATDB_MYSQL_CHECKOUT_TIMEOUT", "5"))
+MYSQL_HEALTH_CHECK_INTERVAL = float(os.environ.get("CHATDB_MYSQL_HEALTH_CHECK_INTERVAL", "30"))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class MySQLPool:
+    """
+    Thread-safe pool of MySQL connections shared by every SQL route.
+
+    Connections are created lazily up to `pool_size`. Callers that find the pool
+    exhausted wait up to `checkout_timeout` seconds for a connection to be returned.
+    Connections that sat idle longer than `health_check_interval` are pinged before
+    being handed out and replaced if the server dropped them.
+    """
+
+    def __init__(self, host, user, password, database, pool_size=MYSQL_POOL_SIZE,
+                 checkout_timeout=MYSQL_CHECKOUT_TIMEOUT, health_check_interval=MYSQL_HEALTH_CHECK_INTERVAL):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1.")
+        self.connection_args = {"host": host, "user": user, "password": password, "database": database}
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # (connection, last_used) pairs
+        self._lock = threading.Condition()
+        self._total = 0
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "discarded": 0,
+            "checkouts": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _create_connection(self):
+        connection = mysql.connector.connect(**self.connection_args)
+        with self._lock:
+            self._stats["created"] += 1
+        return connection
+
+    def _is_healthy(self, connection, last_used):
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        with self._lock:
+            self._stats["health_checks"] += 1
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._total -= 1
+            self._stats["discarded"] += 1
+            self._lock.notify()
+
+    def get_connection(self, timeout=None):
+        """Borrow a connection from the pool, waiting up to `timeout` seconds."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("MySQL pool is closed.")
+                while not self._idle and self._total >= self.pool_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"No MySQL connection available within {timeout} seconds "
+                            f"(pool size {self.pool_size})."
+                        )
+                    self._lock.wait(remaining)
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                else:
+                    connection, last_used = None, None
+                    self._total += 1  # reserve a slot before connecting outside the lock
+
+            if connection is None:
+                try:
+                    connection = self._create_connection()
+                except Exception:
+                    with self._lock:
+                        self._total -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_healthy(connection, last_used):
+                self._discard(connection)
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            return connection
+
+    def release(self, connection):
+        """Return a borrowed connection. Broken connections are dropped instead of reused."""
+        try:
+            if not connection.is_connected():
+                raise mysql.connector.Error("connection lost")
+            # Make sure no half-finished transaction leaks into the next borrower
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if self._closed:
+                self._total -= 1
+                connection.close()
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that always hands the connection back, including on errors."""
+        connection = self.get_connection(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def kill_query(self, connection_id):
+        """
+        Stop the statement running on `connection_id` (KILL QUERY). Uses its own
+        unpooled connection so cancelling works while the pool is exhausted.
+        """
+        connection = mysql.connector.connect(**self.connection_args)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"KILL QUERY {int(connection_id)}")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "pool_size": self.pool_size,
+                "open": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "checkout_timeout": self.checkout_timeout,
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+            self._lock.notify_all()
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+_mysql_pool = None
+_mysql_pool_pid = None
+# Pools inherited from the parent process. mysql.connector shuts a socket down when its
+# connection is garbage collected, which would also cut the parent's session, so they
+# are kept referenced and never used
+_inherited_pools = []
+_mysql_pool_lock = threading.Lock()
+
+
+def get_mysql_pool():
+    """
+    Return the process-wide MySQL pool, creating it on first use.
+
+    A new pool is created after a fork so worker processes never share the
+    parent's sockets.
+    """
+    global _mysql_pool, _mysql_pool_pid
+    with _mysql_pool_lock:
+        if _mysql_pool is None or _mysql_pool_pid != os.getpid():
+            if _mysql_pool is not None:
+                _inherited_pools.append(_mysql_pool)
+            _mysql_pool = MySQLPool(**MYSQL_CONFIG)
+            _mysql_pool_pid = os.getpid()
+        return _mysql_pool
@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import json
+import os
+import re
+from contextlib import ExitStack
+
+from query_control import NULL_QUERY
+from telemetry import NULL_TIMER
+
+
+STREAM_BATCH_SIZE = int(os.environ.get("CHATDB_STREAM_BATCH_SIZE", "1000"))
+DEFAULT_PAGE_SIZE = int(os.environ.get("CHATDB_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("CHATDB_MAX_PAGE_SIZE", "1000"))
+
+# Hidden row key added to every uploaded table (see build_create_table_query)
+ROW_ID_COLUMN = "_row_id"
+
+# Shape of the SELECTs produced by input_to_sql()
+_SELECT_RE = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>\w+)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER BY\s+(?P<order>[\w,\s]*?))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\d+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+# One ORDER BY item: a column and its own direction
+_ORDER_ITEM_RE = re.compile(r"^(?P<column>\w+)(?:\s+(?P<direction>ASC|DESC))?$", re.IGNORECASE)
+_NOT_KEYSET_RE = re.compile(r"\b(?:GROUP BY|HAVING|DISTINCT|SUM|AVG|MIN|MAX|COUNT)\b", re.IGNORECASE)
+
+
+class InvalidPageToken(ValueError):
+    """Raised when a continuation token is malformed or no longer matches the data."""
+
+
+def stream_rows(pool, query, batch_size=STREAM_BATCH_SIZE, timer=NULL_TIMER, control=NULL_QUERY):
+    """
+    Yield result rows one batch at a time from an unbuffered cursor.
+
+    The pooled connection is held until the generator is exhausted or closed, so
+    only `batch_size` rows are ever held in memory. `control` (a RunningQuery)
+    adds the execution time limit and is checked for cancellation between batches.
+    """
+    with ExitStack() as stack:
+        with timer.span("connect"):
+            connection = stack.enter_context(pool.connection())
+        stack.enter_context(control.bound(lambda: pool.kill_query(connection.connection_id)))
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        try:
+            with control.interruptible():
+                with timer.span("execute"):
+                    cursor.execute(control.statement(query))
+                while True:
+                    with timer.span("fetch"):
+                        rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+                    control.check()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                # Unread rows left on an abandoned stream; the pool drops the connection
+                pass
+
+
+def encode_page_token(state):
+    payload = json.dumps(state, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_page_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidPageToken("Malformed continuation token.")
+
+
+def query_fingerprint(query):
+    return hashlib.sha1(query.encode()).hexdigest()[:16]
+
+
+def parse_keyset_query(query):
+    """
+    Split a translated SELECT into parts for keyset pagination, or return None when
+    the query cannot be resumed by row key (aggregates, GROUP BY, HAVING, ...).
+    """
+    match = _SELECT_RE.match(query)
+    if not match or _NOT_KEYSET_RE.search(match.group("select")) or _NOT_KEYSET_RE.search(match.group("where") or ""):
+        return None
+    items = [_ORDER_ITEM_RE.match(item.strip()) for item in (match.group("order") or "").split(",") if item.strip()]
+    if (match.group("order") is not None and not items) or not all(items):
+        return None
+    return {
+        "select": match.group("select"),
+        "table": match.group("table"),
+        "where": match.group("where"),
+        "order": [item.group("column") for item in items],
+        # Each column keeps its own direction: "ORDER BY a, b DESC" descends b only
+        "descending": [(item.group("direction") or "").upper() == "DESC" for item in items],
+        "limit": int(match.group("limit")) if match.group("limit") else None,
+        "offset": int(match.group("offset")) if match.group("offset") else 0,
+    }
+
+
+def _keyset_condition(order, descending, last_values, last_row_id):
+    """
+    WHERE clause for rows strictly after (last_values, last_row_id) in
+    ORDER BY order (each column DESC where `descending` says so), _row_id ASC.
+    MySQL sorts NULLs first ascending and last descending; `<=>` is MySQL's
+    NULL-safe equality.
+    """
+    terms = []
+    params = []
+    prefix = []
+    prefix_params = []
+    for column, column_descending, value in zip(order, descending, last_values):
+        if column_descending:
+            after = None if value is None else f"({column} < %s OR {column} IS NULL)"
+        else:
+            after = f"{column} IS NOT NULL" if value is None else f"{column} > %s"
+        if after is not None:
+            terms.append(" AND ".join(prefix + [after]))
+            params.extend(prefix_params + ([] if value is None else [value]))
+        prefix.append(f"{column} <=> %s")
+        prefix_params.append(value)
+    terms.append(" AND ".join(prefix + [f"{ROW_ID_COLUMN} > %s"]))
+    params.extend(prefix_params + [last_row_id])
+    return "(" + " OR ".join(f"({term})" for term in terms) + ")", params
+
+
+def build_page_query(parts, page_size, state=None):
+    """Keyset page query (SQL, params) for parsed query parts and an optional resume state."""
+    select = parts["select"]
+    hidden = [f"{ROW_ID_COLUMN} AS __row_id"] + [f"{column} AS __key{i}" for i, column in enumerate(parts["order"])]
+    sql = f"SELECT {select}, {', '.join(hidden)} FROM {parts['table']}"
+
+    conditions = [f"({parts['where']})"] if parts["where"] else []
+    params = []
+    if state:
+        condition, params = _keyset_condition(parts["order"], parts["descending"], state["last"], state["id"])
+        conditions.append(condition)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    order_by = [f"{column} DESC" if descending else column
+                for column, descending in zip(parts["order"], parts["descending"])] + [ROW_ID_COLUMN]
+    sql += " ORDER BY " + ", ".join(order_by)
+
+    limit = page_size
+    if parts["limit"] is not None:
+        served = state["served"] if state else 0
+        limit = max(0, min(page_size, parts["limit"] - served))
+    sql += f" LIMIT {limit + 1}"
+    if parts["offset"] and not state:
+        sql += f" OFFSET {parts['offset']}"
+    return sql, params, limit
+
+
+def run_query(pool, sql, params=(), timer=NULL_TIMER, control=NULL_QUERY):
+    """Execute one query on a pooled connection and return all rows as dicts."""
+    with ExitStack() as stack:
+        with timer.span("connect"):
+            connection = stack.enter_context(pool.connection())
+        stack.enter_context(control.bound(lambda: pool.kill_query(connection.connection_id)))
+        cursor = connection.cursor(dictionary=True)
+        with control.interruptible():
+            with timer.span("execute"):
+                cursor.execute(control.statement(sql), params)
+            with timer.span("fetch"):
+                rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def fetch_page(pool, query, data_version, page_size=DEFAULT_PAGE_SIZE, token=None, timer=NULL_TIMER,
+               control=NULL_QUERY):
+    """
+    Return (rows, next_token, keyset) for one page of a translated query.
+
+    Resumable queries are paged by (ORDER BY columns, _row_id) so each page seeks
+    directly to where the previous one ended. Other queries (aggregates, GROUP BY)
+    return only their first `page_size` rows and no token.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    parts = parse_keyset_query(query)
+
+    state = None
+    if token:
+        state = decode_page_token(token)
+        if state.get("q") != query_fingerprint(query):
+            raise InvalidPageToken("Continuation token belongs to a different query.")
+        if state.get("v") != data_version:
+            raise InvalidPageToken("The table changed since this page was produced; restart from the first page.")
+
+    if parts is None:
+        if state:
+            raise InvalidPageToken("This query cannot be resumed; use mode 'stream' for the full result.")
+        # Let MySQL stop after one page instead of materializing the whole result
+        rows = run_query(pool, f"SELECT * FROM ({query}) AS page_source LIMIT {page_size}", (), timer, control)
+        return rows, None, False
+
+    sql, params, limit = build_page_query(parts, page_size, state)
+    rows = run_query(pool, sql, params, timer, control)  # at most limit + 1 rows
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_token = None
+    if has_more and rows:
+        last = rows[-1]
+        next_token = encode_page_token({
+            "q": query_fingerprint(query),
+            "v": data_version,
+            "last": [last[f"__key{i}"] for i in range(len(parts["order"]))],
+            "id": last["__row_id"],
+            "served": (state["served"] if state else 0) + len(rows),
+        })
+
+    hidden = {"__row_id"} | {f"__key{i}" for i in range(len(parts["order"]))}
+    rows = [{key: value for key, value in row.items() if key not in hidden} for row in rows]
+    return rows, next_token, True
@@ -0,0 +1,344 @@
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from profiling import to_python
+
+
+# Low-cardinality text columns become ENUMs (1 byte per row) up to this many values
+ENUM_MAX_VALUES = int(os.environ.get("CHATDB_ENUM_MAX_VALUES", "32"))
+# ... and only when each value repeats at least this often on average
+ENUM_MIN_ROWS_PER_VALUE = int(os.environ.get("CHATDB_ENUM_MIN_ROWS_PER_VALUE", "4"))
+# Decimal places kept exactly with DECIMAL; more (or more than 18 digits) falls back to DOUBLE
+MAX_DECIMAL_SCALE = 8
+MAX_DECIMAL_PRECISION = 18
+# Longer text is stored as TEXT
+MAX_VARCHAR_LENGTH = 4096
+# Rows of each chunk tried against a guessed date format before parsing the whole column
+DATE_PROBE_ROWS = 200
+
+# (type, signed min, signed max, unsigned max)
+INTEGER_TYPES = [
+    ("TINYINT", -(2 ** 7), 2 ** 7 - 1, 2 ** 8 - 1),
+    ("SMALLINT", -(2 ** 15), 2 ** 15 - 1, 2 ** 16 - 1),
+    ("MEDIUMINT", -(2 ** 23), 2 ** 23 - 1, 2 ** 24 - 1),
+    ("INT", -(2 ** 31), 2 ** 31 - 1, 2 ** 32 - 1),
+    ("BIGINT", -(2 ** 63), 2 ** 63 - 1, 2 ** 64 - 1),
+]
+
+# Widening order when one column sees values of several kinds
+_NUMERIC_KINDS = ["bool", "int", "decimal", "double"]
+_DATE_DIRECTIVES = ("%Y", "%y", "%m", "%d", "%b", "%B")
+
+
+def integer_type(low, high):
+    """Narrowest MySQL integer type holding every value in [low, high]."""
+    for name, signed_min, signed_max, unsigned_max in INTEGER_TYPES:
+        if low >= 0 and high <= unsigned_max:
+            return f"{name} UNSIGNED"
+        if low >= signed_min and high <= signed_max:
+            return name
+    return "DOUBLE"
+
+
+def varchar_length(length):
+    """Round a maximum text length up to the next power of two (at least 8) for headroom."""
+    size = 8
+    while size < length:
+        size *= 2
+    return size
+
+
+def _decimal_scale(values):
+    """Smallest number of decimal places that represents every value exactly, or None."""
+    for scale in range(MAX_DECIMAL_SCALE + 1):
+        scaled = values * 10 ** scale
+        # Allow only binary floating-point error, not a dropped digit
+        if np.all(np.abs(scaled - np.round(scaled)) <= np.abs(scaled) * 1e-12 + 1e-9):
+            return scale
+    return None
+
+
+def is_identifier(name):
+    """
+    Identifier-like columns (`id`, `customer_id`, `id_number`, `customerId`) are
+    attributes even when numeric; words that merely end in "id" (`paid`, `valid`) are not.
+    """
+    return "id" in re.split(r"[\W_]+", name.lower()) or re.search(r"[a-z0-9](?:Id|ID)$", name) is not None
+
+
+def collation_key(value):
+    """
+    How MySQL's default collation (utf8mb4_0900_ai_ci) compares text: case and
+    accents are ignored, so 'Yes', 'yes' and 'Yés' are the same value.
+    """
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def _date_format(values):
+    """A strftime format that parses every probed value, or None for non-date text."""
+    first = values.iloc[0]
+    fmt = guess_datetime_format(first) if isinstance(first, str) else None
+    if not fmt or sum(directive in fmt for directive in _DATE_DIRECTIVES) < 2:
+        return None
+    parsed = pd.to_datetime(values.iloc[:DATE_PROBE_ROWS], format=fmt, errors="coerce")
+    return fmt if parsed.notna().all() else None
+
+
+class ColumnType:
+    """Running type of one column, widened as chunks arrive."""
+
+    def __init__(self, name):
+        self.name = name
+        self.kind = None  # bool, int, decimal, double, date, datetime, text
+        self.low = None
+        self.high = None
+        self.integer_digits = 1
+        self.scale = 0
+        self.max_length = 0
+        self.values = set()  # distinct text values while there are few enough for an ENUM
+        self.rows = 0
+        self.date_format = None
+        self.frozen = False  # set at CREATE TABLE; the ENUM member list can then only be dropped
+        self.frozen_enum = None
+        self.declared = False  # kind given by a typed source (Parquet/Arrow) instead of inferred
+
+    def declare(self, kind, low=None, high=None, integer_digits=1, scale=0, values=None):
+        """
+        Take the kind from a typed file schema. Declared columns are not re-inferred;
+        update() only tracks integer bounds, text length and (for dictionary-encoded
+        text, given as `values`) the ENUM members.
+        """
+        self.kind = kind
+        self.low, self.high = low, high
+        self.integer_digits = integer_digits
+        self.scale = scale
+        self.values = values
+        self.declared = True
+        if kind == "int" and low is not None:
+            self.integer_digits = len(str(int(max(abs(low), abs(high)))))
+
+    def _widen(self, kind):
+        if self.kind is None or self.kind == kind:
+            self.kind = kind
+        elif self.kind in _NUMERIC_KINDS and kind in _NUMERIC_KINDS:
+            self.kind = max(self.kind, kind, key=_NUMERIC_KINDS.index)
+        elif {self.kind, kind} == {"date", "datetime"}:
+            self.kind = "datetime"
+        else:
+            self._to_text()
+
+    def _to_text(self):
+        if self.kind in ("int", "bool"):
+            self.max_length = max(self.max_length, len(str(self.low)), len(str(self.high)))
+        elif self.kind == "decimal":
+            self.max_length = max(self.max_length, self.integer_digits + self.scale + 2)
+        elif self.kind == "double":
+            self.max_length = max(self.max_length, 24)
+        elif self.kind in ("date", "datetime"):
+            self.max_length = max(self.max_length, 26)
+        if self.kind not in (None, "text"):
+            # Earlier values were not tracked as text, so the set no longer lists them all
+            self.values = None
+        self.kind = "text"
+
+    def _observe_numbers(self, values):
+        low, high = values.min(), values.max()
+        if self.kind not in (None, "int", "bool") or not np.all(np.mod(values, 1) == 0):
+            scale = _decimal_scale(values) if self.kind in (None, "int", "bool", "decimal") else None
+            digits = len(str(int(max(abs(low), abs(high)))))
+            if scale is None or max(digits, self.integer_digits) + max(scale, self.scale) > MAX_DECIMAL_PRECISION:
+                self._widen("double")
+            else:
+                self._widen("decimal")
+                self.scale = max(self.scale, scale)
+                self.integer_digits = max(self.integer_digits, digits)
+        else:
+            self._widen("int")
+            self.integer_digits = max(self.integer_digits, len(str(int(max(abs(low), abs(high))))))
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+
+    def _observe_text(self, values):
+        if self.kind in (None, "date", "datetime"):
+            fmt = self.date_format or _date_format(values)
+            if fmt:
+                parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+                if parsed.notna().all():
+                    self.date_format = fmt
+                    has_time = (parsed != parsed.dt.normalize()).any()
+                    self._widen("datetime" if has_time else "date")
+                    return
+        if self.kind != "text":
+            self._to_text()
+        self.max_length = max(self.max_length, int(values.str.len().max()))
+        if self.values is not None:
+            self.values.update(values.unique())
+            if len(self.values) > ENUM_MAX_VALUES:
+                self.values = None
+
+    def _observe_declared(self, values):
+        if self.kind == "int":
+            low, high = values.min(), values.max()
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+            self.integer_digits = max(self.integer_digits, len(str(int(max(abs(self.low), abs(self.high))))))
+        elif self.kind == "text":
+            self.max_length = max(self.max_length, int(values.str.len().max()))
+            if self.values is not None:
+                self.values.update(values.unique())
+                if len(self.values) > ENUM_MAX_VALUES:
+                    self.values = None
+
+    def update(self, series):
+        self.rows += len(series)
+        values = series.dropna()
+        if values.empty:
+            return
+        if self.declared:
+            self._observe_declared(values)
+        elif pd.api.types.is_bool_dtype(values):
+            self._widen("bool")
+            self.low = 0 if self.low is None else min(self.low, 0)
+            self.high = 1 if self.high is None else max(self.high, 1)
+        elif pd.api.types.is_numeric_dtype(values):
+            if self.kind in ("text", "date", "datetime"):
+                self._observe_text(values.astype(str))
+            else:
+                self._observe_numbers(values.to_numpy(dtype=float))
+        else:
+            values = values.astype(str)
+            if self.kind in _NUMERIC_KINDS:
+                # A chunk with non-numeric text turns the whole column into text
+                self._to_text()
+            self._observe_text(values)
+
+    def enum_members(self):
+        if self.frozen:
+            if self.frozen_enum and self.values is not None and self.values <= set(self.frozen_enum):
+                return self.frozen_enum
+            return None
+        if (self.kind == "text" and self.values and len(self.values) * ENUM_MIN_ROWS_PER_VALUE <= self.rows
+                and all(value == value.rstrip() for value in self.values)
+                # The collation would reject members that differ only in case or accents
+                and len({collation_key(value) for value in self.values}) == len(self.values)):
+            # Sorted so ORDER BY on the ENUM index matches alphabetical order
+            return sorted(self.values, key=lambda value: (collation_key(value), value))
+        return None
+
+    def sql_type(self):
+        if self.kind is None:
+            return "VARCHAR(8)"
+        if self.kind == "bool":
+            return "BOOLEAN"
+        if self.kind == "int":
+            # A declared integer column may have no values yet
+            return integer_type(int(self.low or 0), int(self.high or 0))
+        if self.kind == "decimal":
+            return f"DECIMAL({self.integer_digits + self.scale},{self.scale})"
+        if self.kind == "double":
+            return "DOUBLE"
+        if self.kind == "date":
+            return "DATE"
+        if self.kind == "datetime":
+            return "DATETIME"
+        members = self.enum_members()
+        if members:
+            quoted = ", ".join("'" + value.replace("\\", "\\\\").replace("'", "''") + "'" for value in members)
+            return f"ENUM({quoted})"
+        if self.max_length > MAX_VARCHAR_LENGTH:
+            return "TEXT"
+        return f"VARCHAR({varchar_length(self.max_length)})"
+
+    def convert(self, series):
+        """Values in the Python form MySQL expects for this column's type."""
+        if self.kind in ("date", "datetime"):
+            # The MySQL driver converts datetime/date objects, not pandas Timestamps
+            parsed = pd.to_datetime(series, format=self.date_format, errors="coerce")
+            values = parsed.dt.date if self.kind == "date" else pd.Series(parsed.dt.to_pydatetime(), index=series.index, dtype=object)
+            return values.where(parsed.notna(), None)
+        if self.kind in ("int", "bool") and pd.api.types.is_numeric_dtype(series):
+            return series.astype("Int64")
+        if self.kind == "text" and not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            return series.astype(object).where(series.isna(), series.astype(str))
+        return series
+
+    def to_state(self):
+        state = dict(vars(self))
+        # Appends may come from CSV, so resumed columns are inferred again
+        state.pop("declared")
+        state["low"], state["high"] = to_python(self.low), to_python(self.high)
+        state["values"] = sorted(self.values) if self.values is not None else None
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        column = cls(state["name"])
+        vars(column).update(state)
+        column.values = set(state["values"]) if state["values"] is not None else None
+        return column
+
+
+class TypeInference:
+    """
+    Infers the narrowest exact MySQL type for each column of a CSV, chunk by chunk.
+
+    Integers get the smallest (UNSIGNED when possible) integer type, decimals an
+    exact DECIMAL(p,s) when they have few places, text that parses with one date
+    format DATE or DATETIME, low-cardinality text an ENUM and other text a sized
+    VARCHAR. update() reports columns whose type had to widen so a streaming load
+    can ALTER the table before inserting the chunk.
+    """
+
+    def __init__(self, columns):
+        self.columns = {name: ColumnType(name) for name in columns}
+
+    def update(self, chunk):
+        """
+        Observe one chunk; return {column: new type} for columns whose type changed.
+        Columns missing from the chunk (a partial append) are left as they are.
+        """
+        before = self.sql_types()
+        for name in chunk.columns:
+            self.columns[name].update(chunk[name])
+        after = self.sql_types()
+        return {name: sql_type for name, sql_type in after.items() if before[name] != sql_type}
+
+    def freeze(self):
+        """Fix ENUM members at CREATE TABLE; later unseen values widen the column to VARCHAR."""
+        for column in self.columns.values():
+            column.frozen_enum = column.enum_members()
+            column.frozen = True
+
+    def sql_types(self):
+        return {name: column.sql_type() for name, column in self.columns.items()}
+
+    def classify(self):
+        """(attributes, measures, dates) from the inferred types; identifier columns stay attributes."""
+        attributes, measures, dates = [], [], []
+        for name, column in self.columns.items():
+            if column.kind in ("date", "datetime"):
+                dates.append(name)
+            elif column.kind in ("int", "decimal", "double") and not is_identifier(name):
+                measures.append(name)
+            else:
+                attributes.append(name)
+        return attributes, measures, dates
+
+    def convert(self, chunk):
+        return pd.DataFrame({name: self.columns[name].convert(chunk[name]) for name in chunk.columns})
+
+    def to_state(self):
+        """JSON-friendly inference state, so appends keep widening from where the upload left off."""
+        return [column.to_state() for column in self.columns.values()]
+
+    @classmethod
+    def from_state(cls, state):
+        inference = cls([])
+        inference.columns = {column["name"]: ColumnType.from_state(column) for column in state}
+        return inference
@@ -36,6 +36,20 @@ function handleTableSelection() {
     }
 }
 
+// Uploads run as background jobs: poll the job until it finishes
+async function waitForUploadJob(job) {
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const response = await fetch(`/upload-jobs/${job.job_id}`);
+        job = await response.json();
+        if (!response.ok) {
+            return { status: 'failed', error: job.error };
+        }
+        console.log(`Upload ${job.name}: ${job.phase}, ${job.rows_processed} rows`);
+    }
+    return job;
+}
+
 // Upload CSV Function
 async function uploadCsv() {
     const fileInput = document.getElementById('file-input');
@@ -54,8 +68,13 @@ async function uploadCsv() {
 
     const result = await response.json();
     if (response.ok) {
-        alert(result.message);
-        selectedTable = result.metadata.table_name; // Set the new table name for preview
+        const job = await waitForUploadJob(result);
+        if (job.status !== 'succeeded') {
+            alert(`Error: ${job.error || 'upload ' + job.status}`);
+            return;
+        }
+        alert(job.result.message);
+        selectedTable = job.result.metadata.table_name; // Set the new table name for preview
         //return jsonify({"message": f"Table '{metadata['table_name']}' uploaded successfully.", "metadata": metadata})
     } else {
         alert(`Error: ${result.error}`);
@@ -308,10 +327,15 @@ async function uploadNoSQL() {
 
     const result = await response.json();
     if (response.ok) {
-        alert(result.message);
+        const job = await waitForUploadJob(result);
+        if (job.status !== 'succeeded') {
+            alert(`Error: ${job.error || 'upload ' + job.status}`);
+            return;
+        }
+        alert(job.result.message);
 
         // Update selectedCollection using the correct key
-        selectedCollection = Object.keys(result.metadata)[0]; // Gets the uploaded collection name
+        selectedCollection = Object.keys(job.result.metadata)[0]; // Gets the uploaded collection name
         console.log(`Selected Collection: ${selectedCollection}`);
 
         //selectedCollection = result.collection_name; // Set new collection name
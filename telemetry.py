@@ -0,0 +1,170 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+LOG_LEVEL = os.environ.get("CHATDB_LOG_LEVEL", "INFO").upper()
+# Share of requests whose full request/result payloads are logged at DEBUG level
+LOG_SAMPLE_RATE = float(os.environ.get("CHATDB_LOG_SAMPLE_RATE", "0.01"))
+
+# Seconds; spans from sub-millisecond translations up to slow scans
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def configure_logging(level=LOG_LEVEL):
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def log_sampled(logger, level, message, *args, rate=None):
+    """
+    Log `message` for roughly `rate` of calls, and only when `level` is enabled.
+
+    Arguments are formatted lazily, so skipped calls never stringify large results.
+    """
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    if logger.isEnabledFor(level) and random.random() < rate:
+        logger.log(level, message, *args)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus exposition format."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                bounds = [f"{bound}" for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, series[:len(self.buckets)] + [series[-1]]):
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter("chatdb_requests_total", "Queries handled, by backend and outcome.", ("backend", "outcome"))
+REQUEST_SECONDS = Histogram("chatdb_request_seconds", "End-to-end query latency.", ("backend", "outcome"))
+STAGE_SECONDS = Histogram("chatdb_stage_seconds", "Query latency per stage.", ("backend", "stage"))
+
+
+class RequestTimer:
+    """
+    Per-request timing spans.
+
+    Time spent in each stage is summed across repeated spans (a streamed result
+    fetches many batches). finish() records the spans and the total into the
+    process-wide histograms exactly once.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.finished = False
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def finish(self, outcome):
+        if self.finished:
+            return self.spans
+        self.finished = True
+        total = time.perf_counter() - self.started
+        for stage, seconds in self.spans.items():
+            STAGE_SECONDS.observe(seconds, self.backend, stage)
+        REQUEST_SECONDS.observe(total, self.backend, outcome)
+        REQUESTS.inc(self.backend, outcome)
+        return self.spans
+
+    def server_timing(self):
+        """Spans as a Server-Timing header value (milliseconds)."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.spans.items())
+
+
+class NullTimer:
+    """Stand-in when a caller does not track request timing."""
+
+    spans = {}
+
+    def span(self, stage):
+        return nullcontext()
+
+    def add(self, stage, seconds):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def gauge_lines(name, help_text, values, label_name=None):
+    """Exposition lines for a gauge; `values` maps label value (or None) to number."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for label, value in values.items():
+        labels = f'{{{label_name}="{label}"}}' if label_name else ""
+        lines.append(f"{name}{labels} {value}")
+    return lines
+
+
+def render_metrics(*extra_lines):
+    lines = []
+    for metric in (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS):
+        lines.extend(metric.render())
+    for block in extra_lines:
+        lines.extend(block)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,36 @@
+"""
+Shared fixtures. Tests run without servers: benchmarks/standins.py provides a
+SQLite-backed pool in place of MySQL and mongomock in place of MongoDB.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+# Catalog and uploads of the test run live in a scratch directory
+_scratch = tempfile.mkdtemp(prefix="chatdb-tests-")
+os.environ.setdefault("CHATDB_CATALOG_PATH", os.path.join(_scratch, "catalog.sqlite3"))
+os.environ.setdefault("CHATDB_UPLOAD_DIR", _scratch)
+
+import pytest
+
+from standins import SQLitePool, mongomock_client
+
+
+@pytest.fixture
+def sqlite_pool():
+    return SQLitePool()
+
+
+@pytest.fixture
+def mongo():
+    """In-memory MongoClient."""
+    pytest.importorskip("mongomock")
+    return mongomock_client()
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    return str(tmp_path / "catalog.sqlite3")
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from bench_ingest import LOADERS, generate_csv, run_loader
+from standins import to_sqlite
+
+
+def test_generated_csv_has_the_requested_shape(tmp_path):
+    path = generate_csv(str(tmp_path / "bench.csv"), 250, numeric=2, categorical=3, dates=1, cardinality=7,
+                        null_fraction=0.2, chunk_rows=100)
+    frame = pd.read_csv(path)
+    assert list(frame.columns) == ["row_id", "measure_0", "measure_1", "attr_0", "attr_1", "attr_2", "date_0"]
+    assert frame["row_id"].tolist() == list(range(250))
+    assert frame["attr_0"].nunique() <= 7
+    assert 0.1 < frame.iloc[:, 1:].isna().to_numpy().mean() < 0.3
+
+
+def test_generated_csv_is_reproducible(tmp_path):
+    first = generate_csv(str(tmp_path / "a.csv"), 50)
+    second = generate_csv(str(tmp_path / "b.csv"), 50)
+    assert open(first).read() == open(second).read()
+
+
+def test_mysql_statements_are_rewritten_for_sqlite():
+    assert to_sqlite("ALTER TABLE t MODIFY COLUMN a INT") == "SELECT 1"
+    assert to_sqlite("CREATE TABLE t (a ENUM('x','y'), b INT)") == "CREATE TABLE t (a TEXT, b INT)"
+    assert to_sqlite("INSERT INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE a = VALUES(a)") == (
+        "INSERT INTO t (a) VALUES (?) ON CONFLICT DO UPDATE SET a = excluded.a"
+    )
+
+
+def test_every_loader_runs_against_the_standins(tmp_path):
+    pytest.importorskip("mongomock")
+    path = generate_csv(str(tmp_path / "bench.csv"), 300, numeric=2, categorical=2, cardinality=5)
+    options = {"chunk_size": 100, "batch_size": 50, "workers": 2, "profile_workers": 2, "csv_engine": "c"}
+    for loader in LOADERS:
+        result = run_loader(loader, path, options, str(tmp_path))
+        assert result["error"] is None, loader
+        assert result["stats"]["rows"] == 300, loader
@@ -0,0 +1,16 @@
+import json
+
+import bench_translation
+
+
+def test_committed_baseline_covers_every_benchmark():
+    with open(bench_translation.BASELINE_PATH) as handle:
+        baseline = json.load(handle)["results"]
+    results = bench_translation.run(bench_translation.DEFAULT_WIDTHS, iterations=1, warmup=0)
+    assert set(results) == set(baseline)
+
+
+def test_compare_flags_median_regressions():
+    baseline = {"a[10]": {"p50_us": 10.0}, "b[10]": {"p50_us": 10.0}}
+    results = {"a[10]": {"p50_us": 12.0}, "b[10]": {"p50_us": 13.0}, "c[10]": {"p50_us": 99.0}}
+    assert bench_translation.compare(results, baseline, tolerance=0.25) == [("b[10]", 10.0, 13.0)]
@@ -0,0 +1,75 @@
+from caches import ResultCache, TranslationCache, carry_schema_version, catalog_version, schema_version
+from catalog import MetadataCatalog
+
+
+def test_translation_cache_hits_and_copies():
+    cache = TranslationCache()
+    calls = []
+
+    def translate():
+        calls.append(1)
+        return {"$match": {"city": "la"}}
+
+    first = cache.get_or_translate("nosql", "sales", 1, "find city", translate)
+    first["$match"]["city"] = "changed"
+    assert cache.get_or_translate("nosql", "sales", 1, "find city", translate) == {"$match": {"city": "la"}}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_translation_cache_keys_on_schema_version_and_query_case():
+    cache = TranslationCache()
+    cache.get_or_translate("sql", "sales", 1, "Average Price", lambda: "a")
+    assert cache.get_or_translate("sql", "sales", 1, "average price", lambda: "b") == "a"
+    assert cache.get_or_translate("sql", "sales", 2, "average price", lambda: "c") == "c"
+    # NoSQL literals are case sensitive
+    cache.get_or_translate("nosql", "sales", 1, "city equals LA", lambda: "upper")
+    assert cache.get_or_translate("nosql", "sales", 1, "city equals la", lambda: "lower") == "lower"
+
+
+def test_translation_cache_is_bounded_and_invalidated_per_table():
+    cache = TranslationCache(max_entries=2)
+    for query in ("a", "b", "c"):
+        cache.get_or_translate("sql", "sales", 1, query, lambda: query)
+    cache.get_or_translate("sql", "other", 1, "a", lambda: "a")
+    assert cache.stats()["entries"] == 2
+    assert cache.invalidate("sql", "sales") == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_schema_version_is_carried_over_unchanged_columns(catalog_path):
+    store = MetadataCatalog("sql", catalog_path)
+    store["sales"] = {"column_names": ["city"]}
+    store["sales"] = {"column_names": ["city"]}
+    assert catalog_version(store, "sales") == 2
+    assert catalog_version({}, "sales") == 0
+
+    appended = {"column_names": ["city"]}
+    assert carry_schema_version(store, "sales", appended, ["column_names"])
+    store["sales"] = appended
+    assert (catalog_version(store, "sales"), schema_version(store, "sales")) == (3, 2)
+
+    assert not carry_schema_version(store, "sales", {"column_names": ["city", "price"]}, ["column_names"])
+
+
+def test_result_cache_keys_on_data_version():
+    cache = ResultCache()
+    cache.put("sql", "sales", 1, "SELECT 1", {"data": [1]})
+    assert cache.get("sql", "sales", 1, "SELECT 1") == {"data": [1]}
+    assert cache.get("sql", "sales", 2, "SELECT 1") is None
+    assert cache.invalidate("sql", "sales") == 1
+    assert cache.get("sql", "sales", 1, "SELECT 1") is None
+
+
+def test_result_cache_is_bounded_by_size():
+    cache = ResultCache(max_bytes=100, max_entry_bytes=60)
+    assert not cache.put("sql", "sales", 1, "big", "x" * 80)
+    cache.put("sql", "sales", 1, "first", "x" * 40)
+    cache.put("sql", "sales", 1, "second", "x" * 40)
+    cache.get("sql", "sales", 1, "first")
+    cache.put("sql", "sales", 1, "third", "x" * 40)
+    assert cache.get("sql", "sales", 1, "second") is None
+    assert cache.get("sql", "sales", 1, "first") is not None
+    stats = cache.stats()
+    assert (stats["rejected"], stats["evictions"]) == (1, 1)
+    assert stats["bytes"] <= 100
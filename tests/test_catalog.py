@@ -0,0 +1,45 @@
+import pytest
+
+from catalog import MetadataCatalog
+
+
+def test_entries_persist_across_instances(catalog_path):
+    MetadataCatalog("sql", catalog_path)["people"] = {"columns": ["pid", "city"]}
+    reopened = MetadataCatalog("sql", catalog_path)
+    assert reopened["people"] == {"columns": ["pid", "city"]}
+    assert list(reopened) == ["people"] and len(reopened) == 1
+
+
+def test_kinds_are_separate_namespaces(catalog_path):
+    MetadataCatalog("sql", catalog_path)["people"] = {"columns": []}
+    nosql = MetadataCatalog("nosql", catalog_path)
+    assert "people" not in nosql
+    with pytest.raises(KeyError):
+        nosql["people"]
+
+
+def test_writes_bump_the_version(catalog_path):
+    catalog = MetadataCatalog("sql", catalog_path)
+    assert catalog.version("people") is None
+    assert catalog.set("people", {"columns": ["a"]}) == 1
+    assert catalog.set("people", {"columns": ["a", "b"]}) == 2
+    assert catalog.version("people") == 2
+
+
+def test_cached_entries_follow_writes_of_other_workers(catalog_path):
+    reader = MetadataCatalog("sql", catalog_path)
+    writer = MetadataCatalog("sql", catalog_path)
+    writer["people"] = {"columns": ["a"]}
+    assert reader["people"] == {"columns": ["a"]}
+    writer["people"] = {"columns": ["b"]}
+    assert reader["people"] == {"columns": ["b"]}
+    del writer["people"]
+    assert reader.get("people") is None
+
+
+def test_cache_is_bounded(catalog_path):
+    catalog = MetadataCatalog("sql", catalog_path, cache_size=2)
+    for name in ("a", "b", "c"):
+        catalog[name] = {}
+    assert list(catalog._cache) == ["b", "c"]
+    assert catalog["a"] == {}
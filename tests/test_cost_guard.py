@@ -0,0 +1,91 @@
+import pytest
+
+from cost_guard import (
+    CostEstimate, CostGuard, QueryRejected, equality_selectivity, estimate_find, estimate_pipeline, estimate_sql,
+    limit_sql, range_selectivity,
+)
+
+
+PROFILES = {
+    "city": {"count": 1000, "null_count": 0, "distinct_estimate": 10, "top_values": [["la", 400], ["sf", 100]]},
+    "price": {"count": 1000, "null_count": 100, "distinct_estimate": 500, "min": 0, "max": 99},
+    "day": {"count": 1000, "null_count": 0, "distinct_estimate": 365, "min": "2024-01-01", "max": "2024-12-31"},
+}
+METADATA = {"column_profiles": PROFILES}
+
+
+def test_equality_uses_frequent_values_then_an_even_split():
+    assert equality_selectivity(PROFILES["city"], "LA") == 0.4
+    # 500 rows left over 8 other values
+    assert equality_selectivity(PROFILES["city"], "ny") == 500 / 8 / 1000
+    assert equality_selectivity(PROFILES["price"], None) == pytest.approx(0.1)
+
+
+def test_range_interpolates_between_min_and_max():
+    assert range_selectivity(PROFILES["price"], low=50) == pytest.approx(0.9 * 50 / 100)
+    assert range_selectivity(PROFILES["price"], low=200) == 0.0
+    assert range_selectivity(PROFILES["day"], "2024-07-01") == pytest.approx(0.5, abs=0.01)
+
+
+def test_sql_estimates():
+    assert estimate_sql("SELECT * FROM sales WHERE city = 'la'", METADATA).rows == 400
+    assert estimate_sql("SELECT city, SUM(price) FROM sales GROUP BY city", METADATA).rows == 10
+    assert estimate_sql("SELECT AVG(price) FROM sales WHERE price > 10", METADATA).rows == 1
+    ordered = estimate_sql("SELECT * FROM sales WHERE city = 'la' ORDER BY price LIMIT 5", METADATA)
+    assert (ordered.rows, ordered.sorted, ordered.examined, ordered.top) == (5, 400, 1000, 5)
+    assert estimate_sql("SHOW TABLES", METADATA) is None
+
+
+def test_examined_rows_follow_an_index_seek():
+    query = "SELECT * FROM sales WHERE city = 'la' AND price > 50"
+    scan = estimate_sql(query, METADATA)
+    assert (scan.examined, scan.full_scan) == (1000, True)
+    seek = estimate_sql(query, METADATA, indexes=[("day",), ("city", "price")])
+    assert not seek.full_scan and seek.examined == seek.rows == round(1000 * 0.4 * range_selectivity(
+        PROFILES["price"], low=50))
+    # Only the leading columns of an index serve a filter
+    assert estimate_sql("SELECT * FROM sales WHERE price > 50", METADATA, [("city", "price")]).full_scan
+    assert estimate_sql("SELECT * FROM sales WHERE city = 'la'", METADATA, [("city",)]).examined == 400
+
+    find = estimate_find({"$and": [{"city": "sf"}, {"price": {"$lt": 10}}]}, None, METADATA, [("city", "price")])
+    assert not find.full_scan and find.examined < 100
+    assert estimate_find({"city": {"$regex": "^l"}}, None, METADATA, [("city",)]).full_scan
+
+
+def test_limit_sql_keeps_the_smaller_limit_and_the_offset():
+    assert limit_sql("SELECT * FROM sales", 100) == "SELECT * FROM sales LIMIT 100"
+    assert limit_sql("SELECT * FROM sales LIMIT 5 OFFSET 10", 100) == "SELECT * FROM sales LIMIT 5 OFFSET 10"
+    assert limit_sql("SELECT * FROM sales LIMIT 500", 100) == "SELECT * FROM sales LIMIT 100"
+
+
+def test_pipeline_and_find_estimates():
+    grouped = estimate_pipeline([
+        {"$match": {"city": {"$in": ["la", "sf"]}}},
+        {"$group": {"_id": "$city", "result": {"$sum": "$price"}}},
+        {"$sort": {"result": -1}},
+        {"$limit": 3},
+    ], METADATA)
+    assert (grouped.rows, grouped.sorted, grouped.top) == (3, 10, 3)
+    assert estimate_pipeline([{"$group": {"_id": None, "result": {"$avg": "$price"}}}], METADATA).rows == 1
+    assert estimate_find({"$or": [{"city": "la"}, {"city": "sf"}]}, None, METADATA).rows == 460
+    assert estimate_find({}, {"price": 1}, METADATA).sorted == 1000
+
+
+def test_guard_policies():
+    large, small = CostEstimate(50000, 50000, 0, 50000), CostEstimate(10, 50000, 0, 50000)
+    assert CostGuard("limit", max_rows=100).decide(large) == "limit"
+    assert CostGuard("stream", max_rows=100).decide(large) == "stream"
+    assert CostGuard("limit", max_rows=100).decide(large, buffered=False) == "allow"
+    assert CostGuard("off", max_rows=100, max_examined=10).decide(large) == "allow"
+    with pytest.raises(QueryRejected):
+        CostGuard("reject", max_rows=100).decide(large)
+    guard = CostGuard("limit", max_rows=100, max_examined=1000)
+    with pytest.raises(QueryRejected) as rejected:
+        guard.decide(small, buffered=False)
+    assert rejected.value.estimate is small
+    assert guard.stats()["decisions"] == {"allow": 0, "limit": 0, "stream": 0, "reject": 1}
+    assert "index advisor" in str(rejected.value)
+    # An index seek within the limit runs; one beyond it asks for a narrower filter
+    assert guard.decide(CostEstimate(10, 500, 0, 50000, full_scan=False), buffered=False) == "allow"
+    with pytest.raises(QueryRejected, match="narrow the filter"):
+        guard.decide(CostEstimate(10, 5000, 0, 50000, full_scan=False), buffered=False)
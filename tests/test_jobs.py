@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobManager
+
+
+def wait_done(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture
+def managers(catalog_path, monkeypatch):
+    """Two managers on one catalog file, like two worker processes."""
+    monkeypatch.setattr(jobs, "JOB_CANCEL_POLL", 0)
+    return JobManager(workers=1, path=catalog_path), JobManager(workers=1, path=catalog_path)
+
+
+def blocking(release):
+    def run(job):
+        job.phase("inserting")
+        while not release.wait(0.01):
+            job.check()
+        return {"message": "done"}
+    return run
+
+
+def test_job_result_is_visible_to_other_processes(managers):
+    first, second = managers
+    job = first.submit("sql", "people", lambda job: {"message": "loaded"})
+    record = wait_done(second, job.id)
+    assert record.status == "succeeded"
+    assert record.to_dict()["result"] == {"message": "loaded"}
+    assert second.counts()["succeeded"] == 1
+
+
+def test_one_upload_per_table_across_processes(managers):
+    first, second = managers
+    release = threading.Event()
+    job = first.submit("sql", "people", blocking(release))
+    try:
+        assert second.submit("sql", "people", lambda job: None) is None
+        assert second.active("sql", "people").id == job.id
+        other = second.submit("sql", "orders", lambda job: None)
+        assert other is not None
+    finally:
+        release.set()
+    wait_done(first, job.id)
+    assert second.submit("sql", "people", lambda job: None) is not None
+
+
+def test_cancel_through_another_process(managers):
+    first, second = managers
+    job = first.submit("nosql", "people", blocking(threading.Event()))
+    while first.get(job.id).status != "running":
+        time.sleep(0.01)
+    assert second.cancel(job.id).cancel_requested
+    assert wait_done(first, job.id).status == "cancelled"
+    assert second.get(job.id).status == "cancelled"
+
+
+def test_lock_of_an_exited_process_is_released(managers, monkeypatch):
+    first, second = managers
+    release = threading.Event()
+    job = first.submit("sql", "people", blocking(release))
+    monkeypatch.setattr(jobs, "process_alive", lambda pid: False)
+    try:
+        assert second.submit("sql", "people", lambda job: None) is not None
+        assert second.get(job.id).status == "failed"
+    finally:
+        release.set()
+
+
+def test_finished_jobs_are_trimmed_to_the_history(catalog_path):
+    manager = JobManager(workers=1, history=2, path=catalog_path)
+    for index in range(5):
+        wait_done(manager, manager.submit("sql", f"t{index}", lambda job: None).id)
+    # The fifth submit trimmed the four finished jobs to two
+    assert [job.name for job in manager.jobs()] == ["t2", "t3", "t4"]
@@ -0,0 +1,68 @@
+import datetime
+import json
+
+import pytest
+from bson.objectid import ObjectId
+
+from json_documents import FieldPaths, iter_json_documents
+
+
+DOCUMENTS = [{"name": "a", "tags": ["x", "y"]}, {"name": "b" * 50, "address": {"city": "la"}}, {"name": "c"}]
+
+
+def write(tmp_path, text, name="docs.json"):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(DOCUMENTS),
+    json.dumps(DOCUMENTS, indent=2),
+    "\n".join(json.dumps(document) for document in DOCUMENTS) + "\n",
+    "".join(json.dumps(document) for document in DOCUMENTS),
+])
+def test_arrays_and_object_streams_across_read_blocks(tmp_path, text):
+    # Tiny read blocks split every document over several reads
+    assert list(iter_json_documents(write(tmp_path, text), read_size=7)) == DOCUMENTS
+
+
+def test_extended_json_becomes_bson_types(tmp_path):
+    text = '{"_id": {"$oid": "5f1d7a3e9b1e8a3c4d5e6f70"}, "at": {"$date": "2024-01-02T03:04:05Z"}}'
+    document, = iter_json_documents(write(tmp_path, text, "export.ndjson"))
+    assert document["_id"] == ObjectId("5f1d7a3e9b1e8a3c4d5e6f70")
+    assert document["at"].replace(tzinfo=None) == datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+
+@pytest.mark.parametrize("text, message", [
+    ('[{"a": 1} {"a": 2}]', "Expected ',' or ']'"),
+    ('[{"a": 1}', "not closed"),
+    ('[{"a": 1}] {"a": 2}', "after the JSON array"),
+    ('[1, 2]', "not a JSON object"),
+    ('{"a": 1}\n{"a": ', "Invalid JSON in document 2"),
+])
+def test_malformed_files_are_rejected(tmp_path, text, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_documents(write(tmp_path, text)))
+
+
+def test_field_paths_profile_nesting_and_arrays():
+    paths = FieldPaths()
+    values = paths.observe([
+        {"_id": 1, "name": "a", "address": {"city": "la", "zip": 90001}, "items": [{"sku": "s1"}, {"sku": "s2"}]},
+        {"name": "b", "address": {"city": None}, "items": []},
+    ])
+    assert values == {"name": ["a", "b"], "address.city": ["la", None], "address.zip": [90001], "items.sku": ["s1", "s2"]}
+    assert paths.leaf_paths() == ["name", "address.city", "address.zip", "items.sku"]
+    profile = paths.to_dict()
+    assert profile["address.zip"]["share"] == 0.5
+    assert profile["address.city"]["types"] == {"string": 1, "null": 1}
+    assert profile["items.sku"]["in_array"] and not profile["address.city"]["in_array"]
+    assert "_id" not in profile
+
+
+def test_field_paths_are_capped():
+    paths = FieldPaths(max_paths=2)
+    paths.observe([{f"key{i}": i for i in range(5)}])
+    assert list(paths.to_dict()) == ["key0", "key1"]
+    assert paths.truncated
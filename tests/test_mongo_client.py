@@ -0,0 +1,66 @@
+import pytest
+
+import mongo_client
+
+
+class FakeMongoClient:
+    def __init__(self, uri, event_listeners=(), **options):
+        self.uri = uri
+        self.options = options
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    created = []
+
+    def client(*args, **kwargs):
+        created.append(FakeMongoClient(*args, **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(mongo_client, "MongoClient", client)
+    monkeypatch.setattr(mongo_client, "_mongo_client", None)
+    monkeypatch.setattr(mongo_client, "_mongo_client_pid", None)
+    return created
+
+
+def test_client_is_shared(clients):
+    assert mongo_client.get_mongo_client() is mongo_client.get_mongo_client()
+    assert len(clients) == 1
+    assert clients[0].options["maxPoolSize"] == mongo_client.MONGO_CLIENT_OPTIONS["maxPoolSize"]
+
+
+def test_client_is_rebuilt_after_fork(clients, monkeypatch):
+    parent = mongo_client.get_mongo_client()
+    pid = mongo_client.os.getpid()
+    monkeypatch.setattr(mongo_client.os, "getpid", lambda: pid + 1)
+    child = mongo_client.get_mongo_client()
+    assert child is not parent
+    assert not parent.closed
+
+
+def test_close_only_closes_own_client(clients, monkeypatch):
+    client = mongo_client.get_mongo_client()
+    mongo_client.close_mongo_client()
+    assert client.closed
+    assert mongo_client.get_mongo_client() is not client
+
+    inherited = mongo_client.get_mongo_client()
+    pid = mongo_client.os.getpid()
+    monkeypatch.setattr(mongo_client.os, "getpid", lambda: pid + 1)
+    mongo_client.close_mongo_client()
+    assert not inherited.closed
+
+
+def test_pool_listener_counts_checkouts():
+    listener = mongo_client._PoolStatsListener()
+    listener.connection_created(None)
+    listener.connection_checked_out(None)
+    listener.connection_checked_out(None)
+    listener.connection_checked_in(None)
+    snapshot = listener.snapshot()
+    assert snapshot["checked_out"] == 1
+    assert snapshot["open_connections"] == 1
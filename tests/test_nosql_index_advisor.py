@@ -0,0 +1,113 @@
+from nosql_index_advisor import (
+    MongoIndexAdvisor, _plan_stages, candidate_keys, existing_indexes, index_name, parse_filter_shape,
+)
+
+
+METADATA = {
+    "column_profiles": {
+        "city": {"count": 5000, "distinct_estimate": 50},
+        "product": {"count": 5000, "distinct_estimate": 900},
+        "price": {"count": 5000, "distinct_estimate": 3000},
+    },
+}
+
+
+class FakeCursor:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def sort(self, keys):
+        return self
+
+    def explain(self):
+        if self.collection.indexes and self.collection.usable:
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": self.collection.indexes[-1]}}
+        else:
+            plan = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+        return {"queryPlanner": {"winningPlan": plan}, "executionStats": {"totalDocsExamined": 10}}
+
+
+class FakeCollection:
+    """Planner stand-in: picks the newest index when `usable`, else scans and sorts in memory."""
+
+    name = "sales"
+
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.indexes = []
+
+    def find(self, conditions):
+        return FakeCursor(self)
+
+    def create_index(self, keys, name):
+        self.indexes.append(name)
+
+    def drop_index(self, name):
+        self.indexes.remove(name)
+
+    def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}}
+
+
+def test_filter_shape_roles():
+    shape = parse_filter_shape(
+        {"$and": [{"city": "la"}, {"price": {"$gt": 3}}], "product": {"$in": ["a", "b"]},
+         "notes": {"$regex": "x"}},
+        {"qty": -1}, {"city": 1, "_id": 0},
+    )
+    assert sorted(shape.equality) == ["city", "product"]
+    assert shape.ranges == ["price"]
+    assert shape.sort == [("qty", -1)]
+    assert shape.projection == ["city"]
+    assert parse_filter_shape({"$or": [{"city": "la"}, {"city": "sf"}]}) is None
+
+
+def test_candidate_keys_follow_equality_sort_range():
+    shape = parse_filter_shape({"city": "la", "product": "x", "price": {"$lt": 9}}, {"qty": -1})
+    assert candidate_keys(shape, METADATA["column_profiles"]) == [
+        ("product", 1), ("city", 1), ("qty", 1), ("price", 1),
+    ]
+
+
+def test_candidates_report_sort_and_covered_shares():
+    advisor = MongoIndexAdvisor()
+    advisor.record("sales", {"city": "la"}, {"price": 1}, {"city": 1, "price": 1, "_id": 0})
+    advisor.record("sales", {"city": "sf"}, None, None)
+    advisor.record("sales", {"$or": [{"city": "la"}]})
+    candidates = advisor.candidates("sales", METADATA, existing=[(("city", -1), ("price", -1))])
+    assert len(candidates) == 1
+    candidate = candidates[0]
+    assert candidate["keys"] == [["city", 1], ["price", 1]]
+    assert (candidate["queries_served"], candidate["workload_share"]) == (2, 1.0)
+    assert (candidate["sort_avoided_share"], candidate["covered_share"]) == (0.5, 0.5)
+    assert candidate["exists"]
+    assert candidate["name"] == index_name([("city", 1), ("price", 1)]) == "ix_chatdb_city_1_price_1"
+
+
+def test_apply_keeps_only_indexes_the_planner_picks():
+    advisor = MongoIndexAdvisor()
+    advisor.record("sales", {"product": "x"})
+    candidate = advisor.candidates("sales", METADATA)[0]
+
+    collection = FakeCollection(usable=True)
+    result = advisor.apply_many(collection, [candidate])[0]
+    assert result["status"] == "created"
+    assert result["before"]["collection_scan"] and result["before"]["in_memory_sort"]
+    assert result["after"]["indexes"] == ["ix_chatdb_product_1"]
+    assert advisor.workload("sales")["applied"] == [result]
+
+    collection = FakeCollection(usable=False)
+    assert advisor.apply(collection, candidate)["status"] == "dropped_unused"
+    assert collection.indexes == []
+
+
+def test_plan_stages_unwrap_the_slot_based_engine():
+    plan = {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "ix"}}}
+    assert _plan_stages(plan) == (["FETCH", "IXSCAN"], ["ix"])
+
+
+def test_existing_indexes_skip_id_and_special_indexes(mongo):
+    collection = mongo.test.sales
+    collection.create_index([("city", 1), ("price", -1)])
+    collection.create_index([("notes", "text")])
+    assert existing_indexes(collection) == [(("city", 1), ("price", -1))]
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+import nosql_ingest
+from nosql_ingest import _insert_batch, merge_csv_into_mongo, sparse_documents, stream_csv_to_mongo, stream_json_to_mongo
+from standins import use_mongo_standin
+
+import pandas as pd
+
+
+@pytest.fixture
+def db(mongo):
+    use_mongo_standin(mongo, nosql_ingest)
+    return mongo["test"]
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def load(tmp_path, db, text, **options):
+    metadata = stream_csv_to_mongo(write(tmp_path, "people.csv", text), db.name, "people", **options)["people"]
+    return metadata, metadata.pop("ingest_state")
+
+
+def test_sparse_documents_leave_out_missing_values():
+    frame = pd.DataFrame({"a": [1, None], "b": ["x", None]})
+    assert list(sparse_documents(frame)) == [{"a": 1.0, "b": "x"}, {}]
+
+
+def test_stream_loads_every_row_in_batches(tmp_path, db):
+    rows = "\n".join(f"{i},{'la' if i % 2 else 'sf'},{i * 1.5}" for i in range(25))
+    metadata, _ = load(tmp_path, db, "pid,city,amount\n" + rows + "\n", chunk_size=10, batch_size=4, workers=2)
+    assert db.people.count_documents({}) == 25
+    assert metadata["ingest_stats"]["inserted"] == 25
+    assert metadata["categorical_columns"] == ["city"]
+    assert sorted(metadata["numeric_columns"]) == ["amount", "pid"]
+
+
+def test_classification_covers_every_chunk(tmp_path, db):
+    # amount is empty and code numeric in the first chunk only
+    rows = ["1,,7", "2,,8", "3,2.5,x9", "4,3.5,10"]
+    metadata, _ = load(tmp_path, db, "pid,amount,code\n" + "\n".join(rows) + "\n", chunk_size=2)
+    assert metadata["categorical_columns"] == ["code"]
+    assert sorted(metadata["numeric_columns"]) == ["amount", "pid"]
+
+
+def test_stream_reports_progress_after_every_chunk(tmp_path, db):
+    calls = []
+    rows = "".join(f"{i},{i % 3}\n" for i in range(7))
+    load(tmp_path, db, "pid,score\n" + rows, chunk_size=3, batch_size=2, workers=1,
+         progress_callback=lambda read, inserted: calls.append(read))
+    assert calls == [3, 6, 7]
+
+
+def test_unordered_batches_count_rejected_documents(db):
+    db.people.create_index("pid", unique=True)
+    db.people.insert_one({"pid": 2})
+    assert _insert_batch(db.people, [{"pid": 1}, {"pid": 2}, {"pid": 3}]) == (2, 1)
+    assert db.people.count_documents({}) == 3
+
+
+def test_append_adds_only_new_keys(tmp_path, db):
+    metadata, state = load(tmp_path, db, "pid,city\n1,la\n2,sf\n")
+    update = write(tmp_path, "more.csv", "pid,city\n2,ny\n3,ny\n")
+    merged = merge_csv_into_mongo(update, db.name, "people", metadata, state, "append", "pid")["people"]
+    assert merged["ingest_stats"]["inserted"] == 1
+    assert {d["pid"]: d["city"] for d in db.people.find({}, {"_id": 0})} == {1: "la", 2: "sf", 3: "ny"}
+
+
+def test_merged_columns_are_classified_from_every_chunk(tmp_path, db):
+    metadata, state = load(tmp_path, db, "pid,city\n1,la\n")
+    update = write(tmp_path, "more.csv", "pid,bonus\n2,\n3,4.5\n")
+    merged = merge_csv_into_mongo(update, db.name, "people", metadata, state, "append", "pid", chunk_size=1)["people"]
+    assert merged["columns"] == ["pid", "city", "bonus"]
+    assert merged["numeric_columns"] == metadata["numeric_columns"] + ["bonus"]
+
+
+def test_upsert_keeps_fields_missing_from_the_upload(tmp_path, db):
+    # Same outcome as MySQL's ON DUPLICATE KEY UPDATE: only the uploaded columns change
+    metadata, state = load(tmp_path, db, "pid,city,amount\n1,la,10\n2,sf,20\n")
+    update = write(tmp_path, "update.csv", "pid,city\n2,ny\n3,ny\n")
+    merged = merge_csv_into_mongo(update, db.name, "people", metadata, state, "upsert", "pid")["people"]
+    assert merged["ingest_stats"]["updated"] == 1
+    documents = {d["pid"]: d for d in db.people.find({}, {"_id": 0})}
+    assert documents[2] == {"pid": 2, "city": "ny", "amount": 20}
+    assert documents[3] == {"pid": 3, "city": "ny"}
+
+
+def test_upsert_clears_fields_the_upload_leaves_empty(tmp_path, db):
+    metadata, state = load(tmp_path, db, "pid,city,amount\n1,la,10\n")
+    update = write(tmp_path, "update.csv", "pid,city,amount\n1,,11\n")
+    merge_csv_into_mongo(update, db.name, "people", metadata, state, "upsert", "pid")
+    assert db.people.find_one({}, {"_id": 0}) == {"pid": 1, "amount": 11}
+
+
+def test_json_documents_keep_their_nesting(tmp_path, db):
+    documents = [{"name": "a", "address": {"city": "la"}, "tags": ["x", "y"]}, {"name": "b", "address": {"city": "sf"}}]
+    path = write(tmp_path, "people.ndjson", "\n".join(json.dumps(document) for document in documents))
+    metadata = stream_json_to_mongo(path, db.name, "people")["people"]
+    assert db.people.find_one({"name": "a"}, {"_id": 0}) == documents[0]
+    assert metadata["columns"] == ["name", "address.city", "tags"]
+    assert metadata["field_paths"]["tags"]["in_array"]
@@ -0,0 +1,108 @@
+import pytest
+
+import app
+import nosql_ingest
+from nosql_func import input_to_mongodb, parse_aggregation, parse_conditions, parse_limit, parse_sorting
+from nosql_pipeline import build_pipeline, optimize_pipeline
+from standins import use_mongo_standin
+
+
+METADATA = {
+    "sales": {
+        "categorical_columns": ["city", "product"],
+        "numeric_columns": ["price", "qty"],
+    }
+}
+
+
+def pipeline(user_query):
+    return build_pipeline(
+        parse_conditions(user_query, "sales", METADATA),
+        parse_aggregation(user_query, "sales", METADATA),
+        parse_sorting(user_query, "sales", METADATA),
+        parse_limit(user_query),
+    )
+
+
+def test_missing_condition_is_an_empty_filter():
+    assert parse_conditions("find average price", "sales", METADATA) == {}
+    assert parse_conditions("find city where price greater than 10", "sales", METADATA) == {"price": {"$gt": 10}}
+
+
+def test_aggregation_without_filter():
+    assert pipeline("find average price") == [{"$group": {"_id": None, "result": {"$avg": "$price"}}}]
+    assert pipeline("find sum price by city") == [{"$group": {"_id": "$city", "result": {"$sum": "$price"}}}]
+
+
+def test_aggregation_with_filter():
+    assert pipeline("find sum price by city where qty greater than 2 order by price desc limit 3") == [
+        {"$match": {"qty": {"$gt": 2}}},
+        {"$group": {"_id": "$city", "result": {"$sum": "$price"}}},
+        {"$sort": {"result": -1}},
+        {"$limit": 3},
+    ]
+
+
+def test_find_without_filter():
+    assert input_to_mongodb("find city order by price desc", "sales", METADATA) == (
+        "db.sales.find({}, {'city': 1, '_id': 0}).sort({'price': -1})"
+    )
+
+
+def test_optimizer_projects_merges_and_keeps_top_k():
+    plan = optimize_pipeline([
+        {"$match": {"city": "la"}},
+        {"$sort": {"price": -1}},
+        {"$match": {"qty": {"$gt": 2}}},
+        {"$limit": 5},
+    ])
+    assert plan.stages == [
+        {"$match": {"city": "la", "qty": {"$gt": 2}}},
+        {"$sort": {"price": -1}},
+        {"$limit": 5},
+    ]
+    assert "merged adjacent $match stages" in plan.rewrites
+    assert "top-5 $sort" in plan.rewrites
+
+    plan = optimize_pipeline([{"$group": {"_id": "$city", "result": {"$sum": "$price"}}}])
+    assert plan.stages[0] == {"$project": {"city": 1, "price": 1, "_id": 0}}
+
+
+def test_allow_disk_use_follows_the_estimate(monkeypatch):
+    metadata = {"column_profiles": {"city": {"count": 500, "distinct_estimate": 400}}}
+    stages = [{"$group": {"_id": "$city", "result": {"$sum": 1}}}]
+    monkeypatch.setattr("nosql_pipeline.DISK_USE_ROWS", 100)
+    assert optimize_pipeline(stages, metadata).options() == {"allowDiskUse": True}
+    assert optimize_pipeline(stages, metadata, allow_disk_use=False).options() == {}
+    monkeypatch.setattr("nosql_pipeline.DISK_USE_ROWS", 100000)
+    assert optimize_pipeline(stages, metadata).options() == {}
+
+
+@pytest.fixture
+def client(tmp_path, mongo, monkeypatch):
+    use_mongo_standin(mongo, nosql_ingest)
+    monkeypatch.setattr(app, "get_mongo_db", lambda name: mongo[name])
+    path = tmp_path / "sales.csv"
+    path.write_text("city,price,qty\nla,10,1\nla,20,5\nsf,5,3\nsf,7,4\nny,1,9\n")
+    metadata = nosql_ingest.stream_csv_to_mongo(str(path), app.MONGO_DB_NAME, "sales")["sales"]
+    metadata.pop("ingest_state")
+    app.nosql_metadata_store["sales"] = metadata
+    yield app.app.test_client()
+    del app.nosql_metadata_store["sales"]
+
+
+def ask(client, query):
+    response = client.post("/process-nosql-query", json={"query": query, "collection": "sales"})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["data"]
+
+
+def test_route_aggregates_without_filter(client):
+    assert ask(client, "find average price") == [{"_id": "None", "result": 8.6}]
+    totals = ask(client, "find sum price by city")
+    assert sorted((row["_id"], row["result"]) for row in totals) == [("la", 30), ("ny", 1), ("sf", 12)]
+
+
+def test_route_aggregates_with_filter(client):
+    totals = ask(client, "find sum price by city where qty greater than 2 order by price desc")
+    assert [(row["_id"], row["result"]) for row in totals] == [("la", 20), ("sf", 12), ("ny", 1)]
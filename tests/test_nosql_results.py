@@ -0,0 +1,68 @@
+import pytest
+
+from nosql_results import InvalidFindToken, fetch_find_page
+
+
+@pytest.fixture
+def collection(mongo):
+    # Repeated and missing scores make the pages resume on (score, _id)
+    scores = [5, None, 3, 5, 1, None, 3, 5, 2, 4, 5]
+    documents = [{"pid": i, "group": i % 3} if score is None else {"pid": i, "group": i % 3, "score": score}
+                 for i, score in enumerate(scores)]
+    mongo.test.scores.insert_many(documents)
+    return mongo.test.scores
+
+
+def all_pages(collection, conditions, sorting, page_size=2, projection=None):
+    query = f"find({conditions}).sort({sorting})"
+    page = fetch_find_page(collection, conditions, projection or {"pid": 1, "_id": 0}, sorting, query, 1, page_size)
+    documents = list(page["data"])
+    while page["next_page_token"]:
+        page = fetch_find_page(collection, conditions, projection or {"pid": 1, "_id": 0}, sorting, query, 1,
+                               page_size, page["next_page_token"])
+        documents.extend(page["data"])
+    return [document["pid"] for document in documents]
+
+
+@pytest.mark.parametrize("conditions, sorting", [
+    ({}, {}),
+    ({}, {"score": 1}),
+    ({}, {"score": -1}),
+    ({"score": {"$gt": 2}}, {"score": -1}),
+    ({}, {"group": 1, "score": -1}),
+    ({}, {"score": 1, "group": -1}),
+    ({"group": {"$lt": 2}}, {"group": -1, "score": 1}),
+])
+def test_pages_match_one_sorted_find(collection, conditions, sorting):
+    order = list(sorting.items()) + [("_id", 1)]
+    expected = [document["pid"] for document in collection.find(conditions).sort(order)]
+    assert all_pages(collection, conditions, sorting) == expected
+
+
+@pytest.mark.parametrize("ids", [[3, 1, 2, 5, 4], ["c", "a", "b", "e", "d"]])
+def test_imported_ids_keep_their_type_across_pages(mongo, ids):
+    mongo.test.imported.insert_many([{"_id": value, "pid": value} for value in ids])
+    assert all_pages(mongo.test.imported, {}, {}) == sorted(ids)
+    assert all_pages(mongo.test.imported, {}, {"pid": -1}) == sorted(ids, reverse=True)
+
+
+def test_sort_field_is_fetched_but_not_shown(collection):
+    page = fetch_find_page(collection, {}, {"pid": 1, "_id": 0}, {"score": 1}, "q", 1, page_size=3)
+    assert all(list(document) == ["pid"] for document in page["data"])
+    assert page["next_page_token"]
+
+
+def test_tokens_are_bound_to_query_and_data_version(collection):
+    page = fetch_find_page(collection, {}, None, {"score": 1}, "q", 1, page_size=2)
+    with pytest.raises(InvalidFindToken):
+        fetch_find_page(collection, {}, None, {"score": 1}, "other", 1, 2, page["next_page_token"])
+    with pytest.raises(InvalidFindToken):
+        fetch_find_page(collection, {}, None, {"score": 1}, "q", 2, 2, page["next_page_token"])
+    with pytest.raises(InvalidFindToken):
+        fetch_find_page(collection, {}, None, {}, "q", 1, 2, "not a token")
+
+
+def test_count_is_included_on_request(collection):
+    page = fetch_find_page(collection, {"score": 5}, None, {}, "q", 1, page_size=2, include_count=True)
+    assert (page["total_estimate"], page["total_is_lower_bound"]) == (4, False)
+    assert isinstance(page["data"][0]["_id"], str)
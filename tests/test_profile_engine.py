@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import profile_engine
+from profile_engine import ProfilingEngine, read_csv_chunks, read_csv_frame
+
+
+def frame(rows=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "city": rng.choice(["la", "sf", "ny"], rows),
+        "price": rng.normal(50, 10, rows).round(2),
+        "qty": rng.integers(0, 200, rows),
+        "day": rng.choice(["2024-01-02", "2024-02-03"], rows),
+    })
+
+
+def profile(monkeypatch, workers, data):
+    monkeypatch.setattr(profile_engine, "PROFILE_WORKERS", workers)
+    engine = ProfilingEngine(list(data.columns))
+    for start in range(0, len(data), 500):
+        engine.update(data.iloc[start:start + 500])
+    return engine
+
+
+def test_parallel_profiling_matches_serial(monkeypatch):
+    data = frame()
+    serial, parallel = profile(monkeypatch, 1, data), profile(monkeypatch, 4, data)
+    assert parallel.types.sql_types() == serial.types.sql_types()
+    assert parallel.classify() == serial.classify() == (["order_id", "city"], ["price", "qty"], ["day"])
+    for name, stats in serial.profiler.to_dict().items():
+        parallel_stats = parallel.profiler.to_dict()[name]
+        # Samples are random; everything else is deterministic
+        assert {**parallel_stats, "sample": None} == {**stats, "sample": None}, name
+
+
+def test_only_numeric_columns_go_to_the_thread_pool(monkeypatch):
+    monkeypatch.setattr(profile_engine, "PROFILE_WORKERS", 4)
+    data = frame(rows=10)
+    threads = ProfilingEngine()._map(lambda name: threading.current_thread().name, list(data.columns), data)
+    caller = threading.current_thread().name
+    assert dict(zip(data.columns, [name == caller for name in threads])) == {
+        "order_id": False, "city": True, "price": False, "qty": False, "day": True,
+    }
+
+
+def test_update_reports_widened_types_and_converts_values():
+    engine = ProfilingEngine(["qty", "day"])
+    _, changed = engine.update(pd.DataFrame({"qty": [1, 2], "day": ["2024-01-02", "2024-01-03"]}))
+    assert changed == {"qty": "TINYINT UNSIGNED", "day": "DATE"}
+    # Loaders create the table from the first chunk's types and widen from there
+    engine.types.freeze()
+    converted, changed = engine.update(pd.DataFrame({"qty": [70000, 3], "day": ["2024-01-04", None]}))
+    assert changed == {"qty": "MEDIUMINT UNSIGNED"}
+    assert converted["day"].iloc[0] == pd.Timestamp("2024-01-04").date()
+    assert engine.stats()["profile_seconds"] >= 0
+
+
+def test_engine_resumes_from_its_state():
+    engine = ProfilingEngine(["qty"])
+    engine.update(pd.DataFrame({"qty": [1, 2]}))
+    resumed = ProfilingEngine.from_state(engine.to_state())
+    _, changed = resumed.update(pd.DataFrame({"qty": [300]}))
+    assert changed == {"qty": "SMALLINT UNSIGNED"}
+    assert resumed.profiler.to_dict()["qty"]["count"] == 3
+
+
+def test_sketches_can_follow_the_written_rows():
+    engine = ProfilingEngine(["city"])
+    engine.update(pd.DataFrame({"city": ["la", "sf"]}), sketch=False)
+    engine.sketch(pd.DataFrame({"city": ["la"]}))
+    assert engine.profiler.to_dict()["city"]["count"] == 1
+    assert engine.mongo_classify() == (["city"], [])
+
+
+def test_csv_readers_normalize_column_names(tmp_path):
+    path = tmp_path / "upload.csv"
+    path.write_text("Order Id,City\n1,la\n2,sf\n3,ny\n")
+    assert list(read_csv_frame(str(path), engine="c").columns) == ["order_id", "city"]
+    assert [len(chunk) for chunk in read_csv_chunks(str(path), 2)] == [2, 1]
+
+
+def test_missing_pyarrow_falls_back_to_the_c_parser(monkeypatch):
+    monkeypatch.setattr(profile_engine, "find_spec", lambda name: None)
+    assert profile_engine._csv_engine("pyarrow") == "c"
+    assert profile_engine._csv_engine("anything") == "c"
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from profiling import ColumnProfile, HyperLogLog, SpaceSaving, TableProfiler, profile_values
+
+
+def test_hyperloglog_estimates_distinct_values():
+    sketch = HyperLogLog()
+    sketch.add_series(pd.Series(range(20000)))
+    sketch.add_series(pd.Series(range(10000)))
+    assert abs(sketch.estimate() - 20000) < 20000 * 0.05
+
+
+def test_space_saving_keeps_the_heavy_hitters():
+    summary = SpaceSaving(capacity=3)
+    summary.add_counts([("a", 50), ("b", 30), ("c", 2)])
+    summary.add_counts([("d", 1), ("a", 10)])
+    assert summary.top(2) == [("a", 60), ("b", 30)]
+    assert len(summary.counters) == 3
+
+
+def test_column_profile_is_bounded_and_chunked():
+    profile = ColumnProfile(top_k=2, sample_size=5)
+    profile.update(pd.Series(["x", "x", "y", None]))
+    profile.update(pd.Series([f"v{i}" for i in range(100)] + ["x"] * 5))
+    stats = profile.to_dict()
+    assert (stats["count"], stats["null_count"]) == (109, 1)
+    assert stats["top_values"][0] == ["x", 7]
+    assert len(stats["top_values"]) == 2 and len(stats["sample"]) == 5
+    assert (stats["min"], stats["max"]) == ("v0", "y")
+    assert 95 <= stats["distinct_estimate"] <= 104
+
+
+def test_profiles_resume_from_their_state():
+    profiler = TableProfiler(["n"])
+    profiler.update(pd.DataFrame({"n": [1, 2, 2]}))
+    resumed = TableProfiler.from_state(profiler.to_state())
+    resumed.update(pd.DataFrame({"n": [2, 9]}))
+    stats = resumed.to_dict()["n"]
+    assert stats["count"] == 5
+    assert stats["top_values"][0] == [2, 3]
+    assert (stats["min"], stats["max"]) == (1, 9)
+    assert stats["distinct_estimate"] == 3
+
+
+def test_profile_values_lists_frequent_then_sampled_values():
+    assert profile_values({"top_values": [["a", 3], ["b", 1]], "sample": ["b", "c"]}) == ["a", "b", "c"]
+    assert profile_values(None) == []
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+import query_control
+from query_control import (
+    MONGO_TIMEOUT_CODE, MYSQL_INTERRUPTED_ERRNO, QueryCancelled, QueryManager, QueryTimeout, RequestIdInUse,
+    RunningQuery, TableBusy, new_request_id,
+)
+
+
+class DatabaseError(Exception):
+    def __init__(self, errno=None, code=None):
+        super().__init__("database error")
+        self.errno = errno
+        self.code = code
+
+
+def test_request_ids_are_kept_only_when_safe():
+    assert new_request_id("abc-1.2_x") == "abc-1.2_x"
+    assert len(new_request_id("bad id; DROP")) == 32
+    assert new_request_id(None) != new_request_id(None)
+
+
+def test_time_limits_reach_both_databases():
+    running = RunningQuery("r1", "sql", "sales", "q", timeout_ms=500)
+    assert running.statement("SELECT * FROM sales") == "SELECT /*+ MAX_EXECUTION_TIME(500) */ * FROM sales"
+    assert running.command_options() == {"comment": "r1", "maxTimeMS": 500}
+    unlimited = RunningQuery("r2", "sql", "sales", "q", timeout_ms=0)
+    assert unlimited.statement("SELECT 1") == "SELECT 1"
+    assert unlimited.command_options() == {"comment": "r2"}
+
+
+def test_database_errors_become_timeouts_and_cancellations():
+    running = RunningQuery("r1", "nosql", "sales", "q", timeout_ms=500)
+    with pytest.raises(QueryTimeout):
+        with running.interruptible():
+            raise DatabaseError(code=MONGO_TIMEOUT_CODE)
+    with pytest.raises(QueryCancelled):
+        with running.interruptible():
+            raise DatabaseError(errno=MYSQL_INTERRUPTED_ERRNO)
+    with pytest.raises(DatabaseError):
+        with running.interruptible():
+            raise DatabaseError(errno=1064)
+
+
+def test_cancel_calls_the_bound_hook_only_while_bound():
+    running = RunningQuery("r1", "sql", "sales", "q")
+    killed = []
+    with running.bound(lambda: killed.append("kill")):
+        running.cancel()
+    assert killed == ["kill"]
+    with pytest.raises(QueryCancelled):
+        running.check()
+    with pytest.raises(QueryCancelled):
+        with running.bound(lambda: None):
+            pass
+
+
+def test_admission_sheds_beyond_the_queue(catalog_path):
+    manager = QueryManager(max_running=1, max_queued=0, queue_timeout=1, path=catalog_path)
+    first = manager.admit("a", "sql", "sales", "q")
+    with pytest.raises(TableBusy):
+        manager.admit("b", "sql", "sales", "q")
+    # Other tables have their own slots
+    manager.done(manager.admit("c", "sql", "other", "q"))
+    with pytest.raises(RequestIdInUse):
+        manager.admit("a", "sql", "other", "q")
+    manager.done(first)
+    manager.done(first)
+    assert manager.stats()["running"] == 0 and manager.stats()["shed"] == 1
+
+
+def test_queued_queries_wait_for_a_slot_or_time_out(catalog_path):
+    manager = QueryManager(max_running=1, max_queued=1, queue_timeout=0.05, path=catalog_path)
+    first = manager.admit("a", "sql", "sales", "q")
+    with pytest.raises(TableBusy):
+        manager.admit("b", "sql", "sales", "q")
+
+    manager.queue_timeout = 5
+    threading.Timer(0.05, manager.done, args=(first,)).start()
+    second = manager.admit("b", "sql", "sales", "q")
+    assert [query["request_id"] for query in manager.running()] == ["b"]
+    manager.done(second)
+    assert manager.stats()["queued"] == 2
+
+
+def test_run_releases_the_slot_and_counts_outcomes(catalog_path):
+    manager = QueryManager(max_running=1, path=catalog_path)
+    with pytest.raises(QueryCancelled):
+        with manager.run("a", "nosql", "sales", "q") as running:
+            manager.cancel("a")
+            running.check()
+    assert manager.cancel("a") is None
+    assert manager.stats()["cancelled"] == 1
+    with manager.run("a", "nosql", "sales", "q"):
+        pass
+
+
+def test_slots_and_request_ids_are_shared_by_worker_processes(catalog_path):
+    # Two managers on one catalog file stand in for two worker processes
+    first = QueryManager(max_running=1, max_queued=0, path=catalog_path)
+    second = QueryManager(max_running=1, max_queued=1, queue_timeout=5, path=catalog_path)
+    running = first.admit("a", "sql", "sales", "q")
+    with pytest.raises(RequestIdInUse):
+        second.admit("a", "sql", "other", "q")
+    with pytest.raises(TableBusy):
+        first.admit("b", "sql", "sales", "q")
+    assert [query["request_id"] for query in second.running()] == ["a"]
+
+    # A slot freed by another process is picked up by polling
+    threading.Timer(0.05, first.done, args=(running,)).start()
+    second.done(second.admit("b", "sql", "sales", "q"))
+    assert second.stats()["running"] == 0
+
+
+def test_cancel_reaches_a_query_of_another_process(catalog_path, monkeypatch):
+    monkeypatch.setattr(query_control, "QUERY_POLL_INTERVAL", 0.01)
+    owner, other = QueryManager(path=catalog_path), QueryManager(path=catalog_path)
+    killed = threading.Event()
+    running = owner.admit("a", "nosql", "sales", "q")
+    with running.bound(killed.set):
+        record = other.cancel("a")
+        assert record.to_dict()["cancel_requested"]
+        assert killed.wait(5)
+    assert running.cancelled
+    owner.done(running)
+    assert other.cancel("a") is None
+
+
+def test_slots_of_exited_processes_are_released(catalog_path, monkeypatch):
+    manager = QueryManager(max_running=1, max_queued=0, path=catalog_path)
+    manager.admit("a", "sql", "sales", "q")
+    monkeypatch.setattr(query_control, "process_alive", lambda pid: False)
+    manager.done(manager.admit("b", "sql", "sales", "q"))
+    assert manager.stats()["running"] == 0
@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+from sql_func import PATTERNS, SELECT_PATTERNS, filtering, input_to_sql, schema_patterns, sortlimit
+
+
+METADATA = {
+    "sales": {
+        "column_names": ["city", "price", "qty", "order_date"],
+        "attributes": ["city"],
+        "measures": ["price", "qty"],
+    }
+}
+
+
+def translate(query):
+    # The translator leaves doubled spaces where optional clauses are empty
+    return " ".join(input_to_sql(query, "sales", METADATA).split())
+
+
+@pytest.mark.parametrize("query, sql", [
+    ("total price by city where qty greater than 2", "SELECT city, SUM(price) FROM sales WHERE qty > 2 GROUP BY city"),
+    ("average price", "SELECT AVG(price) FROM sales"),
+    ("count city", "SELECT COUNT(city) FROM sales"),
+    ("find city, price where city is la sorted by price descending limit 5",
+     "SELECT city, price FROM sales WHERE city = 'la' order by price DESC limit 5"),
+    ("first 3 city by price", "SELECT city FROM sales ORDER BY price ASC LIMIT 3"),
+    ("sum price by city having sum price greater than 100",
+     "SELECT city, SUM(price) FROM sales GROUP BY city HAVING Sum(price) > 100"),
+])
+def test_input_to_sql(query, sql):
+    assert translate(query) == sql
+
+
+def test_unknown_table_is_an_error():
+    with pytest.raises(ValueError):
+        input_to_sql("average price", "missing", METADATA)
+
+
+def test_classification_matches_trying_every_pattern_in_order():
+    queries = [
+        "sum price per city", "mean qty", "smallest price by city", "biggest qty", "number of city per city",
+        "list city", "last 2 city based on qty", "minimum of price", "show everything", "hello there",
+    ]
+    for query in queries:
+        expected = next(
+            ((name, match.groups()) for name, regex in SELECT_PATTERNS.items()
+             for match in [re.search(regex, query, re.IGNORECASE)] if match),
+            (None, None),
+        )
+        assert PATTERNS.classify(query) == expected, query
+
+
+def test_filtering_quotes_text_and_dates():
+    where, having = filtering("find price where order_date is 2024-01-02 and city is la", METADATA["sales"]["column_names"])
+    assert where == ["order_date = '2024-01-02'", "city = 'la'"]
+    assert having == []
+
+
+def test_sortlimit_reads_order_limit_and_offset():
+    assert sortlimit("find city order by price limit 10 offset 20", METADATA["sales"]["column_names"]) == (
+        " order by price ASC limit 10 offset 20"
+    )
+
+
+def test_schema_patterns_are_built_once_per_schema():
+    assert schema_patterns(["a", "b"]) is schema_patterns(["a", "b"])
+    assert schema_patterns(["a", "b"]) is not schema_patterns(["a", "c"])
@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+
+from sql_index_advisor import IndexAdvisor, candidate_columns, index_name, parse_query_shape
+
+
+COLUMNS = ("city", "product", "price", "qty", "notes")
+METADATA = {
+    "column_profiles": {
+        "city": {"count": 5000, "distinct_estimate": 50},
+        "product": {"count": 5000, "distinct_estimate": 900},
+        "price": {"count": 5000, "distinct_estimate": 3000},
+    },
+    "column_types": {"notes": "TEXT"},
+}
+
+
+class FakeCursor:
+    def __init__(self, pool):
+        self.pool = pool
+        self.rows = []
+
+    def execute(self, statement, params=()):
+        self.pool.statements.append(statement)
+        self.rows = self.pool.respond(statement)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """Records statements; EXPLAIN reports the index as usable once created, when `usable`."""
+
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.statements = []
+        self.created = None
+
+    def respond(self, statement):
+        if "ADD INDEX" in statement:
+            self.created = statement.split("ADD INDEX ")[1].split()[0]
+        elif "DROP INDEX" in statement:
+            self.created = None
+        elif statement.startswith("EXPLAIN"):
+            key = self.created if self.created and self.usable else None
+            return [{"table": "sales", "type": "ref" if key else "ALL", "key": key, "possible_keys": key, "Extra": ""}]
+        return []
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Connection:
+            def cursor(self, **_):
+                return FakeCursor(pool)
+
+            def commit(self):
+                pass
+
+        yield Connection()
+
+
+def shape(query):
+    return parse_query_shape(query, COLUMNS)
+
+
+def test_query_shape_sorts_columns_by_role():
+    parsed = shape("SELECT city, price FROM sales WHERE city = 'la' AND price BETWEEN 1 AND 5 "
+                   "AND notes LIKE '%x' ORDER BY qty DESC LIMIT 5")
+    assert parsed.to_dict() == {"equality": ["city"], "range": ["price"], "group_by": [], "order_by": ["qty"]}
+    assert parsed.descending
+    assert shape("SELECT city, SUM(price) FROM sales GROUP BY city").group == ["city"]
+    assert shape("SHOW TABLES") is None
+
+
+def test_candidate_columns_put_selective_equalities_first():
+    parsed = shape("SELECT * FROM sales WHERE city = 'la' AND product = 'x' AND price > 3 ORDER BY qty")
+    assert candidate_columns(parsed, METADATA["column_profiles"]) == ["product", "city", "qty"]
+    assert candidate_columns(shape("SELECT * FROM sales WHERE notes = 'x'"), {}, {"notes": "TEXT"}) == []
+
+
+def test_candidates_fold_prefixes_into_wider_indexes():
+    advisor = IndexAdvisor()
+    for _ in range(3):
+        advisor.record("sales", "SELECT * FROM sales WHERE city = 'la'", COLUMNS)
+    advisor.record("sales", "SELECT * FROM sales WHERE city = 'la' ORDER BY price", COLUMNS)
+    advisor.record("sales", "SELECT * FROM other WHERE city = 'la'", COLUMNS)
+    candidates = advisor.candidates("sales", METADATA, existing=[("city", "price", "qty")])
+    assert [(c["columns"], c["queries_served"], c["workload_share"]) for c in candidates] == [
+        (["city", "price"], 4, 1.0),
+    ]
+    assert candidates[0]["exists"] and not candidates[0]["small_table"]
+
+
+def test_auto_index_waits_for_enough_queries():
+    advisor = IndexAdvisor(auto_index=True, auto_min_queries=2)
+    advisor.record("sales", "SELECT * FROM sales WHERE product = 'x'", COLUMNS)
+    assert advisor.due("sales", METADATA) == []
+    advisor.record("sales", "SELECT * FROM sales WHERE product = 'y'", COLUMNS)
+    assert [c["name"] for c in advisor.due("sales", METADATA)] == ["ix_chatdb_product"]
+    assert IndexAdvisor(auto_index=False).due("sales", METADATA) == []
+
+
+def test_apply_keeps_only_indexes_the_optimizer_uses():
+    advisor = IndexAdvisor()
+    advisor.record("sales", "SELECT * FROM sales WHERE product = 'x'", COLUMNS)
+    candidate = advisor.candidates("sales", METADATA)[0]
+
+    pool = FakePool(usable=True)
+    result = advisor.apply(pool, candidate)
+    assert result["status"] == "created"
+    assert result["before"]["full_scan"] and not result["after"]["full_scan"]
+    assert "ALGORITHM=INPLACE, LOCK=NONE" in pool.statements[1]
+
+    pool = FakePool(usable=False)
+    assert advisor.apply(pool, candidate)["status"] == "dropped_unused"
+    assert pool.statements[-1] == "ALTER TABLE sales DROP INDEX ix_chatdb_product"
+
+
+def test_reset_keeps_history_of_remaining_columns():
+    advisor = IndexAdvisor()
+    advisor.record("sales", "SELECT * FROM sales WHERE city = 'la'", COLUMNS)
+    advisor.record("sales", "SELECT * FROM sales WHERE qty = 1", COLUMNS)
+    advisor.reset("sales", ["city", "price"])
+    assert list(advisor.workload("sales")["columns"]) == ["city"]
+    assert [c["columns"] for c in advisor.candidates("sales", METADATA)] == [["city"]]
+
+
+def test_long_index_names_are_hashed():
+    assert index_name("sales", ["city"]) == "ix_chatdb_city"
+    assert len(index_name("sales", ["a_very_long_column_name"] * 3)) <= 64
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+from jobs import JobCancelled, NullProgress
+from sql_ingest import build_create_table_query, dataframe_rows, merge_csv_into_mysql, stream_csv_to_mysql
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def rows(pool, query):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(query)
+        return cursor.fetchall()
+
+
+@pytest.fixture
+def loaded(tmp_path, sqlite_pool):
+    """A `people` table loaded by the streaming ingest: (metadata, state)."""
+    metadata, error = stream_csv_to_mysql(write(tmp_path, "people.csv", "pid,city,amount\n1,la,10\n2,sf,20\n"), sqlite_pool)
+    assert error is None
+    return metadata, metadata.pop("ingest_state")
+
+
+class CancelAfter(NullProgress):
+    """Progress that cancels the load once `rows` rows were inserted."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.loaded = 0
+
+    def advance(self, rows):
+        self.loaded += rows
+
+    def check(self):
+        if self.loaded >= self.rows:
+            raise JobCancelled("cancelled")
+
+
+def test_create_table_query_uses_inferred_types():
+    query = build_create_table_query("people", ["pid", "city", "amount"], ["amount"], [], {"pid": "SMALLINT UNSIGNED"})
+    assert query.endswith("(_row_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY INVISIBLE, "
+                          "pid SMALLINT UNSIGNED, city VARCHAR(255), amount FLOAT)")
+
+
+def test_dataframe_rows_turn_missing_values_into_null():
+    frame = pd.DataFrame({"a": [1.5, None], "b": ["x", None]})
+    assert list(dataframe_rows(frame)) == [(1.5, "x"), (None, None)]
+
+
+def test_stream_loads_every_chunk_and_widens_types(tmp_path, sqlite_pool):
+    text = "pid,amount\n" + "".join(f"{i},{i}\n" for i in range(1, 10)) + "10,100000\n"
+    metadata, error = stream_csv_to_mysql(write(tmp_path, "wide.csv", text), sqlite_pool, chunk_size=3, batch_size=2)
+    assert error is None
+    assert metadata["ingest_stats"]["chunks"] == 4
+    assert metadata["ingest_stats"]["rows"] == 10
+    assert metadata["column_types"]["amount"] == "MEDIUMINT UNSIGNED"
+    assert rows(sqlite_pool, "SELECT COUNT(*), MAX(amount) FROM wide") == [(10, 100000)]
+
+
+def test_stream_creates_an_empty_table_from_a_header(tmp_path, sqlite_pool):
+    metadata, error = stream_csv_to_mysql(write(tmp_path, "empty.csv", "pid,city\n"), sqlite_pool)
+    assert error is None
+    assert metadata["column_names"] == ["pid", "city"]
+    assert rows(sqlite_pool, "SELECT COUNT(*) FROM empty") == [(0,)]
+
+
+def test_stream_stops_between_batches_when_cancelled(tmp_path, sqlite_pool):
+    text = "pid\n" + "".join(f"{i}\n" for i in range(20))
+    metadata, error = stream_csv_to_mysql(write(tmp_path, "big.csv", text), sqlite_pool, chunk_size=10, batch_size=5,
+                                          progress=CancelAfter(5))
+    assert metadata is None and error == "cancelled"
+
+
+def merge(tmp_path, pool, loaded, text, write_mode):
+    metadata, state = loaded
+    merged, error = merge_csv_into_mysql(write(tmp_path, "people.csv", text), pool, metadata, state, write_mode, "pid")
+    assert error is None
+    return merged
+
+
+def test_upsert_overwrites_uploaded_columns_and_keeps_the_others(tmp_path, sqlite_pool, loaded):
+    merged = merge(tmp_path, sqlite_pool, loaded, "pid,city\n2,ny\n3,ny\n", "upsert")
+    assert merged["ingest_stats"]["updated"] == 1
+    assert rows(sqlite_pool, "SELECT pid, city, amount FROM people ORDER BY pid") == [
+        (1, "la", 10), (2, "ny", 20), (3, "ny", None),
+    ]
+
+
+def test_append_skips_existing_keys(tmp_path, sqlite_pool, loaded):
+    merged = merge(tmp_path, sqlite_pool, loaded, "pid,city,amount\n2,ny,0\n3,ny,30\n", "append")
+    assert merged["ingest_stats"]["inserted"] == 1
+    assert rows(sqlite_pool, "SELECT pid, city FROM people ORDER BY pid") == [(1, "la"), (2, "sf"), (3, "ny")]
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import sql_pool
+from sql_pool import MySQLPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        if not self.connected:
+            raise sql_pool.mysql.connector.Error("gone")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def connect(**_):
+        created.append(FakeConnection())
+        return created[-1]
+
+    monkeypatch.setattr(sql_pool.mysql.connector, "connect", connect)
+    return created
+
+
+def make_pool(**options):
+    return MySQLPool("localhost", "user", "password", "db", **options)
+
+
+def test_connections_are_reused(connections):
+    pool = make_pool(pool_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(connections) == 1
+    assert first.rollbacks == 2
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_exhausted_pool_times_out(connections):
+    pool = make_pool(pool_size=1, checkout_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            pool.get_connection()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_gets_released_connection(connections):
+    pool = make_pool(pool_size=1, checkout_timeout=2)
+    held = pool.get_connection()
+    threading.Timer(0.05, pool.release, args=(held,)).start()
+    assert pool.get_connection() is held
+
+
+def test_broken_connections_are_replaced(connections):
+    pool = make_pool(pool_size=1, health_check_interval=0)
+    with pool.connection() as first:
+        first.connected = False
+    with pool.connection() as second:
+        pass
+    assert second is not first and first.closed
+    assert pool.stats()["discarded"] == 1
+
+
+def test_pool_is_rebuilt_after_fork(monkeypatch):
+    monkeypatch.setattr(sql_pool, "_mysql_pool", None)
+    monkeypatch.setattr(sql_pool, "_inherited_pools", [])
+    parent = sql_pool.get_mysql_pool()
+    assert sql_pool.get_mysql_pool() is parent
+
+    pid = sql_pool.os.getpid()
+    monkeypatch.setattr(sql_pool.os, "getpid", lambda: pid + 1)
+    child = sql_pool.get_mysql_pool()
+    assert child is not parent
+    # The parent's sockets stay referenced so garbage collection cannot shut them down
+    assert sql_pool._inherited_pools == [parent]
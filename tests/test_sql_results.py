@@ -0,0 +1,72 @@
+import pytest
+
+from sql_ingest import stream_csv_to_mysql
+from sql_results import (
+    InvalidPageToken, decode_page_token, encode_page_token, fetch_page, parse_keyset_query, stream_rows,
+)
+
+
+@pytest.fixture
+def pool(tmp_path, sqlite_pool):
+    # Duplicate and missing scores make the keyset resume on (score, _row_id)
+    scores = [5, None, 3, 5, 1, None, 3, 5, 2, 4, 5]
+    path = tmp_path / "scores.csv"
+    path.write_text("pid,score\n" + "".join(f"{i},{'' if s is None else s}\n" for i, s in enumerate(scores)))
+    _, error = stream_csv_to_mysql(str(path), sqlite_pool)
+    assert error is None
+    return sqlite_pool
+
+
+def all_pages(pool, query, page_size, version=1):
+    rows, token, keyset = fetch_page(pool, query, version, page_size)
+    assert keyset
+    while token:
+        page, token, _ = fetch_page(pool, query, version, page_size, token)
+        rows.extend(page)
+    return rows
+
+
+def rows_of(pool, query):
+    return [dict(row) for row in stream_rows(pool, query, batch_size=3)]
+
+
+@pytest.mark.parametrize("query, reference", [
+    ("SELECT pid, score FROM scores ORDER BY score ASC", "SELECT pid, score FROM scores ORDER BY score, pid"),
+    ("SELECT pid, score FROM scores ORDER BY score DESC", "SELECT pid, score FROM scores ORDER BY score DESC, pid"),
+    ("SELECT pid, score FROM scores WHERE score > 2 ORDER BY score DESC LIMIT 4",
+     "SELECT pid, score FROM scores WHERE score > 2 ORDER BY score DESC, pid LIMIT 4"),
+    ("SELECT pid, score FROM scores", "SELECT pid, score FROM scores ORDER BY pid"),
+    # The translator's "ORDER BY a,b DESC" descends only b
+    ("SELECT pid, score FROM scores ORDER BY score,pid DESC", "SELECT pid, score FROM scores ORDER BY score, pid DESC"),
+    ("SELECT pid, score FROM scores ORDER BY score DESC, pid ASC",
+     "SELECT pid, score FROM scores ORDER BY score DESC, pid"),
+])
+def test_keyset_pages_match_the_full_result(pool, query, reference):
+    # Rows with equal sort keys come in load order (_row_id), which is pid order here
+    assert all_pages(pool, query, page_size=2) == rows_of(pool, reference)
+
+
+def test_aggregates_return_one_page_without_token(pool):
+    rows, token, keyset = fetch_page(pool, "SELECT COUNT(*) AS n FROM scores", 1, page_size=5)
+    assert (rows, token, keyset) == ([{"n": 11}], None, False)
+
+
+def test_tokens_are_bound_to_query_and_data_version(pool):
+    query = "SELECT pid FROM scores ORDER BY pid"
+    _, token, _ = fetch_page(pool, query, 1, page_size=2)
+    with pytest.raises(InvalidPageToken):
+        fetch_page(pool, "SELECT pid FROM scores ORDER BY pid DESC", 1, 2, token)
+    with pytest.raises(InvalidPageToken):
+        fetch_page(pool, query, 2, 2, token)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token("not a token")
+    assert decode_page_token(encode_page_token({"last": [None], "id": 3})) == {"last": [None], "id": 3}
+
+
+def test_parse_keyset_query():
+    parts = parse_keyset_query("SELECT pid, score FROM scores WHERE score > 2 ORDER BY score DESC LIMIT 4 OFFSET 1")
+    assert parts == {"select": "pid, score", "table": "scores", "where": "score > 2", "order": ["score"],
+                     "descending": [True], "limit": 4, "offset": 1}
+    parts = parse_keyset_query("SELECT * FROM sales ORDER BY city,price DESC LIMIT 5")
+    assert (parts["order"], parts["descending"], parts["limit"]) == (["city", "price"], [False, True], 5)
+    assert parse_keyset_query("SELECT city, SUM(price) FROM sales GROUP BY city") is None
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from sql_types import TypeInference, collation_key, integer_type, is_identifier
+
+
+def infer(**columns):
+    inference = TypeInference(list(columns))
+    inference.update(pd.DataFrame(columns))
+    return inference
+
+
+def test_integer_types_are_the_narrowest_that_fit():
+    assert integer_type(0, 255) == "TINYINT UNSIGNED"
+    assert integer_type(-1, 127) == "TINYINT"
+    assert integer_type(0, 70000) == "MEDIUMINT UNSIGNED"
+    assert integer_type(-(2 ** 40), 0) == "BIGINT"
+
+
+def test_column_kinds():
+    types = infer(
+        qty=[1, 2, 3, 4],
+        price=[1.25, 2.5, 3.75, 4.0],
+        ratio=[0.1234567891234, 1.0, 2.0, 3.0],
+        day=["2024-01-01", "2024-01-02", "2024-02-03", "2024-03-04"],
+        note=["a", "bb", "ccc", "dddddddddd"],
+    ).sql_types()
+    assert types == {
+        "qty": "TINYINT UNSIGNED",
+        "price": "DECIMAL(3,2)",
+        "ratio": "DOUBLE",
+        "day": "DATE",
+        "note": "VARCHAR(16)",
+    }
+
+
+def test_low_cardinality_text_becomes_a_sorted_enum():
+    types = infer(answer=["Yes", "No"] * 5).sql_types()
+    assert types == {"answer": "ENUM('No', 'Yes')"}
+
+
+@pytest.mark.parametrize("values", [["Yes", "yes", "No", "no"], ["Cafe", "Café", "Bar", "Bar"]])
+def test_enum_members_differing_only_in_case_or_accents_fall_back_to_varchar(values):
+    # MySQL's case- and accent-insensitive collation rejects such an ENUM (error 1291)
+    assert infer(answer=values * 5).sql_types() == {"answer": "VARCHAR(8)"}
+
+
+def test_collation_key_ignores_case_and_accents():
+    assert collation_key("Café") == collation_key("cafe")
+    assert collation_key("Yes") != collation_key("No")
+
+
+def test_frozen_enum_widens_on_unseen_values():
+    inference = infer(color=["red", "blue"] * 5)
+    inference.freeze()
+    assert inference.update(pd.DataFrame({"color": ["green"]})) == {"color": "VARCHAR(8)"}
+
+
+def test_text_in_a_numeric_column_widens_it_to_varchar():
+    inference = infer(code=[1, 2, 3])
+    assert inference.update(pd.DataFrame({"code": ["A12"]})) == {"code": "VARCHAR(8)"}
+
+
+@pytest.mark.parametrize("name", ["id", "customer_id", "id_number", "customerId", "userID"])
+def test_identifier_names(name):
+    assert is_identifier(name)
+
+
+@pytest.mark.parametrize("name", ["paid", "valid", "void", "idle", "video_count"])
+def test_words_ending_in_id_are_not_identifiers(name):
+    assert not is_identifier(name)
+
+
+def test_classify_keeps_identifiers_as_attributes():
+    inference = infer(customer_id=[1, 2], paid=[10, 20], city=["la", "sf"], day=["2024-01-01", "2024-01-02"])
+    assert inference.classify() == (["customer_id", "city"], ["paid"], ["day"])
+
+
+def test_state_round_trip():
+    inference = infer(qty=[1, 2], city=["la", "sf"])
+    resumed = TypeInference.from_state(inference.to_state())
+    assert resumed.sql_types() == inference.sql_types()
+    assert resumed.update(pd.DataFrame({"qty": [300]})) == {"qty": "SMALLINT UNSIGNED"}
@@ -0,0 +1,60 @@
+import logging
+
+import app
+from telemetry import Counter, Histogram, RequestTimer, gauge_lines, log_sampled, render_metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "execute")
+    histogram.observe(0.5, "execute")
+    histogram.observe(5, "execute")
+    assert histogram.render() == [
+        "# HELP latency Latency.",
+        "# TYPE latency histogram",
+        'latency_bucket{stage="execute",le="0.1"} 1',
+        'latency_bucket{stage="execute",le="1.0"} 2',
+        'latency_bucket{stage="execute",le="+Inf"} 3',
+        'latency_sum{stage="execute"} 5.55',
+        'latency_count{stage="execute"} 3',
+    ]
+
+
+def test_counter_and_gauge_lines():
+    counter = Counter("requests", "Requests.", ("outcome",))
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    assert counter.render()[-1] == 'requests{outcome="ok"} 3'
+    assert gauge_lines("pool", "Pool.", {"idle": 2}, "state")[-1] == 'pool{state="idle"} 2'
+    assert gauge_lines("wait", "Wait.", {None: 0.5})[-1] == "wait 0.5"
+
+
+def test_request_timer_sums_spans_and_records_once():
+    timer = RequestTimer("test-backend")
+    timer.add("fetch", 0.25)
+    timer.add("fetch", 0.25)
+    with timer.span("execute"):
+        pass
+    assert timer.spans["fetch"] == 0.5
+    timer.finish("ok")
+    timer.finish("ok")
+    assert 'chatdb_requests_total{backend="test-backend",outcome="ok"} 1' in render_metrics()
+    assert timer.server_timing().startswith("fetch;dur=500.00, execute;dur=")
+
+
+def test_sampled_logging_respects_rate_and_level(caplog):
+    logger = logging.getLogger("chatdb.test")
+    with caplog.at_level(logging.INFO, logger="chatdb.test"):
+        log_sampled(logger, logging.DEBUG, "hidden %s", 1, rate=1.0)
+        log_sampled(logger, logging.INFO, "skipped %s", 2, rate=0.0)
+        log_sampled(logger, logging.INFO, "kept %s", 3, rate=1.0)
+    assert [record.getMessage() for record in caplog.records] == ["kept 3"]
+
+
+def test_metrics_endpoint(monkeypatch, sqlite_pool):
+    monkeypatch.setattr(app, "get_mysql_pool", lambda: sqlite_pool)
+    response = app.app.test_client().get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert "# TYPE chatdb_stage_seconds histogram" in body
+    assert 'chatdb_mysql_pool_connections{state="idle"} 1' in body
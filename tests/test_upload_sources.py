@@ -0,0 +1,68 @@
+import pytest
+
+from sql_ingest import merge_csv_into_mysql, stream_csv_to_mysql
+from upload_sources import open_upload, upload_format, upload_name
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def write_parquet(directory, columns, name="items.parquet"):
+    directory.mkdir(exist_ok=True)
+    path = directory / name
+    pq.write_table(pa.table(columns), str(path))
+    return str(path)
+
+
+def test_upload_names_and_formats():
+    assert upload_format("Sales.PARQUET") == "parquet"
+    assert upload_format("events.ndjson") == "json"
+    assert upload_format("people.csv") == "csv"
+    assert upload_name("Sales.feather") == "sales"
+    assert upload_name("notes.txt") == "notes.txt"
+
+
+def test_parquet_kinds_and_footer_statistics(tmp_path):
+    path = write_parquet(tmp_path, {
+        "pid": pa.array([1, 2, 300], pa.int64()),
+        "price": pa.array([1.5, None, 2.0]),
+        "city": pa.array(["la", "sf", None]),
+    })
+    with open_upload(path) as source:
+        engine = source.profiling_engine(source.columns)
+        assert engine.types.sql_types()["pid"] == "SMALLINT UNSIGNED"
+        # Counts and ranges come from the footer before any row is read
+        profile = engine.profiler.to_dict()["price"]
+        assert (profile["count"], profile["null_count"], profile["min"], profile["max"]) == (3, 1, 1.5, 2.0)
+        chunks = list(source.chunks(2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+
+def test_nullable_integers_and_booleans_keep_numeric_dtypes(tmp_path):
+    path = write_parquet(tmp_path, {
+        "qty": pa.array([5, None], pa.int64()),
+        "ok": pa.array([True, None]),
+    })
+    with open_upload(path) as source:
+        chunk = next(source.chunks(10))
+    assert str(chunk["qty"].dtype) == "Int64"
+    assert str(chunk["ok"].dtype) == "boolean"
+
+
+def test_parquet_append_keeps_nullable_integer_columns(tmp_path, sqlite_pool):
+    first = write_parquet(tmp_path / "first", {
+        "pid": pa.array([1, 2, 3], pa.int64()),
+        "qty": pa.array([5, None, 7], pa.int64()),
+    })
+    metadata, error = stream_csv_to_mysql(first, sqlite_pool)
+    assert error is None
+    state = metadata.pop("ingest_state")
+
+    more = write_parquet(tmp_path / "more", {
+        "pid": pa.array([3, 4], pa.int64()),
+        "qty": pa.array([None, 9], pa.int64()),
+    })
+    merged, error = merge_csv_into_mysql(more, sqlite_pool, metadata, state, "append", "pid")
+    assert error is None
+    assert merged["column_types"]["qty"] == "TINYINT UNSIGNED"
+    assert "qty" in merged["measures"]
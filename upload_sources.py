@@ -0,0 +1,259 @@
+import datetime
+import os
+from importlib.util import find_spec
+
+import pandas as pd
+
+from profile_engine import ProfilingEngine, read_csv_chunks
+from profiling import TableProfiler, to_python
+from sql_types import TypeInference
+
+
+# Typed columnar formats read through a memory map (need pyarrow)
+COLUMNAR_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+# JSON arrays and NDJSON are MongoDB-only (json_documents)
+JSON_FORMATS = {".json": "json", ".ndjson": "json", ".jsonl": "json"}
+UPLOAD_FORMATS = {".csv": "csv", **COLUMNAR_FORMATS, **JSON_FORMATS}
+COLUMNAR_AVAILABLE = find_spec("pyarrow") is not None
+# Widest DECIMAL MySQL stores; wider declared decimals become DOUBLE
+MAX_DECLARED_PRECISION = 65
+
+
+def upload_format(filename):
+    """"csv", "parquet", "arrow", "json" or None from the file extension."""
+    return UPLOAD_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def upload_name(filename):
+    """Table/collection name of an upload: the file name without a known extension, lower case."""
+    name = os.path.basename(filename)
+    stem, extension = os.path.splitext(name)
+    return (stem if extension.lower() in UPLOAD_FORMATS else name).lower()
+
+
+def normalize_name(name):
+    return name.replace(' ', '_').lower()
+
+
+class UploadSource:
+    """An uploaded file the loaders read chunk by chunk; use it as a context manager."""
+
+    format = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self):
+        """Source details for ingest_stats()."""
+        return {"source_format": self.format}
+
+    def close(self):
+        pass
+
+
+class CsvSource(UploadSource):
+    """CSV upload: chunks from the pandas C parser, types inferred from the values."""
+
+    format = "csv"
+
+    def chunks(self, chunk_size, date_objects=True):
+        return read_csv_chunks(self.path, chunk_size)
+
+    def profiling_engine(self, columns):
+        return ProfilingEngine(columns)
+
+
+class ColumnarSource(UploadSource):
+    """
+    Parquet or Arrow IPC upload read through a memory map.
+
+    Parquet is streamed row group by row group in batches of at most `chunk_size`
+    rows, Arrow IPC record batch by record batch (zero-copy slices). Column kinds
+    come from the file schema instead of being inferred, and for Parquet the
+    footer statistics give integer bounds, row/null counts and min/max, so
+    loaders can create the final table before reading any data and the sketches
+    only compute distinct counts, frequent values and samples.
+    """
+
+    def __init__(self, path, file_format):
+        import pyarrow as pa
+
+        super().__init__(path)
+        self.format = file_format
+        self._source = pa.memory_map(path, "r")
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            self._file = pq.ParquetFile(self._source)
+            self.schema = self._file.schema_arrow
+            self.num_rows = self._file.metadata.num_rows
+            self.row_groups = self._file.metadata.num_row_groups
+        else:
+            self._file = pa.ipc.open_file(self._source)
+            self.schema = self._file.schema
+            self.num_rows = None
+            self.row_groups = self._file.num_record_batches
+        self.columns = [normalize_name(name) for name in self.schema.names]
+        unsupported = [
+            f"{name} ({field.type})" for name, field in zip(self.columns, self.schema) if self._kind(field.type) is None
+        ]
+        if unsupported:
+            raise ValueError(f"Unsupported column types: {', '.join(unsupported)}.")
+
+    @staticmethod
+    def _kind(arrow_type):
+        import pyarrow as pa
+
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        if pa.types.is_boolean(arrow_type):
+            return "bool"
+        if pa.types.is_integer(arrow_type):
+            return "int"
+        if pa.types.is_floating(arrow_type):
+            return "double"
+        if pa.types.is_decimal(arrow_type):
+            return "decimal" if arrow_type.precision <= MAX_DECLARED_PRECISION else "double"
+        if pa.types.is_date(arrow_type):
+            return "date"
+        if pa.types.is_timestamp(arrow_type):
+            return "datetime"
+        if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            return "text"
+        if pa.types.is_null(arrow_type):
+            return "null"
+        return None
+
+    def _footer_statistics(self):
+        """{column: (null_count, min, max)} for Parquet columns whose every row group has statistics."""
+        if self.format != "parquet":
+            return {}
+        metadata = self._file.metadata
+        statistics = {}
+        for index, name in enumerate(self.columns):
+            nulls, low, high = 0, None, None
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                column = row_group.column(index)
+                stats = column.statistics
+                if stats is None or not stats.has_null_count:
+                    break
+                nulls += stats.null_count
+                if stats.has_min_max:
+                    low = stats.min if low is None else min(low, stats.min)
+                    high = stats.max if high is None else max(high, stats.max)
+                elif stats.null_count != row_group.num_rows:
+                    break
+            else:
+                statistics[name] = (nulls, _naive(low), _naive(high))
+        return statistics
+
+    def profiling_engine(self, columns):
+        """ProfilingEngine with the schema's column kinds and the footer's counts and ranges."""
+        import pyarrow as pa
+
+        statistics = self._footer_statistics()
+        types = TypeInference(columns)
+        profiler = TableProfiler(columns)
+        for name, field in zip(self.columns, self.schema):
+            kind = self._kind(field.type)
+            if kind == "null":
+                continue
+            column = types.columns[name]
+            nulls, low, high = statistics.get(name, (None, None, None))
+            if kind == "int":
+                column.declare("int", low, high)
+            elif kind == "bool":
+                column.declare("bool", 0, 1)
+            elif kind == "decimal":
+                column.declare("decimal", integer_digits=max(1, field.type.precision - field.type.scale),
+                               scale=field.type.scale)
+            elif kind == "text" and pa.types.is_dictionary(field.type):
+                column.declare("text", values=set())
+            else:
+                column.declare(kind)
+            if nulls is not None:
+                if kind in ("decimal", "double") and low is not None:
+                    low, high = float(low), float(high)
+                profiler.profiles[name].load_footer(self.num_rows, nulls, low, high)
+        return ProfilingEngine(types=types, profiler=profiler)
+
+    def _to_pandas(self, batch, date_objects):
+        import pyarrow as pa
+
+        arrays = []
+        for array in batch.columns:
+            if pa.types.is_dictionary(array.type):
+                array = array.dictionary_decode()
+            if pa.types.is_timestamp(array.type) and array.type.tz is not None:
+                # MySQL DATETIME and BSON dates are stored as naive UTC
+                array = array.cast(pa.timestamp(array.type.unit))
+            elif pa.types.is_decimal(array.type):
+                array = array.cast(pa.float64())
+            elif pa.types.is_date(array.type) and not date_objects:
+                array = array.cast(pa.timestamp("ms"))
+            arrays.append(array)
+        return pa.RecordBatch.from_arrays(arrays, names=self.columns).to_pandas(types_mapper=_nullable_dtype)
+
+    def _batches(self, chunk_size):
+        if self.format == "parquet":
+            yield from self._file.iter_batches(batch_size=chunk_size)
+            return
+        for index in range(self._file.num_record_batches):
+            batch = self._file.get_batch(index)
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size)
+
+    def chunks(self, chunk_size, date_objects=True):
+        """
+        DataFrames of at most `chunk_size` rows. Integers and booleans use pandas' nullable dtypes,
+        decimals become floats and, unless `date_objects`, dates become timestamps
+        (MongoDB stores no plain dates).
+        """
+        for batch in self._batches(chunk_size):
+            yield self._to_pandas(batch, date_objects)
+
+    def stats(self):
+        return {**super().stats(), "row_groups": self.row_groups}
+
+    def close(self):
+        self._source.close()
+
+
+def _nullable_dtype(arrow_type):
+    """
+    Pandas nullable dtype for Arrow integers and booleans. Columns with nulls stay
+    numeric (and exact) instead of becoming object columns, which type inference
+    would take for text when an append resumes it.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_boolean(arrow_type):
+        return pd.BooleanDtype()
+    if pa.types.is_integer(arrow_type):
+        signed = "" if pa.types.is_signed_integer(arrow_type) else "U"
+        return pd.api.types.pandas_dtype(f"{signed}Int{arrow_type.bit_width}")
+    return None
+
+
+def _naive(value):
+    """Footer bound as a JSON-friendly value; zoned timestamps as naive UTC like the loaded rows."""
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return to_python(value)
+
+
+def open_upload(path):
+    """Source for an uploaded file, chosen by its extension (CSV when unknown)."""
+    file_format = upload_format(path)
+    if file_format in ("parquet", "arrow"):
+        if not COLUMNAR_AVAILABLE:
+            raise ValueError("Parquet and Arrow uploads need pyarrow installed.")
+        return ColumnarSource(path, file_format)
+    return CsvSource(path)